@@ -1,40 +1,125 @@
 """FastAPI demo: single endpoint for query → response and tier."""
+import hmac
+import os
 import sys
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 
-from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi import FastAPI, Header, HTTPException
+from pydantic import BaseModel, Field
+from src import metrics
+from src.config import load_config
+from src.deadline import Deadline
 from src.logging_config import setup_logging
 from src.orchestrator import Orchestrator
+from src.reload import IndexReloader
+from src.serving import process_memory
 
 setup_logging()
 app = FastAPI(title="BFSI Call Center AI Assistant")
 orch = Orchestrator()
+reloader = IndexReloader(orch)
+ADMIN_TOKEN = os.environ.get(load_config().get("reload", {}).get("admin_token_env", "BFSI_ADMIN_TOKEN"))
 
 
 class QueryRequest(BaseModel):
     query: str
+    adapter: str | None = None  # named LoRA adapter (slm.adapters.paths); routed from the query if omitted
+    session_id: str | None = Field(default=None, max_length=128)  # same id across a call's turns for follow-ups
+
+
+class ReloadRequest(BaseModel):
+    force: bool = False  # rebuild every index, not only those whose sources changed
 
 
 class QueryResponse(BaseModel):
     response: str
     tier: str
     sources: str | None = None
+    degraded: bool = False
+    adapter: str | None = None
+    session_id: str | None = None
 
 
 @app.post("/query", response_model=QueryResponse)
-def query(req: QueryRequest):
-    result = orch.respond(req.query.strip())
+async def query(req: QueryRequest):
+    # Fast and slow stages run on the orchestrator's lanes; waiting for them holds no server thread
+    result = await orch.respond_async(
+        req.query.strip(), deadline=Deadline.for_endpoint("api"), adapter=req.adapter, session_id=req.session_id
+    )
     return QueryResponse(
         response=result.response,
         tier=result.tier,
         sources=result.sources,
+        degraded=result.degraded,
+        adapter=result.adapter,
+        session_id=req.session_id,
     )
 
 
+@app.delete("/sessions/{session_id}")
+def end_session(session_id: str):
+    """End a conversation: its turns and SLM cache are freed now rather than at sessions.ttl_s."""
+    return {"ended": orch.end_session(session_id)}
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Pipeline counters for this worker."""
+    counters = metrics.snapshot()
+    if orch.lanes is not None:
+        for name, stats in orch.lanes.stats().items():
+            counters[f"lanes.{name}.queued"] = stats["queued"]
+            counters[f"lanes.{name}.running"] = stats["running"]
+    if orch.sessions is not None:
+        counters["sessions.active"] = len(orch.sessions)
+    generations = counters.get("slm.generations", 0)
+    if generations:
+        counters["slm.avg_tokens_per_generation"] = counters.get("slm.tokens_decoded", 0) / generations
+    return counters
+
+
+@app.get("/memory")
+def memory():
+    """Memory of the worker that served this request (bytes). Shared pages are the pre-fork weights."""
+    return {"pid": os.getpid(), **process_memory()}
+
+
+@app.on_event("startup")
+def start_index_watcher():
+    # Runs in each worker after the fork, so every process gets its own watcher thread
+    reloader.start_watcher()
+
+
+def _check_admin(token: str | None) -> None:
+    # Fail closed: with no token configured the admin endpoints do not exist
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="admin token required")
+
+
+@app.post("/admin/reload", status_code=202)
+def admin_reload(req: ReloadRequest | None = None, x_admin_token: str | None = Header(default=None)):
+    """
+    Rebuild stale indexes (Tier 1 dataset, RAG knowledge, structured facts) in the background and switch
+    this worker to them; other workers switch on their next watcher poll. Requests keep being served
+    from the current versions meanwhile.
+    """
+    _check_admin(x_admin_token)
+    started = reloader.start_build(force=bool(req and req.force))
+    return {"started": started, **reloader.status()}
+
+
+@app.get("/admin/indexes")
+def admin_indexes(x_admin_token: str | None = Header(default=None)):
+    """Index versions this worker serves and the state of the last rebuild."""
+    _check_admin(x_admin_token)
+    return {"pid": os.getpid(), **reloader.status()}
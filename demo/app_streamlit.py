@@ -1,28 +1,59 @@
 """Streamlit demo: query input, response and tier displayed."""
 import sys
+import time
+import uuid
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 
 import streamlit as st
+from src.deadline import Deadline
 from src.logging_config import setup_logging
 from src.orchestrator import Orchestrator
 
+_POLL_S = 0.2
 
-def main():
+
+@st.cache_resource
+def get_orchestrator() -> Orchestrator:
+    """
+    One Orchestrator per Streamlit process, shared by every session: one set of embedders, index
+    handles and SLM weights however many tabs are open. Generations from all sessions queue on its
+    slow lane (bounded by lanes.slow_workers and lanes.slow_max_queue).
+    """
     setup_logging()
+    return Orchestrator()
+
+
+def main():
     st.set_page_config(page_title="BFSI Call Center AI Assistant", layout="centered")
     st.title("BFSI Call Center AI Assistant")
     st.caption("Ask a banking, loan or account-related question.")
-    if "orch" not in st.session_state:
-        st.session_state.orch = Orchestrator()
+    orch = get_orchestrator()
+    # One conversation per browser tab: follow-up questions are answered in its context
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
     q = st.text_input("Your question", placeholder="e.g. How is EMI calculated?")
     if st.button("Get response") and q:
-        with st.spinner("Thinking..."):
-            result = st.session_state.orch.respond(q.strip())
+        deadline = Deadline.for_endpoint("streamlit")
+        pending = orch.submit(q.strip(), deadline=deadline, session_id=st.session_state.session_id)
+        status = st.empty()
+        while not pending.future.done() and not deadline.expired():
+            position = pending.queue_position()
+            if position is not None:
+                status.info(f"In queue: {position} request(s) ahead of yours ({deadline.elapsed():.1f}s)")
+            else:
+                status.info(f"Thinking... ({deadline.elapsed():.1f}s)")
+            time.sleep(_POLL_S)
+        result = pending.result(timeout=0)
+        status.empty()
         st.success(f"**Tier used:** {result.tier.upper()}")
+        if result.degraded:
+            st.warning("Answer degraded to meet the response-time budget.")
         st.markdown(result.response)
+        wait = pending.queue_wait()
+        st.caption(f"Answered in {deadline.elapsed():.2f}s" + (f" ({wait:.2f}s queued for generation)" if wait else ""))
         if result.sources:
             with st.expander("RAG sources (excerpt)"):
                 st.text(result.sources[:800])
@@ -1,18 +1,35 @@
-"""CLI demo: single query in, print response and tier used."""
+"""
+CLI demo: single query in, print response and tier used.
+
+Batch mode runs a file of queries through the full pipeline:
+  python demo/cli.py --batch queries.jsonl --out results.jsonl --workers 8
+Input is JSONL ({"id": ..., "query": ...} or a bare JSON string per line) or CSV with a header row.
+Results stream to the output JSONL as they finish; rerunning the same command skips every id already
+in the output, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import csv
+import json
+import os
 import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
+from typing import Iterator
 
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 
+from src.config import load_config
+from src.deadline import Deadline
 from src.logging_config import setup_logging
 from src.orchestrator import Orchestrator
 
 
-def main():
-    setup_logging()
-    orch = Orchestrator()
+def interactive(orch: Orchestrator) -> None:
     print("BFSI Call Center AI Assistant (CLI). Type your query and press Enter. 'quit' to exit.\n")
+    session_id = uuid.uuid4().hex  # one conversation per run, so follow-ups keep their context
     while True:
         try:
             q = input("You: ").strip()
@@ -20,9 +37,138 @@ def main():
             break
         if not q or q.lower() in ("quit", "exit", "q"):
             break
-        result = orch.respond(q)
-        print(f"[{result.tier.upper()}] {result.response}\n")
+        result = orch.respond(q, deadline=Deadline.for_endpoint("cli"), session_id=session_id)
+        tag = result.tier.upper() + (", DEGRADED" if result.degraded else "")
+        print(f"[{tag}] {result.response}\n")
+
+
+def read_queries(path: Path, query_field: str, id_field: str) -> Iterator[tuple[str, str]]:
+    """(id, query) per row, streamed. Rows without an id get their 1-based row number."""
+    if path.suffix.lower() == ".csv":
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for n, row in enumerate(csv.DictReader(f), 1):
+                yield str(row.get(id_field) or n), row.get(query_field) or ""
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if isinstance(row, str):
+                yield str(n), row
+            else:
+                yield str(row.get(id_field) or n), row.get(query_field) or ""
+
+
+def completed_ids(out_path: Path) -> set[str]:
+    """
+    Ids already in the output. Only a torn last line (killed mid-write, no newline) is cut off so appends
+    stay valid JSONL; a malformed complete line is reported and skipped, never truncated at.
+    """
+    done: set[str] = set()
+    if not out_path.exists():
+        return done
+    good = 0
+    with open(out_path, "rb") as f:
+        for n, line in enumerate(f, 1):
+            if not line.endswith(b"\n"):
+                break
+            good += len(line)
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (ValueError, KeyError, TypeError):
+                print(f"Skipping malformed line {n} in {out_path} (not counted as done)", file=sys.stderr)
+    if good < out_path.stat().st_size:
+        with open(out_path, "r+b") as f:
+            f.truncate(good)
+    return done
+
+
+def run_batch(orch: Orchestrator, args) -> int:
+    in_path, out_path = Path(args.batch), Path(args.out)
+    done = set() if args.no_resume else completed_ids(out_path)
+    if done:
+        print(f"Resuming: {len(done)} queries already in {out_path}")
+    budget = args.deadline if args.deadline is not None else load_config().get("latency", {}).get("deadlines", {}).get("cli")
+
+    def one(qid: str, query: str) -> dict:
+        start = time.perf_counter()
+        result = orch.respond(query, deadline=Deadline(float(budget) if budget is not None else None))
+        return {
+            "id": qid,
+            "query": query,
+            "response": result.response,
+            "tier": result.tier,
+            "degraded": result.degraded,
+            "sources": result.sources,
+            "adapter": result.adapter,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    counts: dict[str, int] = {}
+    latencies: list[float] = []
+    start = time.perf_counter()
+    mode = "w" if args.no_resume else "a"
+    with open(out_path, mode, encoding="utf-8") as out, ThreadPoolExecutor(args.workers) as pool:
+        in_flight = set()
+
+        def drain(block_until: int) -> None:
+            nonlocal in_flight
+            while len(in_flight) > block_until:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    row = fut.result()
+                    out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    counts[row["tier"]] = counts.get(row["tier"], 0) + 1
+                    latencies.append(row["latency_ms"])
+                out.flush()
+                if len(latencies) % args.sync_every < len(finished):
+                    os.fsync(out.fileno())  # checkpoint: everything written so far survives a crash
+                    print(f"  {len(latencies)} done, {len(latencies) / (time.perf_counter() - start):.1f} queries/s", flush=True)
+
+        for qid, query in read_queries(in_path, args.query_field, args.id_field):
+            if qid in done:
+                continue
+            done.add(qid)  # duplicate ids in the input run once
+            in_flight.add(pool.submit(one, qid, query))
+            # Bounded window: the input is streamed, never held in memory
+            drain(args.workers * 2)
+        drain(0)
+        os.fsync(out.fileno())
+
+    elapsed = time.perf_counter() - start
+    if not latencies:
+        print("Nothing to do: every query is already in", out_path)
+        return 0
+    latencies.sort()
+    p50, p95 = latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"Processed {len(latencies)} queries in {elapsed:.1f}s ({len(latencies) / elapsed:.1f}/s), p50 {p50:.0f} ms, p95 {p95:.0f} ms")
+    print("By tier:", ", ".join(f"{t}={n}" for t, n in sorted(counts.items())))
+    print("Results in", out_path)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", help="JSONL or CSV file of queries (omit for the interactive prompt)")
+    parser.add_argument("--out", help="results JSONL (default: <input>.results.jsonl)")
+    parser.add_argument("--workers", type=int, default=4, help="queries in flight (SLM concurrency is still capped by the slow lane)")
+    parser.add_argument("--query-field", default="query")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--deadline", type=float, default=None, help="per-query budget in seconds (default latency.deadlines.cli)")
+    parser.add_argument("--sync-every", type=int, default=100, help="fsync the output and report progress every N results")
+    parser.add_argument("--no-resume", action="store_true", help="overwrite the output instead of skipping ids already in it")
+    args = parser.parse_args()
+
+    setup_logging()
+    orch = Orchestrator()
+    if not args.batch:
+        interactive(orch)
+        return 0
+    if not args.out:
+        args.out = str(Path(args.batch).with_suffix(".results.jsonl"))
+    return run_batch(orch, args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Benchmark lookup-assisted decoding against plain greedy decoding: tokens/sec and output equivalence."""
+import argparse
+import itertools
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import metrics
+from src.config import load_config
+from src.dataset_io import iter_samples
+from src.similarity import DatasetSimilarity
+from src.slm import SLMInference
+
+
+def run(slm: SLMInference, mode: str, queries: list[str], refs: list[list[str]], max_new_tokens: int) -> tuple[list[str], float, float]:
+    slm.assisted_mode = mode
+    before = metrics.get("slm.tokens_decoded")
+    outputs = []
+    start = time.perf_counter()
+    for q, r in zip(queries, refs):
+        outputs.append(slm.generate(q, max_new_tokens=max_new_tokens, references=r if mode == "lookup" else None))
+    elapsed = time.perf_counter() - start
+    return outputs, metrics.get("slm.tokens_decoded") - before, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=20, help="number of dataset instructions to generate for")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--no-references", action="store_true", help="draft from the prompt only")
+    args = parser.parse_args()
+
+    cfg = load_config()
+    dataset_path = PROJECT_ROOT / cfg.get("similarity", {}).get("dataset_path", "data/alpaca_bfsi.json")
+    samples = list(itertools.islice(iter_samples(dataset_path), args.n))
+    queries = [s["instruction"] for s in samples]
+
+    refs: list[list[str]] = [[] for _ in queries]
+    if not args.no_references:
+        sim = DatasetSimilarity()
+        n_refs = int(cfg.get("slm", {}).get("assisted", {}).get("reference_answers", 3))
+        # Leave out the exact sample so drafts come from neighbouring answers, as in production misses
+        refs = [[o for o, _ in sim.candidates(q, n_refs + 1) if o != s["output"]][:n_refs] for q, s in zip(queries, samples)]
+
+    # Greedy for both runs so outputs are comparable
+    slm = SLMInference(temperature=0.0)
+    if not slm._load_model():
+        print("ERROR: could not load SLM")
+        return 1
+    slm.generate("warm up", max_new_tokens=4)
+
+    plain, plain_tokens, plain_s = run(slm, "off", queries, refs, args.max_new_tokens)
+    metrics.reset()
+    assisted, assisted_tokens, assisted_s = run(slm, "lookup", queries, refs, args.max_new_tokens)
+    passes = metrics.get("slm.assisted.forward_passes")
+    drafted = metrics.get("slm.assisted.draft_tokens")
+    accepted = metrics.get("slm.assisted.accepted_tokens")
+
+    same = sum(a == b for a, b in zip(plain, assisted))
+    print(f"Queries: {len(queries)}  max_new_tokens: {args.max_new_tokens}")
+    print(f"Greedy:   {plain_tokens:.0f} tokens in {plain_s:.2f}s -> {plain_tokens / plain_s:.1f} tok/s")
+    print(f"Lookup:   {assisted_tokens:.0f} tokens in {assisted_s:.2f}s -> {assisted_tokens / assisted_s:.1f} tok/s")
+    print(f"Speedup:  {plain_s / assisted_s:.2f}x")
+    if passes:
+        print(f"Tokens per forward pass: {assisted_tokens / passes:.2f}  draft acceptance: {accepted / max(drafted, 1):.1%}")
+    print(f"Identical outputs: {same}/{len(queries)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Benchmark continuous batching: aggregate tokens/sec for concurrent callers vs the single-request path."""
+import argparse
+import itertools
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import metrics
+from src.config import load_config
+from src.dataset_io import iter_samples
+from src.slm import SLMInference
+
+
+def run(slm: SLMInference, queries: list[str], max_new_tokens: int, concurrency: int) -> tuple[float, float, list[float]]:
+    before = metrics.get("slm.tokens_decoded")
+    latencies: list[float] = []
+
+    def one(q: str) -> None:
+        t0 = time.perf_counter()
+        slm.generate(q, max_new_tokens=max_new_tokens)
+        latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, queries))
+    return metrics.get("slm.tokens_decoded") - before, time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=32, help="number of requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent callers for the batched run")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=96)
+    args = parser.parse_args()
+
+    cfg = load_config()
+    dataset_path = PROJECT_ROOT / cfg.get("similarity", {}).get("dataset_path", "data/alpaca_bfsi.json")
+    queries = [s["instruction"] for s in itertools.islice(iter_samples(dataset_path), args.n)]
+
+    slm = SLMInference(temperature=0.0)
+    if not slm._load_model():
+        print("ERROR: could not load SLM")
+        return 1
+    slm.generate("warm up", max_new_tokens=4)
+
+    slm.batching = {"enabled": False}
+    single_tokens, single_s, single_lat = run(slm, queries, args.max_new_tokens, concurrency=1)
+    slm.batching = {"enabled": True, "max_batch_size": args.max_batch_size}
+    batched_tokens, batched_s, batched_lat = run(slm, queries, args.max_new_tokens, concurrency=args.concurrency)
+
+    steps = metrics.get("slm.batching.steps")
+    print(f"Requests: {len(queries)}  max_new_tokens: {args.max_new_tokens}")
+    print(f"Single-request: {single_tokens / single_s:.1f} tok/s  (mean latency {sum(single_lat) / len(single_lat):.2f}s)")
+    print(
+        f"Batched x{args.concurrency}:    {batched_tokens / batched_s:.1f} tok/s  "
+        f"(mean latency {sum(batched_lat) / len(batched_lat):.2f}s)"
+    )
+    if steps:
+        print(f"Mean batch occupancy: {metrics.get('slm.batching.step_tokens') / steps:.2f}")
+    print(f"Throughput gain: {(batched_tokens / batched_s) / (single_tokens / single_s):.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Benchmark SLM per-token decode latency for each CPU profile setting (threads, bf16, static cache, compile)."""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.cpu_profile import cpu_supports_bf16
+from src.slm import SLMInference, _alpaca_prompt
+
+PROFILES = {
+    "fp32": {"dtype": "float32"},
+    "fp32+threads": {"dtype": "float32", "intra_op_threads": None},
+    "bf16": {"dtype": "bfloat16"},
+    "fp32+static": {"dtype": "float32", "static_cache": True},
+    "fp32+static+compile": {"dtype": "float32", "static_cache": True, "compile": True},
+    "bf16+static+compile": {"dtype": "bfloat16", "static_cache": True, "compile": True},
+}
+
+
+def per_token_latency(slm: SLMInference, n_tokens: int, repeats: int) -> tuple[float, float]:
+    """(prefill seconds, seconds per decoded token) from timing 1-token and n-token generations."""
+    import torch
+    prompt = _alpaca_prompt("How can I reduce my home loan EMI if interest rates go up?")
+    inputs = slm._tokenizer(prompt, return_tensors="pt")
+
+    def timed(n: int) -> float:
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            with torch.no_grad():
+                slm._model.generate(
+                    **inputs, max_new_tokens=n, min_new_tokens=n, do_sample=False,
+                    pad_token_id=slm._tokenizer.eos_token_id,
+                )
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    timed(n_tokens)  # untimed pass: compiles for this prompt's shapes and fills allocator caches
+    t1 = timed(1)
+    tn = timed(n_tokens)
+    return t1, (tn - t1) / (n_tokens - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profiles", nargs="*", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads for the '+threads' profile (0 = physical cores guess)")
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    import os
+    import torch
+    default_threads = torch.get_num_threads()
+    print(f"CPU native bf16: {cpu_supports_bf16()}  torch default threads: {default_threads}")
+    print(f"{'profile':<24}{'threads':>8}{'prefill ms':>12}{'ms/token':>10}{'tok/s':>8}")
+    for name in args.profiles:
+        profile = dict(PROFILES[name])
+        if "intra_op_threads" in profile:
+            profile["intra_op_threads"] = args.threads or max(1, (os.cpu_count() or 2) // 2)
+        # Threads are process-wide: set them per profile here instead of through apply_threads' run-once guard
+        torch.set_num_threads(profile.pop("intra_op_threads", default_threads))
+        slm = SLMInference(temperature=0.0, cpu_profile=profile)
+        if not slm._load_model():
+            print(f"{name:<24} failed to load")
+            continue
+        prefill, per_token = per_token_latency(slm, args.tokens, args.repeats)
+        print(f"{name:<24}{torch.get_num_threads():>8}{prefill * 1000:>12.1f}{per_token * 1000:>10.2f}{1 / per_token:>8.1f}")
+        del slm
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
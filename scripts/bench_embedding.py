@@ -0,0 +1,54 @@
+"""Compare serial and multi-process embedding throughput on the dataset texts and check the vectors match."""
+import argparse
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+
+from src.config import load_config, PROJECT_ROOT
+from src.dataset_io import iter_samples
+from src.embeddings import parallel_encoder
+from src.similarity import _text_for_embedding
+
+
+def main():
+    cfg = load_config()
+    sim = cfg.get("similarity", {})
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--limit", type=int, default=5000, help="texts to embed")
+    parser.add_argument("--workers", default="2,4", help="worker counts to compare against serial")
+    args = parser.parse_args()
+
+    dataset_path = PROJECT_ROOT / sim.get("dataset_path", "data/alpaca_bfsi.json")
+    texts = [_text_for_embedding(s["instruction"], s.get("input", "")) for s in islice(iter_samples(dataset_path), args.limit)]
+    if not texts:
+        print("No dataset samples at", dataset_path)
+        return 1
+    model = sim.get("embedding_model", "all-MiniLM-L6-v2")
+    print(f"{len(texts)} texts, model {model}, batch_size {cfg.get('embedding', {}).get('batch_size', 64)}")
+
+    with parallel_encoder(model, cfg, workers=1) as encoder:
+        encoder.encode(texts[: encoder.batch_size])  # load the model outside the timing
+        reference = encoder.encode(texts)
+        serial_rate = encoder.last_rate
+    print(f"{'workers':>7} {'texts/s':>9} {'speedup':>7} {'identical':>9} {'max_abs_diff':>12}")
+    print(f"{1:>7} {serial_rate:>9.1f} {1.0:>7.2f} {'-':>9} {'-':>12}")
+    for w in (int(x) for x in args.workers.split(",")):
+        with parallel_encoder(model, cfg, workers=w) as encoder:
+            encoder.encode(texts[: encoder.batch_size * w])  # start workers and load models outside the timing
+            start = time.perf_counter()
+            emb = encoder.encode(texts)
+            rate = len(texts) / (time.perf_counter() - start)
+        # Same batches as serial; any difference comes from per-process BLAS thread counts
+        diff = float(np.abs(emb - reference).max())
+        print(f"{w:>7} {rate:>9.1f} {rate / serial_rate:>7.2f} {str(np.array_equal(emb, reference)):>9} {diff:>12.2e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Benchmark Tier 1 index backends: build time, memory per million vectors, query latency and recall@k vs exact.
+
+The pca rows are the recall-versus-latency report for reduced embeddings: every combination of
+--pca-dims and --pca-quant is built once and searched with each --rescore setting (0 = compact scores
+only). Synthetic data has no low-rank structure unless --intrinsic-dim is set; for real numbers pass
+the Tier 1 vectors, e.g. --vectors data/dataset_index/versions/<version>/exact/vectors.npy.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+
+from src.vector_index import _normalize, create_index
+
+
+def synthetic(n: int, dim: int, clusters: int, seed: int, intrinsic_dim: int = 0) -> np.ndarray:
+    """
+    Clustered unit vectors (paraphrases of one answer sit close together, like the real dataset).
+    With intrinsic_dim the cluster centers lie in a random subspace of that many dimensions, as
+    sentence embeddings concentrate their variance in a few directions.
+    """
+    rng = np.random.default_rng(seed)
+    if intrinsic_dim:
+        basis = np.linalg.qr(rng.standard_normal((dim, intrinsic_dim)))[0].T
+        centers = _normalize(rng.standard_normal((clusters, intrinsic_dim)) @ basis)
+    else:
+        centers = _normalize(rng.standard_normal((clusters, dim)))
+    labels = rng.integers(0, clusters, n)
+    return _normalize(centers[labels] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32) / np.sqrt(dim))
+
+
+def build(backend: str, params: dict, base: np.ndarray, workdir: Path):
+    index = create_index(backend, workdir / f"{backend}-{len(list(workdir.iterdir()))}", params)
+    start = time.perf_counter()
+    for s in range(0, len(base), 50000):
+        index.add(base[s:s + 50000])
+    return index, time.perf_counter() - start
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    latencies = []
+    found = np.full((len(queries), k), -1, dtype=np.int64)
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        ids, _ = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found[i, : ids.shape[1]] = ids[0]
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "recall": float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=200000, help="indexed vectors")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--intrinsic-dim", type=int, default=0, help="synthetic centers in a subspace of this many dims (0 = full rank)")
+    parser.add_argument("--vectors", help="optional .npy of real embeddings instead of synthetic data")
+    parser.add_argument("--backends", default="exact,int8,binary,pca,ivfpq,chroma")
+    parser.add_argument("--nprobe", default="4,16,64", help="ivfpq settings to sweep")
+    parser.add_argument("--hnsw-ef", default="32,64,128", help="chroma search_ef settings to sweep")
+    parser.add_argument("--pca-dims", default="64,128,192", help="pca: reduced dimensions to build")
+    parser.add_argument("--pca-quant", default="none,int8,binary", help="pca: storage of the projected vectors")
+    parser.add_argument("--rescore", default="0,50,200", help="pca: full-precision rescoring depths to sweep")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.vectors:
+        data = _normalize(np.load(args.vectors))
+        rng = np.random.default_rng(args.seed)
+        pick = rng.choice(len(data), size=min(args.queries, len(data)), replace=False)
+        queries = _normalize(data[pick] + 0.05 * rng.standard_normal(data[pick].shape).astype(np.float32))
+        base = data
+    else:
+        data = synthetic(args.n + args.queries, args.dim, args.clusters, args.seed, args.intrinsic_dim)
+        base, queries = data[: args.n], data[args.n:]
+    print(f"{len(base)} vectors x {base.shape[1]} dims, {len(queries)} queries, recall@{args.k} vs exact")
+
+    # Ground truth from the exact scores, computed once
+    truth = np.argsort(-(queries @ base.T), axis=1)[:, : args.k]
+
+    # Build-time settings per backend, and the search-time settings swept on each build
+    settings = []
+    for backend in args.backends.split(","):
+        if backend == "ivfpq":
+            settings.append(("ivfpq", {}, [{"nprobe": int(p)} for p in args.nprobe.split(",")]))
+        elif backend == "pca":
+            rescores = [{"rescore": int(r)} for r in args.rescore.split(",")]
+            settings += [
+                ("pca", {"dim": int(d), "quantization": q}, rescores)
+                for d in args.pca_dims.split(",") for q in args.pca_quant.split(",")
+            ]
+        elif backend == "chroma":
+            settings += [("chroma", {"hnsw_search_ef": int(e)}, [{}]) for e in args.hnsw_ef.split(",")]
+        else:
+            settings.append((backend, {}, [{}]))
+
+    print(f"{'backend':<44} {'build_s':>8} {'MB/1M':>8} {'p50_ms':>7} {'p95_ms':>7} {'recall':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend, build_params, sweeps in settings:
+            try:
+                index, build_s = build(backend, build_params, base, Path(tmp))
+            except ImportError as e:
+                print(f"{backend:<44} skipped ({e})")
+                continue
+            mb = index.nbytes() / len(base)  # bytes/vector == MB per million vectors
+            for search_params in sweeps:
+                index.params.update(search_params)
+                r = measure(index, queries, truth, args.k)
+                label = backend + "".join(f" {k}={v}" for k, v in {**build_params, **search_params}.items())
+                print(f"{label:<44} {build_s:>8.1f} {mb:>8.0f} {r['p50_ms']:>7.2f} {r['p95_ms']:>7.2f} {r['recall']:>7.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Tier 1 latency under SLM load, with and without priority lanes.
+
+A steady stream of Tier 1 queries (dataset instructions) is sent while --slow-concurrency requests that
+need the SLM are kept in flight. "shared" runs every request through one server thread pool (a sync
+FastAPI endpoint); "lanes" uses Orchestrator.respond_async. Reports Tier 1 p50/p95/p99 for each.
+--simulate-slm-ms replaces generation with a CPU-bound matmul loop of that length, for boxes without the model.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+
+from src.config import load_config
+from src.dataset_io import iter_samples
+from src.lanes import LaneScheduler
+from src.orchestrator import Orchestrator
+
+SLOW_QUERIES = [
+    "Write a detailed note for a customer comparing floating and fixed home loans, case {}",
+    "Explain step by step how a bank evaluates a business loan application, scenario {}",
+    "Draft a polite reply to a customer unhappy about branch service, ticket {}",
+]
+
+
+def simulated_generate(ms: float):
+    a = np.random.default_rng(0).standard_normal((768, 768)).astype(np.float32)
+
+    def generate(*_args, **_kwargs) -> str:
+        end = time.perf_counter() + ms / 1000
+        while time.perf_counter() < end:
+            a @ a  # releases the GIL like a torch forward pass
+        return "Simulated answer."
+
+    return generate
+
+
+def percentiles(latencies: list[float]) -> tuple[float, float, float]:
+    if not latencies:
+        return float("nan"), float("nan"), float("nan")
+    p = np.percentile(latencies, [50, 95, 99])
+    return float(p[0]), float(p[1]), float(p[2])
+
+
+async def run(orch: Orchestrator, mode: str, fast_queries: list[str], args) -> dict:
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(args.server_threads))
+
+    async def call(q: str):
+        if mode == "lanes":
+            return await orch.respond_async(q)
+        return await asyncio.to_thread(orch.respond, q)
+
+    stop = time.perf_counter() + args.duration
+    slow_done = 0
+
+    async def slow_worker(w: int):
+        nonlocal slow_done
+        i = 0
+        while time.perf_counter() < stop:
+            await call(SLOW_QUERIES[i % len(SLOW_QUERIES)].format(f"{w}-{i}"))
+            slow_done += 1
+            i += 1
+
+    latencies, tiers = [], {}
+
+    async def fast_one(q: str, scheduled: float):
+        r = await call(q)
+        # From the scheduled arrival, so a starved event loop shows up as latency rather than fewer requests
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+        tiers[r.tier] = tiers.get(r.tier, 0) + 1
+
+    slow_tasks = [asyncio.create_task(slow_worker(w)) for w in range(args.slow_concurrency)]
+    await asyncio.sleep(0.5)  # let the slow backlog build
+    fast_tasks = []
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for k in range(int((stop - start) * args.fast_rps)):
+        scheduled = start + k / args.fast_rps
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        fast_tasks.append(asyncio.create_task(fast_one(rng.choice(fast_queries), scheduled)))
+    await asyncio.gather(*fast_tasks)
+    await asyncio.gather(*slow_tasks)
+    p50, p95, p99 = percentiles(latencies)
+    return {"p50": p50, "p95": p95, "p99": p99, "n": len(latencies), "slow_done": slow_done, "tiers": tiers}
+
+
+def main():
+    cfg = load_config()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per run")
+    parser.add_argument("--fast-rps", type=float, default=20.0, help="Tier 1 queries per second")
+    parser.add_argument("--slow-concurrency", type=int, default=32, help="SLM requests kept in flight")
+    parser.add_argument("--server-threads", type=int, default=40, help="thread pool of the shared mode (anyio default)")
+    parser.add_argument("--slow-workers", type=int, default=None, help="override lanes.slow_workers")
+    parser.add_argument("--slow-order", choices=["fifo", "shortest_first"], default=None)
+    parser.add_argument("--simulate-slm-ms", type=float, default=0, help="replace SLM generation with a CPU loop of this length")
+    args = parser.parse_args()
+
+    sim = cfg.get("similarity", {})
+    fast_queries = [s["instruction"] for s in islice(iter_samples(PROJECT_ROOT / sim.get("dataset_path", "data/alpaca_bfsi.json")), 500)]
+    if not fast_queries:
+        print("No dataset samples found")
+        return 1
+
+    lanes_cfg = dict(cfg.get("lanes", {}))
+    if args.slow_workers:
+        lanes_cfg["slow_workers"] = args.slow_workers
+    if args.slow_order:
+        lanes_cfg["slow_order"] = args.slow_order
+
+    orch = Orchestrator()
+    orch.coalescer = None  # every request does its own work
+    if args.simulate_slm_ms:
+        orch.slm.generate = simulated_generate(args.simulate_slm_ms)
+    orch.warm_up(load_slm=not args.simulate_slm_ms)
+    orch.similarity.query(fast_queries[0])  # open the index outside the timing
+
+    print(f"{args.duration:.0f}s per run, Tier 1 at {args.fast_rps:.0f} rps, {args.slow_concurrency} SLM requests in flight")
+    print(f"{'mode':<8} {'slm_load':<8} {'n':>5} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'slm_done':>8}")
+    for mode in ("shared", "lanes"):
+        orch.lanes = LaneScheduler({"lanes": lanes_cfg}) if mode == "lanes" else None
+        for load in (False, True):
+            saved = args.slow_concurrency
+            args.slow_concurrency = saved if load else 0
+            r = asyncio.run(run(orch, mode, fast_queries, args))
+            args.slow_concurrency = saved
+            print(f"{mode:<8} {'on' if load else 'off':<8} {r['n']:>5} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f} {r['slow_done']:>8}")
+            slow_tiers = {t: n for t, n in r["tiers"].items() if t in ("slm", "rag")}
+            if slow_tiers:
+                print(f"         (some dataset queries missed the fast path: {slow_tiers})")
+        if orch.lanes is not None:
+            orch.lanes.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,33 @@
-"""Build or rebuild the dataset similarity index (Tier 1). Run after updating data/alpaca_bfsi.json."""
+"""Build or rebuild the dataset similarity index (Tier 1) as a new index version. Run after updating data/alpaca_bfsi.json."""
+import argparse
 import sys
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
+from src.dataset_io import dataset_files
 from src.similarity import DatasetSimilarity
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--force", action="store_true", help="rebuild even if the published version matches the dataset files")
+    parser.add_argument("--batch-size", type=int, help="samples embedded per checkpointed batch (similarity.build_batch_size)")
+    parser.add_argument("--workers", type=int, help="embedding processes (embedding.workers; 0 = all cores)")
+    args = parser.parse_args()
+
     ds = DatasetSimilarity()
-    if ds._load_dataset() is None:
-        print("ERROR: Dataset not found or empty. Run scripts/build_dataset.py first.")
+    if args.batch_size:
+        ds.build_batch_size = args.batch_size
+    if not dataset_files(ds.dataset_path):
+        print("ERROR: Dataset not found. Run scripts/build_dataset.py first.")
         sys.exit(1)
-    if not ds._build_index():
-        print("ERROR: Failed to build index.")
+    version = ds.build(force=args.force, workers=args.workers)
+    if version is None:
+        print("ERROR: Failed to build index (empty dataset, or another build is running).")
         sys.exit(1)
-    print("Dataset index built successfully at", ds.index_path)
+    print(f"Dataset index version {version} is current at {ds.index_path}; running servers switch on their next reload")
 
 
 if __name__ == "__main__":
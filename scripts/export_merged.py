@@ -0,0 +1,79 @@
+"""Merge LoRA adapters into the base SLM and export a versioned safetensors checkpoint with a manifest."""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.artifacts import TRAINING_INFO_NAME, read_manifest, sha256_file, write_manifest
+from src.config import load_config, PROJECT_ROOT
+from src.dataset_io import dataset_sha256
+
+
+def main():
+    cfg = load_config()
+    slm_cfg = cfg.get("slm", {})
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--adapter", default=slm_cfg.get("adapter_path", "models/adapters/v1.0"))
+    parser.add_argument("--out", default=slm_cfg.get("merged_path", "models/merged/v1.0"))
+    parser.add_argument("--dtype", default=slm_cfg.get("merged_dtype", "bfloat16"), choices=["bfloat16", "float16", "float32"])
+    args = parser.parse_args()
+
+    base_model = slm_cfg.get("base_model", "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
+    adapter_path = Path(args.adapter)
+    if not adapter_path.is_absolute():
+        adapter_path = PROJECT_ROOT / adapter_path
+    out_path = Path(args.out)
+    if not out_path.is_absolute():
+        out_path = PROJECT_ROOT / out_path
+    if not adapter_path.exists():
+        print(f"Adapter not found: {adapter_path}. Run scripts/finetune.py first.")
+        return 1
+
+    try:
+        import torch
+        import transformers
+        from peft import PeftModel
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+    except ImportError as e:
+        print("Install: pip install torch transformers peft")
+        raise SystemExit(1) from e
+
+    start = time.perf_counter()
+    # Merge in fp32 so the LoRA delta is added at full precision, then cast once
+    model = AutoModelForCausalLM.from_pretrained(base_model, torch_dtype=torch.float32, low_cpu_mem_usage=True)
+    model = PeftModel.from_pretrained(model, str(adapter_path)).merge_and_unload()
+    model = model.to(getattr(torch, args.dtype))
+    out_path.mkdir(parents=True, exist_ok=True)
+    model.save_pretrained(str(out_path), safe_serialization=True)
+    AutoTokenizer.from_pretrained(str(adapter_path) if (adapter_path / "tokenizer_config.json").exists() else base_model).save_pretrained(str(out_path))
+
+    training = read_manifest(adapter_path, TRAINING_INFO_NAME) or {}
+    dataset_sha = training.get("dataset_sha256")
+    if dataset_sha is None:
+        dataset_path = PROJECT_ROOT / cfg.get("similarity", {}).get("dataset_path", "data/alpaca_bfsi.json")
+        print(f"No {TRAINING_INFO_NAME} in adapter; recording hash of current {dataset_path.name}")
+        dataset_sha = dataset_sha256(dataset_path)
+    adapter_files = sorted(p for p in adapter_path.glob("adapter_model.*"))
+    manifest = {
+        "base_model": base_model,
+        "adapter_path": str(adapter_path.relative_to(PROJECT_ROOT) if adapter_path.is_relative_to(PROJECT_ROOT) else adapter_path),
+        "adapter_version": adapter_path.name,
+        "adapter_sha256": sha256_file(adapter_files[0]) if adapter_files else None,
+        "dataset_sha256": dataset_sha,
+        "dtype": args.dtype,
+        "transformers_version": transformers.__version__,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "files": {p.name: sha256_file(p) for p in sorted(out_path.glob("*.safetensors"))},
+    }
+    write_manifest(out_path, manifest)
+    size = sum(p.stat().st_size for p in out_path.glob("*.safetensors"))
+    print(f"Merged checkpoint ({args.dtype}, {size / 1e9:.2f} GB) written to {out_path} in {time.perf_counter() - start:.1f}s")
+    print("Set slm.merged_path in config.yaml to serve it.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,136 @@
 """Fine-tune base SLM on Alpaca BFSI dataset using LoRA. Saves adapters to models/adapters/v1.0."""
+import hashlib
 import json
 import sys
+import time
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
+from src.artifacts import TRAINING_INFO_NAME, write_manifest
 from src.config import load_config, PROJECT_ROOT
+from src.dataset_io import dataset_sha256, iter_samples
 
 
 def load_alpaca(path: Path) -> list[dict]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return list(iter_samples(path))
+
+
+def pack_examples(token_lists: list[list[int]], max_length: int) -> list[list[list[int]]]:
+    """First-fit-decreasing bin packing of examples into sequences of at most max_length tokens."""
+    bins: list[list[list[int]]] = []
+    room: list[int] = []
+    for ids in sorted(token_lists, key=len, reverse=True):
+        for i, free in enumerate(room):
+            if len(ids) <= free:
+                bins[i].append(ids)
+                room[i] -= len(ids)
+                break
+        else:
+            bins.append([ids])
+            room.append(max_length - len(ids))
+    return bins
+
+
+def load_or_tokenize(texts: list[str], tokenizer, base_model: str, dataset_path: Path, ft_cfg: dict):
+    """
+    Tokenize without padding (EOS appended so the model learns to stop), optionally pack, and cache the
+    result on disk keyed by dataset hash, tokenizer and settings so later runs skip this step.
+    """
+    from datasets import Dataset, load_from_disk
+
+    max_length = int(ft_cfg.get("max_length", 512))
+    packing = bool(ft_cfg.get("packing", False))
+    key_src = json.dumps([dataset_sha256(dataset_path), base_model, len(tokenizer), max_length, packing])
+    key = hashlib.sha256(key_src.encode("utf-8")).hexdigest()[:16]
+    cache_dir = PROJECT_ROOT / ft_cfg.get("tokenized_cache_dir", "data/tokenized_cache") / key
+    if cache_dir.exists():
+        print("Using cached tokenized dataset:", cache_dir)
+        return load_from_disk(str(cache_dir))
+
+    eos = [tokenizer.eos_token_id] if tokenizer.eos_token_id is not None else []
+    token_lists = [
+        ids[: max_length - len(eos)] + eos
+        for ids in tokenizer(texts, truncation=True, max_length=max_length)["input_ids"]
+    ]
+    if packing:
+        bins = pack_examples(token_lists, max_length)
+        data = {
+            "input_ids": [[t for ids in b for t in ids] for b in bins],
+            "seq_lens": [[len(ids) for ids in b] for b in bins],
+        }
+    else:
+        data = {"input_ids": token_lists}
+    data["length"] = [len(ids) for ids in data["input_ids"]]
+    dataset = Dataset.from_dict(data)
+    dataset.save_to_disk(str(cache_dir))
+    return dataset
+
+
+class PadCollator:
+    """Pad each batch to its longest row (or pad_to); labels are the inputs with padding masked out."""
+
+    def __init__(self, pad_token_id: int, pad_to: int | None = None, multiple_of: int = 8):
+        self.pad_token_id = pad_token_id
+        self.pad_to = pad_to
+        self.multiple_of = multiple_of
+        self.real = 0
+        self.total = 0
+
+    def padding_fraction(self) -> float:
+        return 1 - self.real / self.total if self.total else 0.0
+
+    def __call__(self, features: list[dict]) -> dict:
+        import torch
+        longest = max(len(f["input_ids"]) for f in features)
+        width = self.pad_to or -(-longest // self.multiple_of) * self.multiple_of
+        ids = torch.full((len(features), width), self.pad_token_id, dtype=torch.long)
+        mask = torch.zeros((len(features), width), dtype=torch.long)
+        for i, f in enumerate(features):
+            n = len(f["input_ids"])
+            ids[i, :n] = torch.tensor(f["input_ids"])
+            mask[i, :n] = 1
+        self.real += int(mask.sum())
+        self.total += mask.numel()
+        labels = ids.masked_fill(mask == 0, -100)
+        return {"input_ids": ids, "attention_mask": mask, "labels": labels}
+
+
+class PackedCollator(PadCollator):
+    """
+    Rows hold several examples back to back. Attention is block-diagonal causal (an example never sees the one
+    before it), position ids restart per example, and the first token of each example is not a target.
+    """
+
+    def __call__(self, features: list[dict]) -> dict:
+        import torch
+        longest = max(len(f["input_ids"]) for f in features)
+        width = -(-longest // self.multiple_of) * self.multiple_of
+        batch = len(features)
+        ids = torch.full((batch, width), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((batch, width), -100, dtype=torch.long)
+        positions = torch.zeros((batch, width), dtype=torch.long)
+        allowed = torch.zeros((batch, 1, width, width), dtype=torch.bool)
+        causal = torch.ones((width, width), dtype=torch.bool).tril()
+        for i, f in enumerate(features):
+            n = len(f["input_ids"])
+            ids[i, :n] = torch.tensor(f["input_ids"])
+            labels[i, :n] = ids[i, :n]
+            start = 0
+            for seg in f["seq_lens"]:
+                end = start + seg
+                allowed[i, 0, start:end, start:end] = causal[:seg, :seg]
+                positions[i, start:end] = torch.arange(seg)
+                labels[i, start] = -100
+                start = end
+            # Padding rows attend to themselves only, so softmax stays finite
+            allowed[i, 0, n:, n:] = torch.eye(width - n, dtype=torch.bool)
+            self.real += n
+        self.total += batch * width
+        # Additive float mask (0 = attend), the form transformers accepts as a ready-made 4D mask
+        mask = torch.zeros(allowed.shape, dtype=torch.float32).masked_fill(~allowed, torch.finfo(torch.float32).min)
+        return {"input_ids": ids, "attention_mask": mask, "position_ids": positions, "labels": labels}
 
 
 def main():
@@ -21,11 +140,14 @@ def main():
     adapter_path = PROJECT_ROOT / slm_cfg.get("adapter_path", "models/adapters/v1.0")
     dataset_path = PROJECT_ROOT / cfg.get("similarity", {}).get("dataset_path", "data/alpaca_bfsi.json")
     use_4bit = slm_cfg.get("use_4bit", False)
+    ft_cfg = cfg.get("finetune", {})
+    max_length = int(ft_cfg.get("max_length", 512))
+    packing = bool(ft_cfg.get("packing", False))
 
     try:
         from transformers import AutoModelForCausalLM, AutoTokenizer, TrainingArguments, Trainer
         from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
-        from datasets import Dataset
+        import datasets  # noqa: F401
     except ImportError as e:
         print("Install: pip install transformers peft datasets")
         raise SystemExit(1) from e
@@ -50,22 +172,20 @@ def main():
         format_prompt(s["instruction"], s.get("input", ""), s["output"])
         for s in samples
     ]
-    dataset = Dataset.from_dict({"text": texts})
-
-    def tokenize(examples):
-        tokenizer = tokenizer_ref[0]
-        return tokenizer(
-            examples["text"],
-            truncation=True,
-            max_length=512,
-            padding="max_length",
-        )
 
     tokenizer = AutoTokenizer.from_pretrained(base_model, trust_remote_code=True)
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
-    tokenizer_ref = [tokenizer]
-    tokenized = dataset.map(tokenize, batched=True, remove_columns=dataset.column_names)
+    tokenized = load_or_tokenize(texts, tokenizer, base_model, dataset_path, ft_cfg)
+    if packing:
+        collator = PackedCollator(tokenizer.pad_token_id)
+    else:
+        pad_to = max_length if ft_cfg.get("padding", "dynamic") == "max_length" else None
+        collator = PadCollator(tokenizer.pad_token_id, pad_to=pad_to)
+    print(
+        f"Training rows: {len(tokenized)} ({'packed' if packing else ft_cfg.get('padding', 'dynamic') + ' padding'}), "
+        f"tokens/epoch: {sum(tokenized['length'])}"
+    )
 
     model_kwargs = {"trust_remote_code": True}
     if use_4bit:
@@ -95,9 +215,18 @@ def main():
     model = get_peft_model(model, lora_config)
 
     adapter_path.mkdir(parents=True, exist_ok=True)
+    epochs = 3
+    extra_args = {}
+    if ft_cfg.get("group_by_length", True) and not packing:
+        # Batches of similar length waste little on padding (renamed in newer transformers)
+        if "group_by_length" in TrainingArguments.__dataclass_fields__:
+            extra_args["group_by_length"] = True
+        else:
+            extra_args["train_sampling_strategy"] = "group_by_length"
+        extra_args["length_column_name"] = "length"
     training_args = TrainingArguments(
         output_dir=str(adapter_path),
-        num_train_epochs=3,
+        num_train_epochs=epochs,
         per_device_train_batch_size=2,
         gradient_accumulation_steps=4,
         learning_rate=2e-5,
@@ -105,16 +234,33 @@ def main():
         logging_steps=10,
         save_strategy="epoch",
         save_total_limit=1,
+        # The collators read "length"/"seq_lens" and emit only model inputs
+        remove_unused_columns=False,
+        **extra_args,
     )
     trainer = Trainer(
         model=model,
         args=training_args,
         train_dataset=tokenized,
+        data_collator=collator,
     )
+    start = time.perf_counter()
     trainer.train()
+    wall = time.perf_counter() - start
+    real_tokens = sum(tokenized["length"]) * epochs
+    print(
+        f"Training wall time: {wall:.1f}s  tokens/sec: {real_tokens / wall:.1f}  "
+        f"padding overhead: {collator.padding_fraction():.1%}"
+    )
     trainer.save_model(str(adapter_path))
     tokenizer.save_pretrained(str(adapter_path))
+    write_manifest(
+        adapter_path,
+        {"base_model": base_model, "dataset_path": str(dataset_path.name), "dataset_sha256": dataset_sha256(dataset_path)},
+        name=TRAINING_INFO_NAME,
+    )
     print("Adapters saved to", adapter_path)
+    print("Export a merged checkpoint for serving: python scripts/export_merged.py")
 
 
 if __name__ == "__main__":
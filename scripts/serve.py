@@ -0,0 +1,34 @@
+"""Serve the FastAPI demo with N pre-forked workers sharing one copy of the model weights."""
+import argparse
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.logging_config import setup_logging
+from src.serving import serve_prefork
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--app", default="demo.api:app", help="module:attribute of the ASGI app")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--no-slm", action="store_true", help="do not preload the SLM in the parent")
+    args = parser.parse_args()
+    setup_logging()
+    return serve_prefork(
+        app_path=args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        load_slm=not args.no_slm,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+"""Convert the dataset (JSON array or shards) into sharded JSONL for streaming reads and chunked index builds."""
+import argparse
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.config import load_config, PROJECT_ROOT
+from src.dataset_io import iter_samples, write_jsonl_shards
+
+
+def main():
+    cfg = load_config()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--src", default=cfg.get("similarity", {}).get("dataset_path", "data/alpaca_bfsi.json"))
+    parser.add_argument("--out", default="data/alpaca_bfsi", help="output directory of part-NNNNN.jsonl shards")
+    parser.add_argument("--shard-size", type=int, default=50000, help="samples per shard")
+    args = parser.parse_args()
+
+    src, out = Path(args.src), Path(args.out)
+    src = src if src.is_absolute() else PROJECT_ROOT / src
+    out = out if out.is_absolute() else PROJECT_ROOT / out
+    shards = write_jsonl_shards(iter_samples(src), out, shard_size=args.shard_size)
+    print(f"Wrote {len(shards)} shard(s) to {out}. Set similarity.dataset_path to \"{args.out}\" to use them.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Tune similarity.threshold and rag.complex_keywords on a labeled query set.
+
+Input is JSONL with one query per line:
+  {"query": "...", "expected": "<dataset instruction that answers it>" | null, "rag": true | false}
+"expected" is null when no stored answer is right; "rag" says whether a Tier 1 miss should go to RAG.
+The query×dataset similarity matrix is computed once. Routing is replayed as live Tier 1 decides it:
+a score at or above the threshold is a hit, and a score in [gray_zone.lower, threshold) is a hit if
+the gray-zone re-ranker (similarity.gray_zone, same method and rules) accepts one of the top_k
+candidates. Every (threshold, lower) pair and keyword set is then scored with array operations.
+Prints a table per threshold (with its best lower) and writes a recommended config block.
+"""
+import argparse
+import itertools
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+import yaml
+
+from src.calculator import LoanCalculator
+from src.config import load_config, PROJECT_ROOT
+from src.dataset_io import iter_samples
+from src.embeddings import get_embedder
+from src.rerank import GrayZoneReranker
+from src.similarity import _text_for_embedding
+from src.structured import KnowledgeFacts
+
+EXTRA_KEYWORDS = ["charges", "moratorium", "lock-in", "security", "foreclosure", "example", "calculate"]
+
+
+def load_labeled(path: Path) -> list[dict]:
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                rows.append(json.loads(line))
+    return rows
+
+
+def keyword_subsets(keywords: list[str], max_subsets: int) -> np.ndarray:
+    """[S, K] boolean masks: every subset if few keywords, else the full set minus one or two at a time."""
+    k = len(keywords)
+    if 2 ** k <= max_subsets:
+        return np.array(list(itertools.product([False, True], repeat=k))[1:], dtype=bool)
+    masks = [np.ones(k, dtype=bool)]
+    for drop in itertools.chain(itertools.combinations(range(k), 1), itertools.combinations(range(k), 2)):
+        m = np.ones(k, dtype=bool)
+        m[list(drop)] = False
+        masks.append(m)
+    return np.array(masks[:max_subsets])
+
+
+def main():
+    cfg = load_config()
+    sim_cfg = cfg.get("similarity", {})
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default="data/tuning_queries.example.jsonl")
+    parser.add_argument("--min-precision", type=float, default=0.95, help="Tier 1 precision the threshold must keep")
+    parser.add_argument("--thresholds", default="0.70:0.96:0.01", help="start:stop:step")
+    parser.add_argument("--gray-lowers", default="0.70:0.94:0.02", help="gray_zone.lower values, start:stop:step (the zone off is always tried)")
+    parser.add_argument("--extra-keywords", default=",".join(EXTRA_KEYWORDS), help="candidates added to rag.complex_keywords")
+    parser.add_argument("--max-keyword-sets", type=int, default=4096)
+    parser.add_argument("--latency-ms", default="fast=2,dataset=40,slm=2500,rag=3500", help="mean cost per route")
+    parser.add_argument("--out", default="data/tuning_recommendation.yaml")
+    args = parser.parse_args()
+
+    queries_path = Path(args.queries)
+    if not queries_path.is_absolute():
+        queries_path = PROJECT_ROOT / queries_path
+    dataset_path = PROJECT_ROOT / sim_cfg.get("dataset_path", "data/alpaca_bfsi.json")
+    labeled = load_labeled(queries_path)
+    samples = list(iter_samples(dataset_path))
+    cost = {k: float(v) for k, v in (kv.split("=") for kv in args.latency_ms.split(","))}
+
+    # Queries the calculator or the structured facts answer never reach Tier 1
+    calculator, facts = LoanCalculator(), KnowledgeFacts()
+    fast = np.array([calculator.answer(r["query"]) is not None or facts.answer(r["query"]) is not None for r in labeled])
+
+    by_instruction = {s["instruction"].strip().lower(): i for i, s in enumerate(samples)}
+    outputs = np.array([s["output"] for s in samples], dtype=object)
+    expected = np.array([by_instruction.get((r.get("expected") or "").strip().lower(), -1) for r in labeled])
+    unknown = [r["expected"] for r, e in zip(labeled, expected) if r.get("expected") and e < 0]
+    if unknown:
+        print(f"WARNING: {len(unknown)} expected instructions not in dataset, treated as null: {unknown[:3]}")
+    wants_rag = np.array([bool(r.get("rag", False)) for r in labeled])
+
+    embedder = get_embedder(sim_cfg.get("embedding_model", "all-MiniLM-L6-v2"))
+    doc_emb = embedder.encode(
+        [_text_for_embedding(s["instruction"], s.get("input", "")) for s in samples],
+        normalize_embeddings=True, show_progress_bar=len(samples) > 50,
+    )
+    q_emb = embedder.encode([r["query"] for r in labeled], normalize_embeddings=True)
+    sims = q_emb @ doc_emb.T  # [Q, N] cosine
+    best_idx = sims.argmax(axis=1)
+    best = sims[np.arange(len(labeled)), best_idx]
+    # Correct if the answer served carries the expected answer (duplicate outputs count)
+    def is_correct(served: np.ndarray) -> np.ndarray:
+        return np.array([s >= 0 and e >= 0 and outputs[s] == outputs[e] for s, e in zip(served, expected)])
+
+    correct = is_correct(best_idx)
+
+    # --- gray-zone replay: what the re-ranker accepts for each lower bound, [L, Q] sample index or -1 ---
+    gray_cfg = sim_cfg.get("gray_zone", {})
+    top_k = int(sim_cfg.get("top_k", 5))
+    top = np.argsort(-sims, axis=1)[:, :top_k]
+    texts = [_text_for_embedding(s["instruction"], s.get("input", "")) for s in samples]
+    start, stop, step = (float(x) for x in args.gray_lowers.split(":"))
+    lowers = np.append(np.round(np.arange(start, stop + 1e-9, step), 4), 1.0)  # 1.0 = zone off
+    gray_pick = np.full((len(lowers), len(labeled)), -1)
+    for li, lower in enumerate(lowers[:-1]):
+        reranker = GrayZoneReranker({**gray_cfg, "enabled": True, "lower": float(lower)})
+        for qi in np.flatnonzero(~fast & (best >= lower)):
+            candidates = [(texts[i], float(sims[qi, i]), outputs[i]) for i in top[qi]]
+            chosen = reranker.pick(labeled[qi]["query"], candidates)
+            if chosen is not None:
+                gray_pick[li, qi] = top[qi][chosen]
+    gray_correct = np.array([is_correct(row) for row in gray_pick])  # [L, Q]
+
+    # --- (threshold, lower) sweep: [T, L, Q] ---
+    start, stop, step = (float(x) for x in args.thresholds.split(":"))
+    thresholds = np.round(np.arange(start, stop + 1e-9, step), 4)
+    above = best[None, :] >= thresholds[:, None]  # [T, Q]
+    in_gray = ~above[:, None, :] & (best[None, None, :] >= lowers[None, :, None])
+    hit_tl = (above[:, None, :] | (in_gray & (gray_pick[None] >= 0))) & ~fast[None, None, :]
+    good_tl = (hit_tl & np.where(above[:, None, :], correct[None, None, :], gray_correct[None])).sum(axis=2)
+    hits_tl = hit_tl.sum(axis=2)
+    precision_tl = np.where(hits_tl > 0, good_tl / np.maximum(hits_tl, 1), 1.0)  # [T, L]
+    # Per threshold, the lower with the highest hit rate that keeps precision (else the most precise);
+    # among equals the narrower zone
+    meets = precision_tl >= args.min_precision
+    rank = np.where(meets, hits_tl, -1 + precision_tl)
+    l_best = np.array([int(np.lexsort((lowers, rank[t]))[-1]) for t in range(len(thresholds))])
+    t_rows = np.arange(len(thresholds))
+    hit = hit_tl[t_rows, l_best]  # [T, Q] at each threshold's best lower
+    n_tier1 = max(int((~fast).sum()), 1)
+    hits = hits_tl[t_rows, l_best]
+    good = good_tl[t_rows, l_best]
+    precision = precision_tl[t_rows, l_best]
+    hit_rate = hits / n_tier1
+    answerable = max(int(((correct | gray_correct.any(axis=0)) & ~fast).sum()), 1)
+    recall = good / answerable
+
+    def lower_label(t: int) -> str:
+        lower = lowers[l_best[t]]
+        return "off" if lower >= thresholds[t] else f"{lower:.2f}"
+
+    # --- keyword sweep over Tier 1 misses: [T, S, Q] ---
+    keywords = list(dict.fromkeys(
+        [k.lower() for k in cfg.get("rag", {}).get("complex_keywords", [])]
+        + [k.strip().lower() for k in args.extra_keywords.split(",") if k.strip()]
+    ))
+    present = np.array([[kw in r["query"].lower() for kw in keywords] for r in labeled])  # [Q, K]
+    masks = keyword_subsets(keywords, args.max_keyword_sets)  # [S, K]
+    complex_q = (present.astype(np.int32) @ masks.T.astype(np.int32)).T > 0  # [S, Q]
+    routed = ~hit[:, None, :] & ~fast[None, None, :]  # Tier 1 misses per threshold
+    tp = (routed & complex_q[None] & wants_rag).sum(axis=2)
+    fp = (routed & complex_q[None] & ~wants_rag).sum(axis=2)
+    fn = (routed & ~complex_q[None] & wants_rag).sum(axis=2)
+    f1 = np.where(tp > 0, 2 * tp / np.maximum(2 * tp + fp + fn, 1), 0.0)  # [T, S]
+    rag_share = (routed & complex_q[None]).sum(axis=2)
+    slm_share = (routed & ~complex_q[None]).sum(axis=2)
+    latency = (
+        fast.sum() * cost["fast"] + hits[:, None] * cost["dataset"]
+        + slm_share * (cost["dataset"] + cost["slm"]) + rag_share * (cost["dataset"] + cost["rag"])
+    ) / len(labeled)  # [T, S] expected mean ms
+
+    print(f"{len(labeled)} labeled queries ({int(fast.sum())} answered by calculator/structured), {len(samples)} dataset samples")
+    print(f"{'threshold':>9} {'gray_lower':>10} {'precision':>9} {'hit_rate':>8} {'recall':>6} {'best_kw_f1':>10} {'mean_ms':>8}")
+    best_kw = f1.argmax(axis=1)
+    for t in range(len(thresholds)):
+        s = best_kw[t]
+        print(
+            f"{thresholds[t]:>9.2f} {lower_label(t):>10} {precision[t]:>9.3f} {hit_rate[t]:>8.3f} {recall[t]:>6.3f}"
+            f" {f1[t, s]:>10.3f} {latency[t, s]:>8.0f}"
+        )
+
+    ok = np.flatnonzero(precision >= args.min_precision)
+    if len(ok) == 0:
+        print(f"No threshold reaches precision {args.min_precision}; keeping {sim_cfg.get('threshold', 0.88)}")
+        t_best = int(np.abs(thresholds - float(sim_cfg.get("threshold", 0.88))).argmin())
+    else:
+        # Highest hit rate that keeps precision; among equals the higher (safer) threshold
+        t_best = int(ok[np.lexsort((thresholds[ok], hit_rate[ok]))[-1]])
+    # Best F1 at that threshold, then lowest latency, then fewest keywords
+    s_best = int(np.lexsort((masks.sum(axis=1), latency[t_best], -f1[t_best]))[0])
+    chosen = [kw for kw, m in zip(keywords, masks[s_best]) if m]
+
+    current = float(sim_cfg.get("threshold", 0.88))
+    t_cur = int(np.abs(thresholds - current).argmin())
+    current_lower = float(gray_cfg.get("lower", 0.80)) if gray_cfg.get("enabled", False) else 1.0
+    l_cur = int(np.abs(lowers - current_lower).argmin())
+    suggested_lower = float(lowers[l_best[t_best]])
+    gray_on = suggested_lower < thresholds[t_best]
+    print(
+        f"\nCurrent  threshold={current:.2f} gray_lower={'off' if current_lower >= current else f'{current_lower:.2f}'}: "
+        f"precision={precision_tl[t_cur, l_cur]:.3f} hit_rate={hits_tl[t_cur, l_cur] / n_tier1:.3f}"
+        f"\nSuggested threshold={thresholds[t_best]:.2f} gray_lower={lower_label(t_best)}: "
+        f"precision={precision[t_best]:.3f} hit_rate={hit_rate[t_best]:.3f} "
+        f"keyword F1={f1[t_best, s_best]:.3f} expected mean latency={latency[t_best, s_best]:.0f} ms"
+    )
+    block = {
+        "similarity": {
+            "threshold": float(thresholds[t_best]),
+            "gray_zone": {"enabled": True, "lower": suggested_lower} if gray_on else {"enabled": False},
+        },
+        "rag": {"complex_keywords": chosen},
+    }
+    out = Path(args.out)
+    if not out.is_absolute():
+        out = PROJECT_ROOT / out
+    out.parent.mkdir(parents=True, exist_ok=True)
+    header = f"# Recommended by scripts/tune_routing.py on {queries_path.name} ({len(labeled)} queries); merge into config.yaml\n"
+    out.write_text(header + yaml.safe_dump(block, sort_keys=False), encoding="utf-8")
+    print(f"\nRecommended config written to {out}:\n{yaml.safe_dump(block, sort_keys=False)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,42 +1,54 @@
-"""Validate Alpaca BFSI dataset schema and count."""
-import json
+"""Validate Alpaca BFSI dataset schema and count (streams JSON, JSONL or a directory of shards)."""
+import argparse
 import sys
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
-DATASET_PATH = PROJECT_ROOT / "data" / "alpaca_bfsi.json"
+sys.path.insert(0, str(PROJECT_ROOT))
 
+from src.config import load_config, PROJECT_ROOT
+from src.dataset_io import dataset_files, iter_samples
 
-def validate():
-    if not DATASET_PATH.exists():
-        print(f"Dataset not found: {DATASET_PATH}")
-        return False
-    with open(DATASET_PATH, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    if not isinstance(data, list):
-        print("Dataset must be a JSON array.")
+
+def validate(dataset_path: Path) -> bool:
+    files = dataset_files(dataset_path)
+    if not files:
+        print(f"Dataset not found: {dataset_path}")
         return False
     required = {"instruction", "output"}
-    for i, item in enumerate(data):
-        if not isinstance(item, dict):
-            print(f"Item {i}: must be an object.")
-            return False
-        if "input" not in item:
-            item["input"] = ""
-        for key in required:
-            if key not in item or not isinstance(item[key], str):
-                print(f"Item {i}: missing or invalid '{key}'.")
+    count = 0
+    try:
+        for i, item in enumerate(iter_samples(dataset_path)):
+            if not isinstance(item, dict):
+                print(f"Item {i}: must be an object.")
+                return False
+            for key in required:
+                if key not in item or not isinstance(item[key], str):
+                    print(f"Item {i}: missing or invalid '{key}'.")
+                    return False
+            if not isinstance(item.get("input", ""), str):
+                print(f"Item {i}: 'input' must be a string.")
                 return False
-        if len(item["instruction"].strip()) == 0 or len(item["output"].strip()) == 0:
-            print(f"Item {i}: instruction and output must be non-empty.")
-            return False
-    if len(data) < 150:
-        print(f"Dataset has {len(data)} samples; minimum required is 150.")
+            if len(item["instruction"].strip()) == 0 or len(item["output"].strip()) == 0:
+                print(f"Item {i}: instruction and output must be non-empty.")
+                return False
+            count += 1
+    except ValueError as e:
+        print(f"Invalid dataset file: {e}")
+        return False
+    if count < 150:
+        print(f"Dataset has {count} samples; minimum required is 150.")
         return False
-    print(f"Valid: {len(data)} samples, Alpaca format (instruction, input, output).")
+    print(f"Valid: {count} samples in {len(files)} file(s), Alpaca format (instruction, input, output).")
     return True
 
 
 if __name__ == "__main__":
-    ok = validate()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", nargs="?", help="dataset file, shard directory or glob (default: similarity.dataset_path)")
+    args = parser.parse_args()
+    path = Path(args.path or load_config().get("similarity", {}).get("dataset_path", "data/alpaca_bfsi.json"))
+    if not path.is_absolute():
+        path = PROJECT_ROOT / path
+    ok = validate(path)
     sys.exit(0 if ok else 1)
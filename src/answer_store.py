@@ -0,0 +1,118 @@
+"""
+On-disk Tier 1 answer store: each field (stored output, embedded question text) is one concatenated
+UTF-8 blob plus a uint64 offsets array, both memory-mapped. A string is decoded only when a hit needs
+it, with a small LRU for hot answers, so a worker holds the offsets rather than every sample dict.
+"""
+import mmap
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Iterable
+
+import numpy as np
+
+from src.artifacts import read_manifest, write_manifest
+
+
+def build_answer_store(samples: Iterable[dict], directory: Path, extract: dict[str, Callable[[dict], str]], stamp=None) -> int:
+    """Stream samples into <field>.bin / <field>.offsets.npy for each field; returns the sample count."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    blobs = {name: open(directory / f"{name}.bin.tmp", "wb") for name in extract}
+    offsets = {name: array("Q", [0]) for name in extract}
+    count = 0
+    try:
+        for sample in samples:
+            for name, fn in extract.items():
+                data = fn(sample).encode("utf-8")
+                blobs[name].write(data)
+                offsets[name].append(offsets[name][-1] + len(data))
+            count += 1
+    finally:
+        for f in blobs.values():
+            f.close()
+    for name in extract:
+        np.save(directory / f"{name}.offsets.npy", np.frombuffer(offsets[name], dtype=np.uint64))
+        (directory / f"{name}.bin.tmp").replace(directory / f"{name}.bin")
+    # Manifest last: a store without one (interrupted build) is rebuilt
+    write_manifest(directory, {"count": count, "fields": sorted(extract), "dataset": stamp})
+    return count
+
+
+class AnswerField:
+    """Random access to one field by sample index."""
+
+    def __init__(self, directory: Path, name: str, cache_size: int = 1024):
+        directory = Path(directory)
+        self.offsets = np.load(directory / f"{name}.offsets.npy", mmap_mode="r")
+        self._file = open(directory / f"{name}.bin", "rb")
+        size = int(self.offsets[-1])
+        # mmap of an empty file is an error; an all-empty field has nothing to read anyway
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        with self._lock:
+            value = self._cache.get(i)
+            if value is not None:
+                self._cache.move_to_end(i)
+                return value
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        value = self._blob[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+        if self.cache_size:
+            with self._lock:
+                self._cache[i] = value
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return value
+
+    def close(self) -> None:
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
+
+
+class AnswerStore:
+    """Fields of one store directory, opened lazily on first use."""
+
+    def __init__(self, directory: Path, cache_size: int = 1024):
+        self.directory = Path(directory)
+        self.cache_size = cache_size
+        self.manifest = read_manifest(self.directory) or {}
+        self._fields: dict[str, AnswerField] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return int(self.manifest.get("count", 0))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def field(self, name: str) -> AnswerField:
+        with self._lock:
+            f = self._fields.get(name)
+            if f is None:
+                # Question texts are only read in the gray zone; keep their cache small
+                f = AnswerField(self.directory, name, self.cache_size if name == "output" else min(self.cache_size, 64))
+                self._fields[name] = f
+            return f
+
+    def output(self, i: int) -> str:
+        return self.field("output")[i]
+
+    def text(self, i: int) -> str:
+        return self.field("text")[i]
+
+    def close(self) -> None:
+        with self._lock:
+            for f in self._fields.values():
+                f.close()
+            self._fields = {}
@@ -0,0 +1,36 @@
+"""Versioned model artifacts: content hashes and the manifest written next to exported checkpoints."""
+import hashlib
+import json
+from pathlib import Path
+
+MANIFEST_NAME = "manifest.json"
+TRAINING_INFO_NAME = "training_info.json"
+
+
+def sha256_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_manifest(artifact_dir: Path, name: str = MANIFEST_NAME) -> dict | None:
+    """Manifest dict of an artifact directory, or None if it has none (or it is unreadable)."""
+    path = Path(artifact_dir) / name
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(artifact_dir: Path, manifest: dict, name: str = MANIFEST_NAME) -> Path:
+    path = Path(artifact_dir) / name
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    tmp.replace(path)
+    return path
@@ -0,0 +1,123 @@
+"""
+Prompt-lookup assisted decoding for Tier 2. Draft tokens are copied from n-gram matches in the prompt
+(instruction + RAG context) and in nearby Tier 1 answers; the model verifies the whole draft in one
+forward pass and keeps the longest prefix it agrees with. Greedy only, so output equals plain greedy decoding.
+"""
+from src import metrics
+
+
+class NgramIndex:
+    """Maps each n-gram (ngram_min..ngram_max tokens) to the position right after its latest occurrence."""
+
+    def __init__(self, ngram_min: int = 2, ngram_max: int = 4):
+        self.ngram_min = ngram_min
+        self.ngram_max = ngram_max
+        self._seqs: list[list[int]] = []
+        self._table: dict[tuple, tuple[int, int]] = {}
+
+    def add(self, tokens: list[int]) -> int:
+        """Index a token sequence; returns its id for extend()."""
+        self._seqs.append([])
+        seq_id = len(self._seqs) - 1
+        self.extend(seq_id, tokens)
+        return seq_id
+
+    def extend(self, seq_id: int, tokens: list[int]) -> None:
+        seq = self._seqs[seq_id]
+        start = len(seq)
+        seq.extend(tokens)
+        # An n-gram ending at `end` is only useful once something follows it, so the tail waits for the next extend
+        for end in range(max(start, self.ngram_min), len(seq)):
+            for n in range(self.ngram_min, min(self.ngram_max, end) + 1):
+                self._table[tuple(seq[end - n:end])] = (seq_id, end)
+
+    def draft(self, tokens: list[int], num_tokens: int) -> list[int]:
+        """Continuation of the longest suffix of `tokens` seen before (empty if none)."""
+        for n in range(min(self.ngram_max, len(tokens)), self.ngram_min - 1, -1):
+            hit = self._table.get(tuple(tokens[-n:]))
+            if hit is not None:
+                seq_id, pos = hit
+                return self._seqs[seq_id][pos:pos + num_tokens]
+        return []
+
+
+def _crop_cache(past, length: int):
+    """Drop cache entries past `length` tokens (rejected draft positions)."""
+    if hasattr(past, "crop"):
+        # Negative = number of tokens to remove from the end (accepted by all Cache versions)
+        extra = past.get_seq_length() - length
+        if extra > 0:
+            past.crop(-extra)
+        return past
+    return tuple((k[:, :, :length, :], v[:, :, :length, :]) for k, v in past)
+
+
+def lookup_generate(
+    model,
+    input_ids,
+    max_new_tokens: int,
+    eos_token_id: int | None,
+    references: list[list[int]] | None = None,
+    stopping_criteria=None,
+    num_draft_tokens: int = 10,
+    ngram_min: int = 2,
+    ngram_max: int = 4,
+) -> list[int]:
+    """
+    Greedy decode from input_ids ([1, L] tensor) with n-gram drafts; returns the new token ids.
+    stopping_criteria is called as criteria(ids, None) after every accepted chunk, like HF generate.
+    """
+    import torch
+
+    prompt = input_ids[0].tolist()
+    index = NgramIndex(ngram_min=ngram_min, ngram_max=ngram_max)
+    for ref in references or []:
+        index.add(ref)
+    live = index.add(prompt)
+    generated: list[int] = []
+    passes = drafted = accepted = 0
+
+    with torch.no_grad():
+        out = model(input_ids=input_ids, use_cache=True)
+        past = out.past_key_values
+        cached = input_ids.shape[1]
+        pending = int(out.logits[0, -1].argmax())
+        passes += 1
+        while True:
+            generated.append(pending)
+            index.extend(live, [pending])
+            if pending == eos_token_id or len(generated) >= max_new_tokens:
+                break
+            if stopping_criteria is not None:
+                ids = torch.tensor([prompt + generated], device=input_ids.device)
+                if stopping_criteria(ids, None):
+                    break
+            budget = max_new_tokens - len(generated)
+            draft = index.draft(prompt + generated, min(num_draft_tokens, budget - 1)) if budget > 1 else []
+            step = torch.tensor([[pending] + draft], device=input_ids.device)
+            out = model(input_ids=step, past_key_values=past, use_cache=True)
+            past = out.past_key_values
+            passes += 1
+            preds = out.logits[0].argmax(-1).tolist()
+            n_ok = 0
+            while n_ok < len(draft) and draft[n_ok] == preds[n_ok]:
+                n_ok += 1
+            drafted += len(draft)
+            accepted += n_ok
+            # Cache holds pending + the whole draft; keep pending + the accepted prefix only
+            cached += 1 + n_ok
+            if n_ok < len(draft):
+                past = _crop_cache(past, cached)
+            for tok in draft[:n_ok]:
+                generated.append(tok)
+                index.extend(live, [tok])
+                if tok == eos_token_id:
+                    break
+            if generated[-1] == eos_token_id:
+                break
+            pending = preds[n_ok]
+
+    metrics.incr("slm.assisted.forward_passes", passes)
+    metrics.incr("slm.assisted.draft_tokens", drafted)
+    metrics.incr("slm.assisted.accepted_tokens", accepted)
+    return generated
@@ -0,0 +1,243 @@
+"""
+Continuous batching for Tier 2. One background thread owns the model and decodes all active sequences
+together, one token per step. New requests are prefilled alone and join the running batch at the next
+token boundary; finished ones (EOS, stop sequence, token budget, deadline) leave it immediately.
+The batch KV cache is left-padded to a common length and masked, so rows of different lengths share it.
+With named LoRA adapters, rows using different adapters share a batch: each step passes one adapter
+name per row and PEFT applies each adapter to its own rows.
+"""
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from src import metrics
+from src.deadline import Deadline
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class _Sequence:
+    prompt_ids: list[int]
+    max_new_tokens: int
+    stops: list[str]
+    deadline: Deadline | None
+    future: Future
+    generated: list[int] = field(default_factory=list)
+    pending: int = -1  # last produced token, fed to the model on the next step
+    position: int = 0  # position id of `pending`
+    adapter: str | None = None  # PEFT adapter name ("__base__" = no adapter)
+
+
+def _cache_layers(past) -> list[tuple]:
+    """(key, value) per layer, each [batch, heads, seq, dim], for any transformers cache format."""
+    if isinstance(past, (tuple, list)):
+        return [tuple(layer[:2]) for layer in past]
+    if hasattr(past, "layers"):
+        return [(layer.keys, layer.values) for layer in past.layers]
+    if hasattr(past, "key_cache"):
+        return list(zip(past.key_cache, past.value_cache))
+    return list(past.to_legacy_cache())
+
+
+def _make_cache(layers: list[tuple]):
+    from transformers import DynamicCache
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    return DynamicCache(layers)
+
+
+class GenerationEngine:
+    """Iteration-level scheduler over one causal LM. submit() is thread-safe and returns a Future of token ids."""
+
+    def __init__(self, model, tokenizer, max_batch_size: int = 8, temperature: float = 0.0, multi_adapter: bool = False):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.temperature = temperature
+        self.multi_adapter = multi_adapter
+        self.eos_token_id = tokenizer.eos_token_id
+        self._queue: queue.Queue = queue.Queue()
+        self._rows: list[_Sequence] = []
+        self._mask = None
+        self._cache = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        prompt_ids: list[int],
+        max_new_tokens: int,
+        stops: list[str] | None = None,
+        deadline: Deadline | None = None,
+        adapter: str | None = None,
+    ) -> Future:
+        self._ensure_started()
+        fut: Future = Future()
+        self._queue.put(_Sequence(list(prompt_ids), max_new_tokens, stops or [], deadline, fut, adapter=adapter))
+        return fut
+
+    def _adapter_kwargs(self, rows: list[_Sequence]) -> dict:
+        if not self.multi_adapter:
+            return {}
+        return {"adapter_names": [row.adapter or "__base__" for row in rows]}
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="slm-batching", daemon=True)
+                self._thread.start()
+                # Stop the loop before interpreter teardown; a daemon thread inside torch aborts the process
+                atexit.register(self.close)
+
+    # --- scheduling loop ---
+
+    def _loop(self) -> None:
+        import torch
+        with torch.no_grad():
+            while not self._stop.is_set():
+                try:
+                    self._admit()
+                    if self._rows:
+                        self._step()
+                except Exception as e:
+                    logger.exception("Batching step failed: %s", e)
+                    for row in self._rows:
+                        if not row.future.done():
+                            row.future.set_exception(e)
+                    self._rows, self._mask, self._cache = [], None, None
+
+    def _admit(self) -> None:
+        """Prefill waiting requests and merge them into the batch (block briefly when idle)."""
+        while len(self._rows) < self.max_batch_size:
+            try:
+                seq = self._queue.get(timeout=0.05) if not self._rows else self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if not seq.future.set_running_or_notify_cancel():
+                continue
+            try:
+                self._prefill(seq)
+            except Exception as e:
+                # Only this request fails (bad ids, too long, OOM); the running batch is untouched
+                logger.exception("Batching prefill failed: %s", e)
+                metrics.incr("slm.batching.prefill_errors")
+                if not seq.future.done():
+                    seq.future.set_exception(e)
+
+    def _prefill(self, seq: _Sequence) -> None:
+        import torch
+        device = self.model.device
+        ids = torch.tensor([seq.prompt_ids], device=device)
+        out = self.model(input_ids=ids, use_cache=True, **self._adapter_kwargs([seq]))
+        seq.position = ids.shape[1]
+        if self._emit(seq, self._pick(out.logits[:, -1])[0]):
+            return
+        mask = torch.ones((1, ids.shape[1]), dtype=torch.long, device=device)
+        if self._cache is None:
+            self._cache, self._mask = out.past_key_values, mask
+        else:
+            layers, self._mask = self._merge(_cache_layers(self._cache), self._mask, _cache_layers(out.past_key_values), mask)
+            self._cache = _make_cache(layers)
+        self._rows.append(seq)
+
+    @staticmethod
+    def _merge(a_layers, a_mask, b_layers, b_mask):
+        """Concatenate two caches along batch after left-padding the shorter one."""
+        import torch
+        la, lb = a_mask.shape[1], b_mask.shape[1]
+        length = max(la, lb)
+
+        def pad(t, n):  # left-pad the sequence dim (2 for kv, 1 for mask)
+            if n == 0:
+                return t
+            if t.dim() == 2:
+                return torch.cat([t.new_zeros((t.shape[0], n)), t], dim=1)
+            return torch.cat([t.new_zeros((t.shape[0], t.shape[1], n, t.shape[3])), t], dim=2)
+
+        layers = [
+            (torch.cat([pad(ka, length - la), pad(kb, length - lb)]), torch.cat([pad(va, length - la), pad(vb, length - lb)]))
+            for (ka, va), (kb, vb) in zip(a_layers, b_layers)
+        ]
+        return layers, torch.cat([pad(a_mask, length - la), pad(b_mask, length - lb)])
+
+    def _step(self) -> None:
+        import torch
+        device = self.model.device
+        start = time.perf_counter()
+        batch = len(self._rows)
+        input_ids = torch.tensor([[r.pending] for r in self._rows], device=device)
+        position_ids = torch.tensor([[r.position] for r in self._rows], device=device)
+        mask = torch.cat([self._mask, self._mask.new_ones((batch, 1))], dim=1)
+        out = self.model(
+            input_ids=input_ids,
+            attention_mask=mask,
+            position_ids=position_ids,
+            past_key_values=self._cache,
+            use_cache=True,
+            **self._adapter_kwargs(self._rows),
+        )
+        self._cache = out.past_key_values
+        self._mask = mask
+        tokens = self._pick(out.logits[:, -1])
+        keep = []
+        for i, (row, tok) in enumerate(zip(self._rows, tokens)):
+            row.position += 1
+            if not self._emit(row, tok):
+                keep.append(i)
+        metrics.incr("slm.batching.steps")
+        metrics.incr("slm.batching.step_tokens", batch)
+        metrics.incr("slm.batching.busy_s", time.perf_counter() - start)
+        if len(keep) < batch:
+            self._evict(keep)
+
+    def _evict(self, keep: list[int]) -> None:
+        """Drop finished rows and trim leading columns that are padding for every remaining row."""
+        if not keep:
+            self._rows, self._mask, self._cache = [], None, None
+            return
+        import torch
+        idx = torch.tensor(keep, device=self._mask.device)
+        mask = self._mask.index_select(0, idx)
+        first = int(mask.any(dim=0).nonzero()[0])
+        self._mask = mask[:, first:]
+        self._cache = _make_cache([
+            (k.index_select(0, idx)[:, :, first:], v.index_select(0, idx)[:, :, first:])
+            for k, v in _cache_layers(self._cache)
+        ])
+        self._rows = [self._rows[i] for i in keep]
+
+    def _pick(self, logits) -> list[int]:
+        import torch
+        if self.temperature > 0:
+            probs = torch.softmax(logits.float() / self.temperature, dim=-1)
+            return torch.multinomial(probs, 1).squeeze(-1).tolist()
+        return logits.argmax(-1).tolist()
+
+    def _emit(self, row: _Sequence, tok: int) -> bool:
+        """Record a produced token; resolve the row's future and return True if it is finished."""
+        row.pending = tok
+        if tok != self.eos_token_id:
+            row.generated.append(tok)
+        done = tok == self.eos_token_id or len(row.generated) >= row.max_new_tokens
+        if not done and row.stops:
+            tail = self.tokenizer.decode(row.generated[-8:], skip_special_tokens=True)
+            done = any(s in tail for s in row.stops)
+        if not done and row.deadline is not None and row.deadline.expired():
+            row.deadline.hit = True
+            done = True
+        if done:
+            metrics.incr("slm.batching.tokens", len(row.generated))
+            row.future.set_result(row.generated)
+        return done
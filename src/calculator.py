@@ -0,0 +1,318 @@
+"""
+Calculator tier: EMI, amortization schedules and prepayment scenarios in closed form with NumPy.
+All math functions broadcast over their arguments, so one call prices thousands of loans.
+"""
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+from src import metrics
+from src.config import load_config
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _monthly_rate(annual_rate_pct):
+    return np.asarray(annual_rate_pct, dtype=np.float64) / 1200.0
+
+
+def emi(principal, annual_rate_pct, months) -> np.ndarray:
+    """EMI = P·r·(1+r)^n / ((1+r)^n − 1) on a reducing balance; P/n when the rate is 0."""
+    p = np.asarray(principal, dtype=np.float64)
+    r = _monthly_rate(annual_rate_pct)
+    n = np.asarray(months, dtype=np.float64)
+    growth = np.power(1.0 + r, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = p * r * growth / (growth - 1.0)
+    return np.where(r == 0, p / n, out)
+
+
+def balance_after(principal, annual_rate_pct, installment, k) -> np.ndarray:
+    """Outstanding principal after k installments: P(1+r)^k − E((1+r)^k − 1)/r."""
+    p = np.asarray(principal, dtype=np.float64)
+    r = _monthly_rate(annual_rate_pct)
+    e = np.asarray(installment, dtype=np.float64)
+    growth = np.power(1.0 + r, np.asarray(k, dtype=np.float64))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = p * growth - e * (growth - 1.0) / r
+    return np.maximum(np.where(r == 0, p - e * k, out), 0.0)
+
+
+def schedule(principal: float, annual_rate_pct: float, months: int) -> dict[str, np.ndarray]:
+    """Full amortization schedule, one row per month, without a Python loop over months."""
+    e = float(emi(principal, annual_rate_pct, months))
+    k = np.arange(1, months + 1)
+    opening = balance_after(principal, annual_rate_pct, e, k - 1)
+    interest = opening * _monthly_rate(annual_rate_pct)
+    principal_paid = np.minimum(e - interest, opening)
+    return {
+        "month": k,
+        "emi": np.full(months, e),
+        "interest": interest,
+        "principal": principal_paid,
+        "balance": opening - principal_paid,
+    }
+
+
+def batch_schedules(principals, annual_rates_pct, months) -> dict[str, np.ndarray]:
+    """
+    Schedules for N loans at once as [N, max(months)] arrays; months past a loan's tenure are zero.
+    Also returns per-loan emi, total_interest and total_payment ([N]).
+    """
+    p = np.asarray(principals, dtype=np.float64).reshape(-1)
+    rate = np.broadcast_to(np.asarray(annual_rates_pct, dtype=np.float64), p.shape)
+    n = np.broadcast_to(np.asarray(months, dtype=np.int64), p.shape)
+    e = emi(p, rate, n)
+    k = np.arange(1, int(n.max()) + 1)[None, :]
+    active = k <= n[:, None]
+    opening = balance_after(p[:, None], rate[:, None], e[:, None], k - 1) * active
+    interest = opening * _monthly_rate(rate)[:, None]
+    principal_paid = np.minimum(e[:, None] - interest, opening) * active
+    total_interest = interest.sum(axis=1)
+    return {
+        "emi": e,
+        "interest": interest,
+        "principal": principal_paid,
+        "balance": (opening - principal_paid) * active,
+        "total_interest": total_interest,
+        "total_payment": p + total_interest,
+    }
+
+
+def prepayment(principal, annual_rate_pct, months, amount, after_month) -> dict[str, np.ndarray]:
+    """
+    Lump-sum prepayment of `amount` after installment `after_month`, both ways: keep the EMI and
+    shorten the tenure, or keep the tenure and lower the EMI. Interest saved is against no prepayment.
+    """
+    p = np.asarray(principal, dtype=np.float64)
+    n = np.asarray(months, dtype=np.float64)
+    m = np.asarray(after_month, dtype=np.float64)
+    r = _monthly_rate(annual_rate_pct)
+    e = emi(p, annual_rate_pct, n)
+    base_interest = e * n - p
+    balance = balance_after(p, annual_rate_pct, e, m)
+    paid = np.minimum(np.asarray(amount, dtype=np.float64), balance)
+    remaining = balance - paid
+    paid_so_far = e * m + paid
+
+    # Keep EMI: months needed to clear `remaining` at the same installment
+    with np.errstate(divide="ignore", invalid="ignore"):
+        left = np.where(r == 0, remaining / e, -np.log1p(-r * remaining / e) / np.log1p(r))
+    left = np.ceil(np.maximum(left - 1e-9, 0.0))
+    last = balance_after(remaining, annual_rate_pct, e, np.maximum(left - 1, 0)) * (1.0 + r)
+    shorter_interest = paid_so_far + np.where(left > 0, e * np.maximum(left - 1, 0) + last, 0.0) - p
+
+    # Keep tenure: re-amortize `remaining` over the months that are left
+    new_emi = np.where(remaining > 0, emi(remaining, annual_rate_pct, np.maximum(n - m, 1)), 0.0)
+    lower_interest = paid_so_far + new_emi * (n - m) - p
+    return {
+        "emi": e,
+        "prepaid": paid,
+        "remaining_balance": remaining,
+        "reduced_months": m + left,
+        "months_saved": n - m - left,
+        "interest_saved_reduce_tenure": base_interest - shorter_interest,
+        "reduced_emi": new_emi,
+        "interest_saved_reduce_emi": base_interest - lower_interest,
+    }
+
+
+# --- query parsing ---
+
+_UNITS = {"lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5, "l": 1e5, "crore": 1e7, "crores": 1e7, "cr": 1e7, "k": 1e3, "thousand": 1e3}
+_UNIT = r"(lakhs?|lacs?|crores?|cr|l|k|thousand)"
+_NUM = r"(\d[\d,]*(?:\.\d+)?)"
+# "₹5,00,000", "rs 5 lakh", "20 lakh", "1.2 cr", or a bare figure of 4+ digits
+_AMOUNT = rf"(?:₹|\brs\.?|\binr)\s*{_NUM}\s*{_UNIT}?\b|\b{_NUM}\s*{_UNIT}\b|\b(\d{{1,3}}(?:,\d{{2,3}})+|\d{{4,}})\b"
+_RATE = r"(\d+(?:\.\d+)?)\s*(?:%|percent\b|pc\b)(\s*(?:p\.?\s?m\b\.?|per\s+month|a\s+month|monthly))?"
+_TENURE = r"(\d+(?:\.\d+)?)\s*(years?|yrs?|months?|mos?)\b"
+_PREPAY = r"(?:pre-?pay(?:ment)?|part[- ]?pay(?:ment)?|pay (?:an )?extra)(?:\s+of)?\s+"
+_WHEN = rf"\s*(?:after|in|at)\s+(?:month\s+(\d+)|{_TENURE})"
+# An amount stated as the installment ("my emi is 15000", "emi payment of 5000") is not the principal
+_EMI_STATED = (
+    rf"\b(?:emi|installment|instalment)s?\s*(?:amount|payment)?\s*(?:is|of|=|:|was)\s*(?:around\s+|about\s+)?(?={_AMOUNT})"
+)
+_EMI_AMOUNT_BEFORE = rf"\bmy\s+(?:monthly\s+)?(?:{_AMOUNT})\s*(?:emi|installment|instalment)"  # "my 5000 emi"
+# Penalties and fees are charged on a payment, not amortized: never answer them as a loan
+_CHARGE_WORDS = r"\b(penalt\w*|late (?:fee|payment|emi)|overdue|bounce\w*|fine|processing fee)\b"
+# Questions asking for the principal itself cannot be answered by computing an EMI from it
+_ASKS_PRINCIPAL = (
+    r"\bhow much (?:loan|principal|can i borrow|(?:can|could|will|would) i (?:get|borrow))\b"
+    r"|\bwhat(?:'s| is| was)?(?: my| the)? (?:loan|principal)(?: amount)?\b(?!\s+(?:of|for|emi)\b)"
+    r"|\b(?:eligible|maximum|max) loan amount\b"
+)
+_TRIGGERS = r"\b(emi|installment|instalment|amorti[sz]ation|schedule|breakdown|pre-?pay\w*|part[- ]?pay\w*|repayment)\b"
+
+
+@dataclass
+class LoanQuery:
+    principal: float
+    annual_rate_pct: float
+    months: int
+    prepay_amount: float | None = None
+    prepay_after_month: int | None = None
+    want_schedule: bool = False
+
+
+def _amount(match: re.Match) -> float:
+    groups = [g for g in match.groups() if g is not None]
+    value = float(groups[0].replace(",", ""))
+    unit = groups[1] if len(groups) > 1 else ""
+    return value * _UNITS.get(unit, 1.0)
+
+
+def _months(value: str, unit: str) -> int:
+    return int(round(float(value) * 12)) if unit.startswith("y") else int(float(value))
+
+
+def _tenure_months(q: str) -> int:
+    """Tenure in months, adding up compound forms ("2 years 6 months", "1 year and 3 months"); 0 if none."""
+    matches = list(re.finditer(_TENURE, q))
+    if not matches:
+        return 0
+    total, end = _months(*matches[0].groups()), matches[0].end()
+    for m in matches[1:]:
+        if not re.fullmatch(r"\s*(?:,|and)?\s*", q[end:m.start()]):
+            break
+        total += _months(*m.groups())
+        end = m.end()
+    return total
+
+
+def parse_loan_query(text: str) -> LoanQuery | None:
+    """Principal, annual rate and tenure from free text ("EMI for 20 lakh at 8.5% for 15 years"), or None."""
+    q = text.lower()
+    if not re.search(_TRIGGERS, q) or re.search(_ASKS_PRINCIPAL, q) or re.search(_CHARGE_WORDS, q):
+        return None
+    prepay_amount = prepay_after = None
+    pre = re.search(_PREPAY, q)
+    if pre:
+        amt = re.match(_AMOUNT, q[pre.end():])
+        if amt:
+            prepay_amount = _amount(amt)
+            end = pre.end() + amt.end()
+            when = re.match(_WHEN, q[end:])
+            if when:
+                prepay_after = int(when.group(1)) if when.group(1) else _months(when.group(2), when.group(3))
+                end += when.end()
+            q = q[: pre.start()] + " " + q[end:]  # do not read the prepayment as the principal or tenure
+
+    for stated in reversed(list(re.finditer(_EMI_STATED, q))):
+        amt = re.match(_AMOUNT, q[stated.end():])
+        q = q[: stated.start()] + " " + q[stated.end() + amt.end():]
+    q = re.sub(_EMI_AMOUNT_BEFORE, " ", q)
+    amount = re.search(_AMOUNT, q)
+    rate = re.search(_RATE, q)
+    months = _tenure_months(q)
+    if not (amount and rate and months):
+        return None
+    principal = _amount(amount)
+    annual_rate = float(rate.group(1)) * (12 if rate.group(2) else 1)  # "1% per month" = 12% p.a.
+    if principal <= 0 or not 0 <= annual_rate < 100:
+        return None
+    if prepay_amount is not None and prepay_after is None:
+        prepay_after = 12  # "prepay 2 lakh" without a time: assume after the first year
+    return LoanQuery(
+        principal=principal,
+        annual_rate_pct=annual_rate,
+        months=months,
+        prepay_amount=prepay_amount,
+        prepay_after_month=prepay_after,
+        want_schedule=bool(re.search(r"schedule|breakdown|amorti[sz]ation|year[- ]?wise|month[- ]?wise", q)),
+    )
+
+
+# --- answers ---
+
+def format_inr(x: float) -> str:
+    """₹ with Indian digit grouping: 2000000 -> ₹20,00,000."""
+    s = str(int(round(float(x))))
+    head, tail = s[:-3], s[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    if head:
+        groups.insert(0, head)
+    return "₹" + ",".join(groups + [tail]) if groups else "₹" + tail
+
+
+def _yearly(rows: dict[str, np.ndarray]) -> list[tuple[int, float, float, float]]:
+    """Schedule rolled up per year: (year, principal, interest, closing balance)."""
+    n = len(rows["month"])
+    years = (n + 11) // 12
+    pad = years * 12 - n
+    principal = np.pad(rows["principal"], (0, pad)).reshape(years, 12).sum(axis=1)
+    interest = np.pad(rows["interest"], (0, pad)).reshape(years, 12).sum(axis=1)
+    closing = rows["balance"][np.minimum(np.arange(1, years + 1) * 12, n) - 1]
+    return list(zip(range(1, years + 1), principal, interest, closing))
+
+
+def _count(n: int, unit: str) -> str:
+    return f"{n} {unit}" if n == 1 else f"{n} {unit}s"
+
+
+def answer(loan: LoanQuery, max_schedule_years: int = 30) -> str:
+    e = float(emi(loan.principal, loan.annual_rate_pct, loan.months))
+    total = e * loan.months
+    tenure = _count(loan.months // 12, "year") if loan.months % 12 == 0 else _count(loan.months, "month")
+    lines = [
+        f"For a loan of {format_inr(loan.principal)} at {loan.annual_rate_pct:g}% p.a. for {tenure} (reducing balance):",
+        f"- EMI: {format_inr(e)} per month",
+        f"- Total interest: {format_inr(total - loan.principal)}",
+        f"- Total payment: {format_inr(total)}",
+    ]
+    if loan.want_schedule:
+        rows = _yearly(schedule(loan.principal, loan.annual_rate_pct, loan.months))
+        lines.append("")
+        lines.append("Year | Principal paid | Interest paid | Closing balance")
+        for year, principal, interest, closing in rows[:max_schedule_years]:
+            lines.append(f"{year} | {format_inr(principal)} | {format_inr(interest)} | {format_inr(closing)}")
+    if loan.prepay_amount:
+        after = min(loan.prepay_after_month, loan.months - 1)
+        pre = {k: float(v) for k, v in prepayment(
+            loan.principal, loan.annual_rate_pct, loan.months, loan.prepay_amount, after
+        ).items()}
+        lines.append("")
+        # More than the outstanding balance cannot be prepaid; say what is actually applied
+        if pre["prepaid"] < loan.prepay_amount:
+            lines.append(
+                f"Prepaying the full outstanding {format_inr(pre['prepaid'])} after {_count(after, 'EMI')} "
+                f"(less than the {format_inr(loan.prepay_amount)} asked for):"
+            )
+        else:
+            lines.append(f"Prepaying {format_inr(pre['prepaid'])} after {_count(after, 'EMI')}:")
+        lines.append(
+            f"- Keep the EMI: loan closes {_count(int(pre['months_saved']), 'month')} earlier, "
+            f"saving {format_inr(pre['interest_saved_reduce_tenure'])} in interest"
+        )
+        lines.append(
+            f"- Keep the tenure: EMI drops to {format_inr(pre['reduced_emi'])}, "
+            f"saving {format_inr(pre['interest_saved_reduce_emi'])} in interest"
+        )
+        lines.append("Prepayment charges, if any, are as per your loan agreement.")
+    lines.append("Figures are computed on the inputs given; your sanctioned rate and terms may differ.")
+    return "\n".join(lines)
+
+
+class LoanCalculator:
+    """Tool tier: answers EMI/schedule/prepayment questions that carry principal, rate and tenure."""
+
+    def __init__(self):
+        cfg = load_config().get("calculator", {})
+        self.enabled = bool(cfg.get("enabled", True))
+        self.max_schedule_years = int(cfg.get("max_schedule_years", 30))
+        self.max_months = int(cfg.get("max_months", 600))
+
+    def answer(self, query: str) -> str | None:
+        """Computed answer, or None if the query does not carry all three inputs (caller falls through)."""
+        if not self.enabled:
+            return None
+        loan = parse_loan_query(query)
+        if loan is None or loan.months > self.max_months:
+            return None
+        metrics.incr("calculator.answered")
+        logger.info("Calculator: months=%d rate=%.2f schedule=%s prepay=%s", loan.months, loan.annual_rate_pct, loan.want_schedule, loan.prepay_amount is not None)
+        return answer(loan, self.max_schedule_years)
@@ -0,0 +1,97 @@
+"""
+Single-flight request coalescing: concurrent calls with the same key share one computation. The
+first caller (leader) runs it; callers arriving while it is in flight (followers) wait and get the
+same result. Nothing is cached: once the leader returns, the next caller starts a fresh computation.
+"""
+import re
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable
+
+# "." and "," between digits are part of a number ("20,000" vs "20.000", "2.5%" vs "2 5%"): kept
+_PUNCT = re.compile(r"(?:[\s?!;:]|(?<!\d)[.,]|[.,](?!\d))+")
+
+
+def coalesce_key(query: str) -> str:
+    """Case, whitespace and punctuation folded, so "Is net banking down?" and "is net banking down" share a flight."""
+    return _PUNCT.sub(" ", (query or "").lower()).strip()
+
+
+class SingleFlight:
+    """In-flight calls by key, each a Future. Thread-safe; one instance per orchestrator."""
+
+    def __init__(self):
+        self._calls: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def _claim(self, key: str) -> tuple[Future, bool]:
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                return fut, True
+            fut = self._calls[key] = Future()
+            return fut, False
+
+    def _release(self, key: str, fut: Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: float | None = None) -> tuple[Any, bool]:
+        """
+        Return (result, shared): shared is True if the result came from another caller's run of fn.
+        A follower waits at most timeout seconds (TimeoutError after that); the computation itself is
+        not cancelled. Followers never see the leader's exception: if the leader fails they retry,
+        coalescing among themselves, so one bad run is not multiplied across every caller.
+        """
+        expires = time.monotonic() + timeout if timeout is not None else None
+        fut, shared = self._claim(key)
+        if not shared:
+            try:
+                result = fn()
+            except BaseException as e:
+                self._release(key, fut)
+                fut.set_exception(e)
+                raise
+            self._release(key, fut)
+            fut.set_result(result)
+            return result, False
+        try:
+            return fut.result(None if expires is None else max(0.0, expires - time.monotonic())), True
+        except FutureTimeout:
+            raise TimeoutError(f"in-flight call for {key!r} did not finish in time") from None
+        except Exception:
+            return self.do(key, fn, None if expires is None else max(0.0, expires - time.monotonic()))
+
+    def attach(self, key: str, start: Callable[[], Future]) -> tuple[Future, bool]:
+        """
+        Non-blocking form for async callers: the Future of the call in flight for key (shared=True),
+        or the Future of a new call begun with start() (e.g. a lane submit). Callers that get a shared
+        Future should start their own call if it fails, as do() does.
+        """
+        fut, shared = self._claim(key)
+        if shared:
+            return fut, True
+        try:
+            inner = start()
+        except BaseException as e:
+            self._release(key, fut)
+            fut.set_exception(e)
+            raise
+
+        def finish(f: Future) -> None:
+            self._release(key, fut)
+            if f.cancelled():
+                fut.cancel()
+            elif f.exception() is not None:
+                fut.set_exception(f.exception())
+            else:
+                fut.set_result(f.result())
+
+        inner.add_done_callback(finish)
+        return fut, False
@@ -27,11 +27,20 @@ def load_config(config_path: Path | None = None) -> dict:
 
 def _default_config() -> dict:
     return {
-        "similarity": {"threshold": 0.88, "embedding_model": "all-MiniLM-L6-v2", "top_k": 1},
-        "slm": {"base_model": "TinyLlama/TinyLlama-1.1B-Chat-v1.0", "max_new_tokens": 256, "temperature": 0.3},
+        "similarity": {"threshold": 0.88, "embedding_model": "all-MiniLM-L6-v2", "top_k": 5, "index_backend": "chroma", "gray_zone": {"enabled": True, "lower": 0.80, "method": "rules"}},
+        "embedding": {"workers": 1, "batch_size": 64, "threads_per_worker": 0},
+        "slm": {"base_model": "TinyLlama/TinyLlama-1.1B-Chat-v1.0", "max_new_tokens": 256, "max_new_tokens_by_tier": {"slm": 128, "rag": 256}, "temperature": 0.3, "stop_sequences": ["###"]},
         "rag": {"top_k": 3, "complex_keywords": ["emi", "interest", "rate", "penalty", "policy"]},
+        "calculator": {"enabled": True, "max_schedule_years": 30, "max_months": 600},
+        "structured": {"enabled": True, "facts_path": "data/knowledge_facts.json", "sources": ["interest_rates.md", "penalties_policy.md"]},
         "guardrails": {"enabled": True},
-        "logging": {"level": "INFO", "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s"},
+        "lanes": {"enabled": True, "fast_workers": 4, "slow_workers": 2, "slow_order": "fifo", "slow_max_queue": 32, "shortest_first_s_per_char": 0.002},
+        "sessions": {"enabled": True, "max_sessions": 10000, "ttl_s": 1800, "max_turns": 6, "max_chars_per_turn": 600, "rewrite_followups": True, "kv_cache": {"enabled": True, "max_sessions": 8, "idle_s": 300, "max_tokens": 1536}},
+        "coalesce": {"enabled": True},
+        "latency": {"deadlines": {"default": 10, "api": 8, "streamlit": 20, "cli": None}, "min_rag_budget_s": 3.0, "min_slm_budget_s": 1.0},
+        "serving": {"host": "0.0.0.0", "port": 8000, "workers": 2, "threads_per_worker": 0, "memory_report_interval_s": 60},
+        "reload": {"keep_versions": 3, "watch_interval_s": 10, "watch_sources": False, "admin_token_env": "BFSI_ADMIN_TOKEN"},
+        "logging": {"level": "INFO", "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s", "output": "text", "queue": True, "queue_size": 10000, "rate_limit_per_s": 0, "sample": {}},
     }
 
 
@@ -0,0 +1,75 @@
+"""CPU inference profile for the SLM (slm.cpu_profile): torch threading, weight dtype, static KV cache, torch.compile."""
+import time
+from pathlib import Path
+
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_threads_applied = False
+
+
+def cpu_supports_bf16() -> bool:
+    """True if the CPU has native bf16 matmul (AVX512-BF16 or AMX); otherwise bf16 is emulated and slower than fp32."""
+    try:
+        flags = Path("/proc/cpuinfo").read_text()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def apply_threads(profile: dict) -> None:
+    """
+    Set torch intra/inter-op thread counts once per process (0 = leave torch's default). The pools are
+    process-wide, so this also bounds the embedder and keeps the two from oversubscribing cores.
+    """
+    global _threads_applied
+    intra = int(profile.get("intra_op_threads", 0) or 0)
+    inter = int(profile.get("inter_op_threads", 0) or 0)
+    if _threads_applied or not (intra or inter):
+        return
+    import torch
+    if intra:
+        torch.set_num_threads(intra)
+    if inter:
+        try:
+            torch.set_num_interop_threads(inter)
+        except RuntimeError:
+            # Only settable before the first inter-op parallel work in this process
+            logger.warning("inter_op_threads ignored: torch inter-op pool already started")
+    _threads_applied = True
+    logger.info("Torch threads: intra_op=%s inter_op=%s", torch.get_num_threads(), torch.get_num_interop_threads())
+
+
+def resolve_dtype(profile: dict):
+    """Weight dtype for the profile: "auto" picks bf16 only where the CPU supports it natively. None = keep as loaded."""
+    import torch
+    name = profile.get("dtype", "auto")
+    if name in (None, "", "none"):
+        return None
+    if name == "auto":
+        return torch.bfloat16 if cpu_supports_bf16() else torch.float32
+    return getattr(torch, name)
+
+
+def apply_to_model(model, tokenizer, profile: dict, quantized: bool = False):
+    """Cast weights, enable a static KV cache and compile the forward pass as configured; warm up if compiled."""
+    import torch
+    on_cpu = next(model.parameters()).device.type == "cpu"
+    dtype = resolve_dtype(profile) if on_cpu and not quantized else None
+    if dtype is not None and next(model.parameters()).dtype != dtype:
+        model = model.to(dtype)
+        logger.info("SLM weights cast to %s", dtype)
+    if profile.get("static_cache", False):
+        # Fixed-shape KV cache for generate(): no per-token reallocation, and stable shapes for torch.compile
+        model.generation_config.cache_implementation = "static"
+    if profile.get("compile", False):
+        model.forward = torch.compile(model.forward, mode=profile.get("compile_mode", "default"), dynamic=False)
+        warmup = int(profile.get("warmup_tokens", 8))
+        if warmup > 0:
+            start = time.perf_counter()
+            ids = tokenizer("Warm up", return_tensors="pt")
+            with torch.no_grad():
+                model.generate(**ids, max_new_tokens=warmup, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+            logger.info("Compiled SLM forward warmed up in %.1fs", time.perf_counter() - start)
+    return model
@@ -0,0 +1,135 @@
+"""
+Streaming access to the Alpaca dataset. similarity.dataset_path may be a JSON array file, a JSONL file,
+a directory of JSONL/JSON shards, or a glob; samples are yielded one at a time in shard order, so
+memory stays bounded by the largest single sample rather than the dataset size.
+"""
+import glob
+import gzip
+import hashlib
+import json
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from src.artifacts import sha256_file
+
+_SHARD_SUFFIXES = (".jsonl", ".json", ".jsonl.gz", ".json.gz")
+
+
+def dataset_files(path: Path | str) -> list[Path]:
+    """Files that make up the dataset at path, in read order."""
+    p = Path(path)
+    if p.is_dir():
+        return sorted(f for f in p.iterdir() if f.name.endswith(_SHARD_SUFFIXES))
+    if any(c in str(path) for c in "*?["):
+        return [Path(f) for f in sorted(glob.glob(str(path)))]
+    return [p] if p.exists() else []
+
+
+def _open(path: Path):
+    if path.name.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _iter_json_array(f, chunk_size: int = 1 << 16) -> Iterator:
+    """Items of a top-level JSON array, decoded incrementally from a text stream."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof, started = "", 0, False, False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        more = f.read(chunk_size)
+        if not more:
+            eof = True
+            return False
+        buf, pos = buf[pos:] + more, 0
+        return True
+
+    while True:
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or not fill():
+                break
+        if pos >= len(buf):
+            if started:
+                raise ValueError("Unterminated JSON array")
+            return
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("Expected a JSON array of samples")
+            started, pos = True, pos + 1
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof or not fill():
+                raise
+            continue
+        pos = end
+        yield item
+
+
+def iter_file(path: Path) -> Iterator[dict]:
+    with _open(path) as f:
+        if ".jsonl" in path.name:
+            for line_no, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f"{path.name}:{line_no}: {e}") from e
+        else:
+            yield from _iter_json_array(f)
+
+
+def iter_samples(path: Path | str) -> Iterator[dict]:
+    """Every sample of the dataset at path, streamed across shards."""
+    for f in dataset_files(path):
+        yield from iter_file(f)
+
+
+def iter_batches(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def dataset_sha256(path: Path | str) -> str | None:
+    """Content hash of the dataset: the file's sha256 for a single file, else a hash of the shard hashes."""
+    files = dataset_files(path)
+    if not files:
+        return None
+    if len(files) == 1:
+        return sha256_file(files[0])
+    h = hashlib.sha256()
+    for f in files:
+        h.update(f"{f.name}:{sha256_file(f)}\n".encode())
+    return h.hexdigest()
+
+
+def dataset_stamp(path: Path | str) -> list[list]:
+    """Cheap change detector (name, size, mtime per shard) for resumable builds."""
+    return [[f.name, f.stat().st_size, int(f.stat().st_mtime)] for f in dataset_files(path)]
+
+
+def write_jsonl_shards(samples: Iterable[dict], out_dir: Path, shard_size: int = 50000, prefix: str = "part") -> list[Path]:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    for i, batch in enumerate(iter_batches(samples, shard_size)):
+        path = out_dir / f"{prefix}-{i:05d}.jsonl"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for s in batch:
+                f.write(json.dumps(s, ensure_ascii=False) + "\n")
+        tmp.replace(path)
+        written.append(path)
+    return written
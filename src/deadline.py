@@ -0,0 +1,35 @@
+"""Per-request latency budget. Carried through the pipeline and checked before/while doing slow work."""
+import time
+
+from src.config import load_config
+
+
+class Deadline:
+    """
+    Absolute deadline on the monotonic clock. budget_s=None means no limit.
+    `hit` is set by whoever cuts work short because of it (e.g. the SLM stopping criterion).
+    """
+
+    def __init__(self, budget_s: float | None = None):
+        self.budget_s = budget_s
+        self.start = time.monotonic()
+        self.expires_at = self.start + budget_s if budget_s is not None else None
+        self.hit = False
+
+    @classmethod
+    def for_endpoint(cls, endpoint: str) -> "Deadline":
+        """Deadline from latency.deadlines.<endpoint> (falls back to latency.deadlines.default)."""
+        deadlines = load_config().get("latency", {}).get("deadlines", {})
+        budget = deadlines.get(endpoint, deadlines.get("default"))
+        return cls(float(budget) if budget is not None else None)
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return float("inf")
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
@@ -0,0 +1,120 @@
+"""Shared sentence embedders (one SentenceTransformer per model name per process) and parallel encoding for index builds."""
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_embedders: dict = {}
+_lock = threading.Lock()
+
+
+def get_embedder(model_name: str):
+    """Return the process-wide SentenceTransformer for model_name, loading it on first use."""
+    embedder = _embedders.get(model_name)
+    if embedder is not None:
+        return embedder
+    with _lock:
+        embedder = _embedders.get(model_name)
+        if embedder is None:
+            from sentence_transformers import SentenceTransformer
+            logger.info("Loading embedding model: %s", model_name)
+            embedder = SentenceTransformer(model_name)
+            _embedders[model_name] = embedder
+    return embedder
+
+
+# --- parallel encoding for index builds ---
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int) -> None:
+    global _worker_model
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    _worker_model = get_embedder(model_name)
+
+
+def _encode_batch(batch: list[str]):
+    return _worker_model.encode(batch, batch_size=len(batch), show_progress_bar=False)
+
+
+class ParallelEncoder:
+    """
+    Embed many texts across a process pool, one encoder per worker. Texts are sorted by length and cut
+    into fixed batches (little padding per batch); batches go to workers as they free up and results are
+    put back in input order. workers <= 1 runs the same batches in-process, so both paths see identical
+    batch compositions.
+    """
+
+    def __init__(self, model_name: str, workers: int = 1, batch_size: int = 64, threads_per_worker: int = 0):
+        self.model_name = model_name
+        self.workers = workers if workers > 0 else max(1, (os.cpu_count() or 1) // max(threads_per_worker, 1))
+        self.batch_size = batch_size
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self._pool = None
+        self.last_rate = 0.0  # texts/sec of the last encode() call
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _get_pool(self):
+        if self._pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn, not fork: a forked child inherits torch's thread pools in an undefined state
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.threads_per_worker),
+            )
+        return self._pool
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        start = time.perf_counter()
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        payload = [[texts[i] for i in b] for b in batches]
+        if self.workers <= 1:
+            model = get_embedder(self.model_name)
+            results = (model.encode(b, batch_size=len(b), show_progress_bar=False) for b in payload)
+        else:
+            results = self._get_pool().map(_encode_batch, payload)
+        out = None
+        for idx, emb in zip(batches, results):
+            if out is None:
+                out = np.empty((len(texts), emb.shape[1]), dtype=emb.dtype)
+            out[idx] = emb
+        self.last_rate = len(texts) / max(time.perf_counter() - start, 1e-9)
+        return out
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def parallel_encoder(model_name: str, cfg: dict | None = None, workers: int | None = None) -> ParallelEncoder:
+    """ParallelEncoder configured from the embedding: config block (workers overrides)."""
+    if cfg is None:
+        from src.config import load_config
+        cfg = load_config()
+    emb = cfg.get("embedding", {})
+    return ParallelEncoder(
+        model_name,
+        workers=int(emb.get("workers", 1) if workers is None else workers),
+        batch_size=int(emb.get("batch_size", 64)),
+        threads_per_worker=int(emb.get("threads_per_worker", 0)),
+    )
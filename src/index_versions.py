@@ -0,0 +1,163 @@
+"""
+Versioned index directories. A build writes a fresh <root>/versions/<version>/ and then repoints
+<root>/CURRENT at it with an atomic rename, so a reader never opens a half-written index and serving
+processes can move to the new version while requests on the old one finish. A root without CURRENT
+is the pre-versioning layout and is read in place.
+"""
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Generic, Iterable, Iterator, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are only serialized within the process
+    fcntl = None
+
+CURRENT_NAME = "CURRENT"
+VERSIONS_DIR = "versions"
+
+T = TypeVar("T")
+
+_build_locks: dict[str, threading.Lock] = {}
+_build_locks_guard = threading.Lock()
+
+
+def current_version(root: Path) -> str | None:
+    """Published version name under root, or None for an unversioned (legacy) root."""
+    try:
+        version = (Path(root) / CURRENT_NAME).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    return version or None
+
+
+def version_path(root: Path, version: str | None) -> Path:
+    return Path(root) / VERSIONS_DIR / version if version else Path(root)
+
+
+def current_path(root: Path) -> tuple[str | None, Path]:
+    """(version, directory) readers should open now."""
+    version = current_version(root)
+    return version, version_path(root, version)
+
+
+def new_version(root: Path) -> tuple[str, Path]:
+    """Name and empty directory for a build; sorts after every earlier version."""
+    while True:
+        now = time.time()
+        version = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f".{int(now * 1000) % 1000:03d}-{os.getpid()}"
+        path = version_path(root, version)
+        try:
+            path.mkdir(parents=True)
+            return version, path
+        except FileExistsError:
+            time.sleep(0.001)
+
+
+def publish(root: Path, version: str) -> None:
+    """Point CURRENT at version (atomic on POSIX and Windows)."""
+    tmp = Path(root) / f"{CURRENT_NAME}.{os.getpid()}.tmp"
+    tmp.write_text(version + "\n", encoding="utf-8")
+    tmp.replace(Path(root) / CURRENT_NAME)
+
+
+def prune(root: Path, keep: int = 3, in_use: Iterable[str | None] = ()) -> list[str]:
+    """
+    Delete all but the newest `keep` versions (never the current one, nor those in in_use, e.g. the
+    version this process is serving). Other processes still on an old version keep reading it: open
+    files and mmaps outlive the unlink on POSIX.
+    """
+    versions_dir = Path(root) / VERSIONS_DIR
+    if not versions_dir.is_dir():
+        return []
+    skip = {current_version(root), *in_use}
+    versions = sorted(p.name for p in versions_dir.iterdir() if p.is_dir())
+    removed = [v for v in versions[: max(len(versions) - keep, 0)] if v not in skip]
+    for v in removed:
+        shutil.rmtree(versions_dir / v, ignore_errors=True)
+    return removed
+
+
+class LiveSnapshot(Generic[T]):
+    """
+    The snapshot requests read, replaced as a whole on reload. Requests hold it for their duration
+    (`with live.reading() as snap`); a swapped-out snapshot is closed once its last reader is done, so
+    each reload releases the old version's open files and mmaps instead of leaking them.
+    """
+
+    def __init__(self, close: Callable[[T], None]):
+        self._close = close
+        self._snap: T | None = None
+        self._readers: dict[int, int] = {}  # id(snapshot) -> requests reading it
+        self._retired: dict[int, T] = {}  # swapped out, closed when its readers reach 0
+        self._lock = threading.Lock()
+
+    def get(self) -> T | None:
+        """The live snapshot, not held (only for metadata such as its version)."""
+        return self._snap
+
+    @contextmanager
+    def reading(self) -> Iterator[T | None]:
+        with self._lock:
+            snap = self._snap
+            if snap is not None:
+                self._readers[id(snap)] = self._readers.get(id(snap), 0) + 1
+        try:
+            yield snap
+        finally:
+            if snap is not None:
+                self._release(snap)
+
+    def _release(self, snap: T) -> None:
+        with self._lock:
+            left = self._readers[id(snap)] - 1
+            if left:
+                self._readers[id(snap)] = left
+                return
+            del self._readers[id(snap)]
+            retired = self._retired.pop(id(snap), None)
+        if retired is not None:
+            self._close(retired)
+
+    def swap(self, snap: T) -> None:
+        """Make snap live; the previous one is closed now, or by its last reader."""
+        with self._lock:
+            old, self._snap = self._snap, snap
+            if old is None or old is snap:
+                return
+            if self._readers.get(id(old)):
+                self._retired[id(old)] = old
+                return
+        self._close(old)
+
+
+@contextmanager
+def build_lock(root: Path) -> Iterator[bool]:
+    """Non-blocking exclusive build lock on root across threads and processes; yields whether it was taken."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    with _build_locks_guard:
+        lock = _build_locks.setdefault(str(root.resolve()), threading.Lock())
+    if not lock.acquire(blocking=False):
+        yield False
+        return
+    try:
+        if fcntl is None:
+            yield True
+            return
+        with open(root / ".build.lock", "w") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    finally:
+        lock.release()
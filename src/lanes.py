@@ -0,0 +1,151 @@
+"""
+Priority lanes for the request pipeline. The fast lane runs the cheap stages (guardrails, calculator,
+structured facts, Tier 1) on its own threads; the slow lane runs RAG + SLM work on a separate, small
+pool. A backlog of generations therefore queues only on the slow lane and never holds the threads or
+CPU a Tier 1 answer needs. The slow queue is FIFO or shortest-prompt-first.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from src import metrics
+from src.config import load_config
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ORDERS = ("fifo", "shortest_first")
+
+
+class LaneFull(RuntimeError):
+    """The lane's queue is at max_queue; the caller should degrade rather than wait."""
+
+
+class Lane:
+    """
+    Worker threads draining one priority queue. With order "shortest_first" a task's priority is its
+    arrival time plus cost * s_per_cost, so short prompts overtake long ones but a long prompt is only
+    ever passed by work that arrived less than cost * s_per_cost after it (no starvation).
+    """
+
+    def __init__(self, name: str, workers: int, order: str = "fifo", s_per_cost: float = 0.0, max_queue: int = 0):
+        if order not in ORDERS:
+            raise ValueError(f"Unknown lane order {order!r}; expected one of {ORDERS}")
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.order = order
+        self.s_per_cost = float(s_per_cost)
+        self.max_queue = int(max_queue)  # 0 = unbounded
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._running = 0
+        self._closed = False
+
+    def submit(self, fn: Callable[[], Any], cost: float = 0.0) -> Future:
+        now = time.monotonic()
+        priority = now + cost * self.s_per_cost if self.order == "shortest_first" else now
+        fut: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"lane {self.name} is shut down")
+            if self.max_queue and len(self._heap) >= self.max_queue:
+                metrics.incr(f"lanes.{self.name}.rejected")
+                raise LaneFull(f"lane {self.name} has {len(self._heap)} tasks queued")
+            heapq.heappush(self._heap, (priority, next(self._seq), now, fut, fn))
+            if len(self._threads) < self.workers:
+                t = threading.Thread(target=self._work, name=f"lane-{self.name}-{len(self._threads)}", daemon=True)
+                self._threads.append(t)
+                t.start()
+            self._cond.notify()
+        return fut
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, _, enqueued, fut, fn = heapq.heappop(self._heap)
+                self._running += 1
+            try:
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                metrics.incr(f"lanes.{self.name}.queue_wait_ms", (time.monotonic() - enqueued) * 1000)
+                metrics.incr(f"lanes.{self.name}.tasks")
+                try:
+                    fut.set_result(fn())
+                except BaseException as e:
+                    fut.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running -= 1
+
+    def depth(self) -> int:
+        """Tasks waiting (not yet started)."""
+        with self._cond:
+            return len(self._heap)
+
+    def position(self, fut: Future) -> int | None:
+        """0-based place of fut in the queue (0 = starts next), or None once it is running or done."""
+        with self._cond:
+            key = next((entry[:2] for entry in self._heap if entry[3] is fut), None)
+            if key is None:
+                return None
+            return sum(1 for entry in self._heap if entry[:2] < key)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"workers": self.workers, "order": self.order, "queued": len(self._heap), "running": self._running}
+
+    def shutdown(self) -> None:
+        """Stop accepting work; workers finish what is queued, then exit."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class LaneScheduler:
+    """
+    The fast and slow lanes, sized from the lanes: config block. With slm.batching enabled the slow lane
+    gets at least max_batch_size workers, otherwise the engine never sees enough prompts to batch.
+    """
+
+    def __init__(self, cfg: dict | None = None):
+        cfg = cfg if cfg is not None else load_config()
+        slow_workers = int(cfg.get("lanes", {}).get("slow_workers", 2))
+        batching = cfg.get("slm", {}).get("batching", {})
+        if batching.get("enabled", False):
+            slow_workers = max(slow_workers, int(batching.get("max_batch_size", 8)))
+        cfg = cfg.get("lanes", {})
+        self.fast = Lane("fast", int(cfg.get("fast_workers", 4)))
+        self.slow = Lane(
+            "slow",
+            slow_workers,
+            order=cfg.get("slow_order", "fifo"),
+            s_per_cost=float(cfg.get("shortest_first_s_per_char", 0.002)),
+            max_queue=int(cfg.get("slow_max_queue", 0)),
+        )
+
+    def lane(self, name: str) -> Lane:
+        return self.fast if name == "fast" else self.slow
+
+    def submit(self, lane: str, fn: Callable[[], Any], cost: float = 0.0) -> Future:
+        return self.lane(lane).submit(fn, cost)
+
+    async def run(self, lane: str, fn: Callable[[], Any], cost: float = 0.0) -> Any:
+        """Await fn on a lane without holding an event-loop or server thread while it queues."""
+        return await asyncio.wrap_future(self.submit(lane, fn, cost))
+
+    def stats(self) -> dict:
+        return {"fast": self.fast.stats(), "slow": self.slow.stats()}
+
+    def shutdown(self) -> None:
+        self.fast.shutdown()
+        self.slow.shutdown()
@@ -1,32 +1,210 @@
-"""Centralized logging setup. No sensitive data in logs."""
+"""
+Centralized logging setup. No sensitive data in logs.
+
+With logging.queue (the default) request threads only put records on a bounded in-memory queue; a
+listener thread formats them and writes to stdout / the log file, so a slow log sink never stalls a
+request (records are dropped and counted when the queue is full). Per-query INFO/DEBUG messages can be
+sampled or rate limited per logger. Output is text or one JSON object per line. Every line passes
+through the PII redactor, whatever the caller put in the message.
+"""
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
+import re
 import sys
+import threading
+import time
 from pathlib import Path
 
+from src import metrics
 from src.config import get_logging_config, load_config, PROJECT_ROOT
 
+# Card numbers and Aadhaar numbers (16 or 12 digits in groups of 4, spaced or hyphenated), long digit
+# runs such as account numbers, and e-mail addresses
+_PII_PATTERNS = [
+    re.compile(r"\b\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b"),
+    re.compile(r"\b\d{4}[\s-]?\d{4}[\s-]?\d{4}\b"),
+    re.compile(r"\b\d{10,}\b"),
+    re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b"),
+]
+_REDACTED = "[REDACTED]"
+
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: "_DroppingQueueHandler | None" = None
+_setup_lock = threading.Lock()
+
+
+def redact(text: str) -> str:
+    """Mask account numbers, Aadhaar-like IDs and e-mail addresses."""
+    for pattern in _PII_PATTERNS:
+        text = pattern.sub(_REDACTED, text)
+    return text
+
+
+def _report_error(record: logging.LogRecord) -> None:
+    """Handler.handleError without the message and arguments it would print to stderr unredacted."""
+    if logging.raiseExceptions and sys.stderr:
+        sys.stderr.write(f"--- Logging error in {record.name}: {sys.exc_info()[0].__name__} ---\n")
+
+
+class RedactingFormatter(logging.Formatter):
+    """Text lines with PII masked (message and traceback alike)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg (+ exc). PII masked."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage()),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = redact(record.exc_text)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Thins INFO/DEBUG records per logger; WARNING and above always pass. sample maps a logger name
+    (and its children) to the fraction of records kept; rate_limit_per_s caps what each logger emits
+    per second (token bucket, burst of one second or one record). Dropped records are counted in logging.sampled_out.
+    """
+
+    def __init__(self, sample: dict | None = None, rate_limit_per_s: float = 0.0):
+        super().__init__()
+        self.sample = {name: float(rate) for name, rate in (sample or {}).items()}
+        self.rate = float(rate_limit_per_s)
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _fraction(self, name: str) -> float:
+        while name:
+            if name in self.sample:
+                return self.sample[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def _take(self, name: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            # A sub-1 rate still needs room for one whole record (0.5/s: one record every 2s)
+            burst = max(1.0, self.rate)
+            tokens, last = self._buckets.get(name, (burst, now))
+            tokens = min(burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[name] = (tokens, now)
+                return False
+            self._buckets[name] = (tokens - 1, now)
+            return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        fraction = self._fraction(record.name)
+        if (fraction < 1.0 and random.random() >= fraction) or (self.rate > 0 and not self._take(record.name)):
+            metrics.incr("logging.sampled_out")
+            return False
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: a full queue drops the record (counted in logging.dropped)."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Merge args into the message but keep the traceback in exc_text, not folded into msg as the base
+        class does, so the listener's formatter still sees it (JsonFormatter emits it as "exc").
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.incr("logging.dropped")
+
+
+def _start_listener(handlers: list[logging.Handler], maxsize: int) -> None:
+    global _listener
+    _queue_handler.queue = queue.Queue(maxsize)
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_in_child() -> None:
+    """The listener thread does not survive fork(): give each worker process its own queue and listener."""
+    if _listener is not None:
+        _start_listener(list(_listener.handlers), _queue_handler.queue.maxsize)
+
+
+def _stop_listener() -> None:
+    """Flush what is queued (atexit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def setup_logging(
     level: str | None = None,
     log_file: Path | None = None,
     log_sensitive: bool = False,
 ) -> None:
-    """Configure root logger. Never log PII or sensitive customer data."""
+    """Configure root logger. Never log PII or sensitive customer data. No-op if already configured."""
+    global _queue_handler
     cfg = load_config()
     log_cfg = get_logging_config(cfg)
     lvl = level or os.getenv("LOG_LEVEL") or log_cfg.get("level", "INFO")
     fmt = log_cfg.get("format", "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
-    logging.basicConfig(
-        level=getattr(logging, lvl.upper(), logging.INFO),
-        format=fmt,
-        handlers=[logging.StreamHandler(sys.stdout)],
-    )
-    if log_file:
-        fh = logging.FileHandler(log_file, encoding="utf-8")
-        fh.setFormatter(logging.Formatter(fmt))
-        logging.getLogger().addHandler(fh)
+    with _setup_lock:
+        root = logging.getLogger()
+        if root.handlers:
+            return
+        root.setLevel(getattr(logging, lvl.upper(), logging.INFO))
+        formatter = JsonFormatter() if log_cfg.get("output", "text") == "json" else RedactingFormatter(fmt)
+        handlers: list[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+        if log_file:
+            handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+        for h in handlers:
+            h.setFormatter(formatter)
+            h.handleError = _report_error
+        sampling = SamplingFilter(log_cfg.get("sample") or {}, float(log_cfg.get("rate_limit_per_s", 0) or 0))
+
+        if not log_cfg.get("queue", True):
+            for h in handlers:
+                h.addFilter(sampling)
+                root.addHandler(h)
+            return
+        # Filter on the caller side, so sampled-out records never reach the queue
+        _queue_handler = _DroppingQueueHandler(queue.Queue())
+        _queue_handler.addFilter(sampling)
+        _queue_handler.handleError = _report_error
+        _start_listener(handlers, int(log_cfg.get("queue_size", 10000)))
+        root.addHandler(_queue_handler)
+        atexit.register(_stop_listener)
+        os.register_at_fork(after_in_child=_restart_in_child)
 
 
 def get_logger(name: str) -> logging.Logger:
@@ -0,0 +1,25 @@
+"""Process-wide counters for pipeline efficiency (tokens decoded, avoided SLM calls, ...). No query text."""
+import threading
+
+_counters: dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get(name: str) -> float:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> dict[str, float]:
+    with _lock:
+        return dict(_counters)
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
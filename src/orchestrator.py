@@ -1,11 +1,21 @@
-"""Orchestrate Tier 1 (dataset) → Tier 2 (SLM) → Tier 3 (RAG) and return final response."""
-from dataclasses import dataclass
+"""Orchestrate calculator / structured facts → Tier 1 (dataset) → Tier 2 (SLM) → Tier 3 (RAG) and return final response."""
+import asyncio
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import dataclass, replace
 from typing import Optional
 
+from src import metrics
+from src.calculator import LoanCalculator
+from src.coalesce import SingleFlight, coalesce_key
 from src.config import load_config
+from src.deadline import Deadline
+from src.lanes import LaneFull, LaneScheduler
 from src.logging_config import get_logger
+from src.sessions import Session, SessionStore
 from src.similarity import DatasetSimilarity
 from src.slm import SLMInference
+from src.structured import KnowledgeFacts
 from src.rag import RAGRetriever, is_complex_query
 from src.guardrails import guardrail_pre, guardrail_post
 
@@ -15,57 +25,411 @@ logger = get_logger(__name__)
 @dataclass
 class ResponseResult:
     response: str
-    tier: str  # "dataset" | "slm" | "rag"
+    tier: str  # "calculator" | "structured" | "dataset" | "slm" | "rag"
     sources: Optional[str] = None
+    degraded: bool = False  # True when the latency deadline forced a fallback or a cut-short answer
+    adapter: Optional[str] = None  # LoRA adapter that generated the answer (named adapters only)
+    reply: Optional[str] = None  # SLM text before guardrail_post: what the session history (and its KV cache) holds
+
+
+_SAFE_FALLBACK = ResponseResult(
+    response="Something went wrong on our side. Please try again or contact customer care for assistance.",
+    tier="dataset",
+)
 
 
 class Orchestrator:
-    """Single entry point: query → guardrails pre → Tier 1 → Tier 2/3 → guardrails post."""
+    """Single entry point: query → guardrails pre → calculator / structured facts → Tier 1 → Tier 2/3 → guardrails post."""
 
     def __init__(self):
+        self.calculator = LoanCalculator()
+        self.facts = KnowledgeFacts()
         self.similarity = DatasetSimilarity()
         self.slm = SLMInference()
         self.rag = RAGRetriever()
+        cfg = load_config()
+        self.latency = cfg.get("latency", {})
+        self.coalescer = SingleFlight() if cfg.get("coalesce", {}).get("enabled", True) else None
+        self.lanes = LaneScheduler(cfg) if cfg.get("lanes", {}).get("enabled", True) else None
+        self.sessions = SessionStore(cfg, on_evict=self.slm.drop_session) if cfg.get("sessions", {}).get("enabled", True) else None
+
+    def warm_up(self, load_slm: bool = True) -> None:
+        """
+        Load model weights (embedders, SLM) ahead of the first request. Index handles
+        (Chroma clients) are left lazy so a pre-forking server can call this in the parent
+        and share the weights copy-on-write without sharing sqlite connections.
+        """
+        self.similarity._get_embedder()
+        self.rag._get_embedder()
+        if load_slm and not self.slm._load_model():
+            logger.warning("SLM warm-up failed; it will be retried on first use")
+
+    def reload_indexes(self) -> dict:
+        """
+        Switch Tier 1, RAG and the structured facts to the versions published on disk, if newer than
+        the ones in use. Each swap replaces one reference, so a request runs entirely on the old or
+        entirely on the new version.
+        """
+        switched = {"dataset": self.similarity.reload(), "knowledge": self.rag.reload()}
+        if switched["knowledge"]:
+            self.facts = KnowledgeFacts()
+        return switched
+
+    def rebuild_indexes(self, force: bool = False, workers: int | None = None) -> dict:
+        """Build new versions of whichever indexes are stale (all with force), publish them and switch to them."""
+        built = {}
+        if force or self.similarity.needs_build():
+            built["dataset"] = self.similarity.build(force=force, workers=workers)
+        if force or self.rag.needs_build():
+            built["knowledge"] = self.rag.build(force=force, workers=workers)
+        return {"built": built, "switched": self.reload_indexes()}
+
+    def end_session(self, session_id: str) -> bool:
+        """Forget a conversation and free its SLM cache (e.g. when the call ends)."""
+        return self.sessions.end(session_id) if self.sessions is not None else False
+
+    def _session(self, session_id: str | None) -> Session | None:
+        return self.sessions.get(session_id) if self.sessions is not None and session_id else None
 
-    def respond(self, user_query: str) -> ResponseResult:
-        """Run pipeline and return response with tier used. Never raises."""
-        safe_fallback = ResponseResult(
-            response=(
-                "Something went wrong on our side. Please try again or contact customer care for assistance."
-            ),
-            tier="dataset",
+    def _standalone(self, session: Session | None, user_query: str) -> str:
+        """
+        Follow-ups rewritten with the session topic before Tier 1, facts and RAG see them. Runs after
+        guardrail_pre on the raw query, so the inserted topic never makes an off-domain query pass.
+        """
+        return self.sessions.standalone(session, user_query) if session is not None else user_query
+
+    @staticmethod
+    def _record(session: Session | None, sanitized: str | None, result: ResponseResult) -> None:
+        if session is not None and sanitized:
+            if result.reply is not None:
+                answer = result.reply
+            else:
+                answer = "" if result.degraded else result.response
+            session.add(sanitized, answer, result.tier)
+
+    def _degraded(self, sanitized: str) -> ResponseResult:
+        """Out of time: best Tier 1 candidate if it is close enough, else the canned message."""
+        stored, score = self.similarity.nearest(sanitized)
+        min_sim = float(self.latency.get("degraded_min_similarity", 0.6))
+        if stored is not None and score is not None and score >= min_sim:
+            logger.info("Degraded to nearest Tier 1 answer: similarity=%.3f", score)
+            return ResponseResult(response=guardrail_post(stored), tier="dataset", degraded=True)
+        msg = self.latency.get(
+            "degraded_message",
+            "I need a little more time to answer that accurately. Please hold, or contact customer care for detailed assistance.",
         )
+        return ResponseResult(response=msg, tier="dataset", degraded=True)
+
+    def _references(self, sanitized: str) -> list[str] | None:
+        """Nearest Tier 1 answers to seed lookup drafts (only when the SLM decodes in lookup mode)."""
+        if self.slm.assisted_mode != "lookup":
+            return None
+        n = int(self.slm.assisted.get("reference_answers", 3))
+        return [output for output, _ in self.similarity.candidates(sanitized, n)]
+
+    def _answer(self, sanitized: str, deadline: Deadline, adapter: str | None = None, session: Session | None = None) -> ResponseResult:
+        """Pipeline after the input guardrail. Raises on failure (respond turns that into the safe fallback)."""
+        fast = self._fast_path(sanitized)
+        if fast is not None:
+            return fast
+        if self.lanes is None:
+            return self._slow_path(sanitized, deadline, adapter, session)
+        # Bounds concurrent generations to the slow lane's workers even for blocking callers
+        try:
+            slow = self.lanes.submit("slow", lambda: self._slow_path(sanitized, deadline, adapter, session), self._slow_cost(sanitized))
+        except LaneFull:
+            logger.info("Slow lane full; degrading")
+            return self._degraded(sanitized)
+        try:
+            return slow.result(timeout=None if deadline.expires_at is None else max(0.0, deadline.remaining()))
+        except FutureTimeout:
+            # Still queued: drop it; already generating: abandon it (the SLM stops at the deadline)
+            slow.cancel()
+            logger.info("Deadline: slow lane job not done in time, degrading")
+            return self._degraded(sanitized)
+
+    def _fast_path(self, sanitized: str) -> ResponseResult | None:
+        """Calculator, structured facts and Tier 1; None if the query needs the SLM."""
+        # EMI/schedule/prepayment questions with principal, rate and tenure are computed, not generated
+        computed = self.calculator.answer(sanitized)
+        if computed is not None:
+            return ResponseResult(response=guardrail_post(computed), tier="calculator")
+
+        # Rate/tenure/charge lookups straight from the knowledge tables (no embedding, no model call)
+        structured = self.facts.answer(sanitized)
+        if structured is not None:
+            final = guardrail_post(structured.response)
+            return ResponseResult(response=final, tier="structured", sources=structured.sources)
+
+        stored, score = self.similarity.query(sanitized)
+        if stored is not None:
+            final = guardrail_post(stored)
+            return ResponseResult(response=final, tier="dataset")
+        return None
+
+    def _slow_cost(self, sanitized: str) -> float:
+        """Prompt size estimate (chars) for shortest-first ordering: the query, plus retrieved context for RAG queries."""
+        if is_complex_query(sanitized):
+            return len(sanitized) + self.rag.top_k * self.rag.chunk_size * 6  # chunk_size is in words
+        return len(sanitized)
+
+    def _flight_key(self, sanitized: str, adapter: str | None, session: Session | None = None) -> str:
+        """Coalescing key: requests for different adapters, or generated from a session's history, must not share an answer."""
+        key = coalesce_key(sanitized)
+        if adapter:
+            key = f"{key}|{adapter}"
+        return f"{key}|session:{session.id}" if session is not None and len(session) else key
+
+    def _slow_path(self, sanitized: str, deadline: Deadline, adapter: str | None = None, session: Session | None = None) -> ResponseResult:
+        """RAG retrieval and SLM generation (or a degraded answer if the deadline leaves too little time)."""
+        if deadline.remaining() < float(self.latency.get("min_slm_budget_s", 1.0)):
+            logger.info("Deadline: %.2fs left, not starting SLM", deadline.remaining())
+            return self._degraded(sanitized)
+
+        context = None
+        if is_complex_query(sanitized):
+            if deadline.remaining() >= float(self.latency.get("min_rag_budget_s", 3.0)):
+                context = self.rag.retrieve(sanitized)
+            else:
+                logger.info("Deadline: %.2fs left, skipping RAG", deadline.remaining())
+            if context:
+                response = self.slm.generate(
+                    instruction=sanitized,
+                    input_text="",
+                    context=context,
+                    deadline=deadline,
+                    references=self._references(sanitized),
+                    adapter=adapter,
+                    history=session.history() if session is not None else None,
+                    session_id=session.id if session is not None else None,
+                )
+                if not response:
+                    return self._degraded(sanitized)
+                final = guardrail_post(response, allowed_context=context)
+                return ResponseResult(
+                    response=final, tier="rag", sources=context[:500], degraded=deadline.hit, adapter=adapter, reply=response
+                )
+        response = self.slm.generate(
+            instruction=sanitized,
+            input_text="",
+            deadline=deadline,
+            references=self._references(sanitized),
+            adapter=adapter,
+            history=session.history() if session is not None else None,
+            session_id=session.id if session is not None else None,
+        )
+        if not response:
+            return self._degraded(sanitized)
+        final = guardrail_post(response)
+        return ResponseResult(response=final, tier="slm", degraded=deadline.hit, adapter=adapter, reply=response)
+
+    def respond(
+        self,
+        user_query: str,
+        deadline: Deadline | float | None = None,
+        adapter: str | None = None,
+        session_id: str | None = None,
+    ) -> ResponseResult:
+        """
+        Run pipeline and return response with tier used. Never raises.
+        deadline is a Deadline or a budget in seconds; RAG is skipped and the SLM is not started when
+        too little of it remains, and the SLM stops decoding when it expires (result marked degraded).
+        adapter requests a named LoRA adapter (slm.adapters); by default one is routed from the query.
+        session_id ties the query to a conversation (sessions:): follow-ups are rewritten into standalone
+        queries, the SLM sees the recent turns, and the turn is recorded for the next one.
+        """
+        if not isinstance(deadline, Deadline):
+            deadline = Deadline(deadline)
         try:
             if not user_query or not user_query.strip():
                 return ResponseResult(
                     response="Please ask a banking, loan, or account-related question.",
                     tier="dataset",
                 )
+            session = self._session(session_id)
             reject_msg, sanitized = guardrail_pre(user_query)
             if reject_msg is not None:
                 return ResponseResult(response=reject_msg, tier="dataset")
+            sanitized = self._standalone(session, sanitized)
+            adapter = self.slm.route_adapter(sanitized, adapter)
 
-            stored, score = self.similarity.query(sanitized)
-            if stored is not None:
-                final = guardrail_post(stored)
-                return ResponseResult(response=final, tier="dataset")
-
-            context = None
-            if is_complex_query(sanitized):
-                context = self.rag.retrieve(sanitized)
-                if context:
-                    response = self.slm.generate(
-                        instruction=sanitized,
-                        input_text="",
-                        context=context,
-                    )
-                    final = guardrail_post(response, allowed_context=context)
-                    return ResponseResult(
-                        response=final, tier="rag", sources=context[:500]
-                    )
-            response = self.slm.generate(instruction=sanitized, input_text="")
-            final = guardrail_post(response)
-            return ResponseResult(response=final, tier="slm")
+            if self.coalescer is None:
+                result = self._answer(sanitized, deadline, adapter, session)
+                self._record(session, sanitized, result)
+                return result
+            # Identical questions in flight at once (outage spikes) share one pipeline run
+            try:
+                result, shared = self.coalescer.do(
+                    self._flight_key(sanitized, adapter, session),
+                    lambda: self._answer(sanitized, deadline, adapter, session),
+                    timeout=None if deadline.expires_at is None else deadline.remaining(),
+                )
+            except TimeoutError:
+                logger.info("Deadline: identical query still in flight, degrading")
+                return self._degraded(sanitized)
+            if shared:
+                metrics.incr("coalesce.followers")
+                result = replace(result)
+            self._record(session, sanitized, result)
+            return result
         except Exception as e:
             logger.exception("Orchestrator respond failed: %s", e)
-            return safe_fallback
+            return replace(_SAFE_FALLBACK)
+
+    def _respond_fast(self, user_query: str, session: Session | None = None) -> tuple[ResponseResult | None, str]:
+        """respond() up to the slow stage: (final result, sanitized query), result None if the SLM is needed."""
+        try:
+            if not user_query or not user_query.strip():
+                return ResponseResult(response="Please ask a banking, loan, or account-related question.", tier="dataset"), ""
+            reject_msg, sanitized = guardrail_pre(user_query)
+            if reject_msg is not None:
+                return ResponseResult(response=reject_msg, tier="dataset"), sanitized
+            sanitized = self._standalone(session, sanitized)
+            return self._fast_path(sanitized), sanitized
+        except Exception as e:
+            logger.exception("Orchestrator fast path failed: %s", e)
+            return replace(_SAFE_FALLBACK), ""
+
+    def submit(
+        self,
+        user_query: str,
+        deadline: Deadline | float | None = None,
+        adapter: str | None = None,
+        session_id: str | None = None,
+    ) -> "PendingResponse":
+        """
+        Start respond() on the lanes without blocking: the fast stage on the fast lane, then (if needed)
+        the slow stage on the slow lane, coalesced with identical slow queries in flight. The returned
+        PendingResponse reports the slow-lane queue position and resolves to a ResponseResult (its
+        future never raises). Without lanes, runs respond() before returning.
+        """
+        if not isinstance(deadline, Deadline):
+            deadline = Deadline(deadline)
+        pending = PendingResponse(self, deadline)
+        if self.lanes is None:
+            pending.future.set_result(self.respond(user_query, deadline, adapter, session_id))
+            return pending
+        session = self._session(session_id)
+        if session is not None:
+            pending.future.add_done_callback(lambda f: self._record(session, pending.sanitized, f.result()))
+        fast = self.lanes.submit("fast", lambda: self._respond_fast(user_query, session))
+        fast.add_done_callback(lambda f: self._start_slow(pending, *f.result(), adapter=adapter, session=session))
+        return pending
+
+    def _start_slow(
+        self,
+        pending: "PendingResponse",
+        result: ResponseResult | None,
+        sanitized: str,
+        retry: bool = True,
+        adapter: str | None = None,
+        session: Session | None = None,
+    ) -> None:
+        pending.sanitized = sanitized
+        if result is not None:
+            pending.future.set_result(result)
+            return
+        adapter = self.slm.route_adapter(sanitized, adapter)
+
+        def run():
+            pending.started = time.monotonic()
+            return self._slow_path(sanitized, pending.deadline, adapter, session)
+
+        def start():
+            # Kept for queue_position(); the coalescer hands back its own future for the same task
+            pending.slow = self.lanes.submit("slow", run, self._slow_cost(sanitized))
+            return pending.slow
+
+        try:
+            if self.coalescer is None:
+                fut, shared = start(), False
+            else:
+                fut, shared = self.coalescer.attach(self._flight_key(sanitized, adapter, session), start)
+        except LaneFull:
+            logger.info("Slow lane full; degrading")
+            pending.future.set_result(self._degraded(sanitized))
+            return
+        except Exception as e:
+            logger.exception("Could not queue slow path: %s", e)
+            pending.future.set_result(replace(_SAFE_FALLBACK))
+            return
+        pending.shared = shared
+
+        def finish(f) -> None:
+            if pending.future.done():
+                return
+            if f.cancelled() or f.exception() is not None:
+                if shared and retry:
+                    self._start_slow(pending, None, sanitized, retry=False, adapter=adapter, session=session)  # the leader failed; run our own
+                    return
+                if not f.cancelled():
+                    logger.error("Orchestrator slow path failed: %s", f.exception())
+                pending.future.set_result(replace(_SAFE_FALLBACK))
+            elif shared:
+                metrics.incr("coalesce.followers")
+                pending.future.set_result(replace(f.result()))
+            else:
+                pending.future.set_result(f.result())
+
+        fut.add_done_callback(finish)
+
+    async def respond_async(
+        self,
+        user_query: str,
+        deadline: Deadline | float | None = None,
+        adapter: str | None = None,
+        session_id: str | None = None,
+    ) -> ResponseResult:
+        """
+        respond() for async servers via submit(): awaiting holds no thread, so a backlog of generations
+        never delays a fast answer. Degrades when the deadline passes first. Never raises. Without
+        lanes, runs respond() in a worker thread.
+        """
+        if not isinstance(deadline, Deadline):
+            deadline = Deadline(deadline)
+        if self.lanes is None:
+            return await asyncio.to_thread(self.respond, user_query, deadline, adapter, session_id)
+        pending = self.submit(user_query, deadline, adapter, session_id)
+        timeout = None if deadline.expires_at is None else deadline.remaining()
+        try:
+            # shield: giving up on the wait must not cancel work other requests may share
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(pending.future)), timeout)
+        except asyncio.TimeoutError:
+            logger.info("Deadline: no answer from the lanes in time, degrading")
+            return await self.lanes.run("fast", pending.timed_out)
+
+
+class PendingResponse:
+    """An in-progress Orchestrator.submit(): the future result plus where it is in the slow lane."""
+
+    def __init__(self, orch: Orchestrator, deadline: Deadline):
+        self.orch = orch
+        self.deadline = deadline
+        self.future: Future = Future()
+        self.submitted = time.monotonic()
+        self.started: float | None = None  # when the slow stage began running
+        self.sanitized: str | None = None
+        self.slow: Future | None = None  # this request's own slow-lane task (None if fast or coalesced)
+        self.shared = False
+
+    def queue_position(self) -> int | None:
+        """0-based place in the slow-lane queue, or None if not waiting there."""
+        if self.slow is None or self.orch.lanes is None:
+            return None
+        return self.orch.lanes.slow.position(self.slow)
+
+    def queue_wait(self) -> float | None:
+        return None if self.started is None else self.started - self.submitted
+
+    def timed_out(self) -> ResponseResult:
+        """Answer to give when the deadline passes before the result: the degraded Tier 1 fallback."""
+        if self.future.done():
+            return self.future.result()
+        return self.orch._degraded(self.sanitized or "")
+
+    def result(self, timeout: float | None = None) -> ResponseResult:
+        """Wait for the answer; after timeout seconds, the degraded fallback instead."""
+        try:
+            return self.future.result(timeout)
+        except FutureTimeout:
+            return self.timed_out()
@@ -1,12 +1,42 @@
 """Tier 3: RAG retrieval over knowledge base. Returns context for SLM to generate grounded response."""
+import re
+import shutil
+import threading
 from pathlib import Path
 from typing import List
 
+from src.artifacts import read_manifest, write_manifest
 from src.config import PROJECT_ROOT, load_config
+from src.embeddings import get_embedder, parallel_encoder
+from src.index_versions import LiveSnapshot, build_lock, current_path, new_version, prune, publish
 from src.logging_config import get_logger
+from src.structured import build_facts, save_facts
 
 logger = get_logger(__name__)
 
+COLLECTION_NAME = "bfsi_knowledge"
+
+
+def chunk_text(text: str, chunk_size: int = 512, overlap: int = 64) -> list[str]:
+    words = text.split()
+    chunks = []
+    start = 0
+    while start < len(words):
+        end = min(start + chunk_size, len(words))
+        chunk = " ".join(words[start:end])
+        if chunk.strip():
+            chunks.append(chunk.strip())
+        start = end - overlap if end < len(words) else len(words)
+    return chunks
+
+
+def knowledge_stamp(knowledge_path: Path) -> list[list]:
+    """(name, size, mtime) of every markdown file; a version is stale when this differs from its manifest."""
+    return [
+        [str(p.relative_to(knowledge_path)), p.stat().st_size, int(p.stat().st_mtime)]
+        for p in sorted(Path(knowledge_path).glob("**/*.md"))
+    ]
+
 
 def is_complex_query(query: str, keywords: List[str] | None = None) -> bool:
     """Heuristic: query is complex if it contains any of the configured keywords."""
@@ -16,6 +46,13 @@ def is_complex_query(query: str, keywords: List[str] | None = None) -> bool:
     return any(kw.lower() in q for kw in keywords)
 
 
+def _close_client(snap: tuple) -> None:
+    """Release a swapped-out Chroma client (clients without close() are left to the garbage collector)."""
+    close = getattr(snap[1], "close", None)
+    if close is not None:
+        close()
+
+
 class RAGRetriever:
     """Retrieve relevant chunks from knowledge base for a query."""
 
@@ -37,54 +74,139 @@ class RAGRetriever:
             self.knowledge_path = PROJECT_ROOT / self.knowledge_path
         self.embedding_model_name = embedding_model or sim.get("embedding_model", "all-MiniLM-L6-v2")
         self.top_k = top_k or rag.get("top_k", 3)
-        self._client = None
-        self._coll = None
+        self.chunk_size = rag.get("chunk_size", 512)
+        self.chunk_overlap = rag.get("chunk_overlap", 64)
+        self.structured = cfg.get("structured", {})
+        self.keep_versions = int(cfg.get("reload", {}).get("keep_versions", 3))
+        self._live: LiveSnapshot[tuple] = LiveSnapshot(_close_client)  # (version, client, collection)
+        self._load_lock = threading.Lock()
         self._embedder = None
 
     def _get_embedder(self):
         if self._embedder is not None:
             return self._embedder
-        from sentence_transformers import SentenceTransformer
-        self._embedder = SentenceTransformer(self.embedding_model_name)
+        self._embedder = get_embedder(self.embedding_model_name)
         return self._embedder
 
-    def _get_collection(self):
-        if self._coll is not None:
-            return self._coll
+    def _open(self, version: str | None, path: Path):
         try:
             import chromadb
             from chromadb.config import Settings
         except ImportError:
             raise ImportError("Install chromadb: pip install chromadb")
-        self.chroma_path.mkdir(parents=True, exist_ok=True)
-        client = chromadb.PersistentClient(path=str(self.chroma_path), settings=Settings(anonymized_telemetry=False))
+        if not path.exists():
+            raise RuntimeError("RAG index not found. Run: python scripts/ingest_rag.py")
+        client = chromadb.PersistentClient(path=str(path), settings=Settings(anonymized_telemetry=False))
         try:
-            self._coll = client.get_collection("bfsi_knowledge", metadata={"hnsw:space": "cosine"})
+            coll = client.get_collection(COLLECTION_NAME)
         except Exception:
             raise RuntimeError("RAG index not found. Run: python scripts/ingest_rag.py")
-        self._client = client
-        return self._coll
+        return version, client, coll
+
+    def _reading(self):
+        """Hold the collection in use (opened on first use) for one request: a reload does not close it underneath."""
+        if self._live.get() is None:
+            with self._load_lock:
+                if self._live.get() is None:
+                    self._live.swap(self._open(*current_path(self.chroma_path)))
+        return self._live.reading()
+
+    @property
+    def version(self) -> str | None:
+        snap = self._live.get()
+        return snap[0] if snap is not None else None
+
+    def needs_build(self) -> bool:
+        """True if the published knowledge index is missing or older than the markdown under knowledge_path."""
+        _, path = current_path(self.chroma_path)
+        manifest = read_manifest(path) or {}
+        return manifest.get("knowledge") != knowledge_stamp(self.knowledge_path)
+
+    def build(self, force: bool = False, workers: int | None = None) -> str | None:
+        """
+        Chunk and embed knowledge_path into a new Chroma version and publish it; the collection in use
+        is never touched. Also rewrites the structured facts file from the same markdown. Returns the
+        published version, or None if there is nothing to ingest or another build holds the lock.
+        """
+        with build_lock(self.chroma_path) as locked:
+            if not locked:
+                logger.info("Knowledge index build already running for %s", self.chroma_path)
+                return None
+            version = current_path(self.chroma_path)[0]
+            if not force and version is not None and not self.needs_build():
+                logger.info("Knowledge index %s is up to date", version)
+                return version
+            stamp = knowledge_stamp(self.knowledge_path)
+            chunks = []
+            for path in sorted(self.knowledge_path.glob("**/*.md")):
+                # Normalise whitespace
+                text = re.sub(r"\s+", " ", path.read_text(encoding="utf-8")).strip()
+                chunks.extend(chunk_text(text, chunk_size=self.chunk_size, overlap=self.chunk_overlap))
+            if not chunks:
+                logger.error("No .md files found under %s", self.knowledge_path)
+                return None
+            version, path = new_version(self.chroma_path)
+            try:
+                with parallel_encoder(self.embedding_model_name, workers=workers) as encoder:
+                    embeddings = encoder.encode(chunks)
+                logger.info("Embedded %d chunks with %d worker(s): %.1f chunks/s", len(chunks), encoder.workers, encoder.last_rate)
+                import chromadb
+                from chromadb.config import Settings
+                client = chromadb.PersistentClient(path=str(path), settings=Settings(anonymized_telemetry=False))
+                coll = client.create_collection(COLLECTION_NAME, metadata={"hnsw:space": "cosine"})
+                coll.add(ids=[f"c{i}" for i in range(len(chunks))], embeddings=embeddings.tolist(), documents=chunks)
+                # Manifest last: a version without one is never treated as up to date
+                write_manifest(path, {"knowledge": stamp, "chunks": len(chunks), "embedding_model": self.embedding_model_name})
+            except BaseException:
+                shutil.rmtree(path, ignore_errors=True)
+                raise
+            facts = build_facts(self.knowledge_path, self.structured.get("sources", ["interest_rates.md", "penalties_policy.md"]))
+            save_facts(facts, PROJECT_ROOT / self.structured.get("facts_path", "data/knowledge_facts.json"))
+            publish(self.chroma_path, version)
+            prune(self.chroma_path, self.keep_versions, in_use=[self.version])
+            logger.info("Published knowledge index version %s (%d chunks, %d facts)", version, len(chunks), len(facts))
+            return version
+
+    def reload(self) -> bool:
+        """
+        Switch to the published version if it is not the one in use (opened and warmed first). The old
+        client is closed once requests still reading it finish. True if switched.
+        """
+        version, path = current_path(self.chroma_path)
+        old = self._live.get()
+        if old is not None and old[0] == version:
+            return False
+        try:
+            snap = self._open(version, path)
+            # Load the HNSW segment before requests reach it
+            snap[2].query(query_embeddings=self._get_embedder().encode(["interest rate"]).tolist(), n_results=1, include=["distances"])
+        except Exception as e:
+            logger.warning("Knowledge index version %s not usable (%s); keeping the current one", version, e)
+            return False
+        self._live.swap(snap)
+        logger.info("Switched knowledge index to version %s", version)
+        return True
 
     def retrieve(self, query: str) -> str:
         """Return concatenated context from top-k chunks. Empty if no index or on error."""
         if not query or not query.strip():
             return ""
         try:
-            coll = self._get_collection()
+            reading = self._reading()
         except Exception:
             logger.warning("RAG index missing or error; returning empty context")
             return ""
         try:
-            embedder = self._get_embedder()
-            q_emb = embedder.encode([query.strip()])
-            n = min(self.top_k, coll.count())
-            if n == 0:
-                return ""
-            results = coll.query(
-                query_embeddings=q_emb.tolist(),
-                n_results=n,
-                include=["documents"],
-            )
+            with reading as (_, _, coll):
+                q_emb = self._get_embedder().encode([query.strip()])
+                n = min(self.top_k, coll.count())
+                if n == 0:
+                    return ""
+                results = coll.query(
+                    query_embeddings=q_emb.tolist(),
+                    n_results=n,
+                    include=["documents"],
+                )
             if not results["documents"] or not results["documents"][0]:
                 return ""
             docs = results["documents"][0]
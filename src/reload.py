@@ -0,0 +1,90 @@
+"""
+Background index rebuilds and version watching for a running server. Builds run on one thread and
+publish a new index version; every process (including the one that built) then switches with
+Orchestrator.reload_indexes(), so serving never pauses for a rebuild or restart.
+"""
+import threading
+import time
+
+from src.config import load_config
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class IndexReloader:
+    """
+    Owns the rebuild thread and the optional watcher for one orchestrator. The watcher polls the
+    published versions every reload.watch_interval_s (cheap: one small file read per index) and, with
+    reload.watch_sources, also starts a rebuild when the dataset or knowledge files change.
+    """
+
+    def __init__(self, orch, cfg: dict | None = None):
+        cfg = (cfg if cfg is not None else load_config()).get("reload", {})
+        self.orch = orch
+        self.watch_interval_s = float(cfg.get("watch_interval_s", 0))
+        self.watch_sources = bool(cfg.get("watch_sources", False))
+        self._lock = threading.Lock()
+        self._build_thread: threading.Thread | None = None
+        self._watcher: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.last_result: dict | None = None
+        self.last_error: str | None = None
+        self.last_finished: float | None = None
+
+    @property
+    def building(self) -> bool:
+        t = self._build_thread
+        return t is not None and t.is_alive()
+
+    def start_build(self, force: bool = False, workers: int | None = None) -> bool:
+        """Rebuild stale indexes on a background thread; False if a build is already running."""
+        with self._lock:
+            if self.building:
+                return False
+            self._build_thread = threading.Thread(target=self._build, args=(force, workers), name="index-rebuild", daemon=True)
+            self._build_thread.start()
+            return True
+
+    def _build(self, force: bool, workers: int | None) -> None:
+        start = time.perf_counter()
+        try:
+            self.last_result = self.orch.rebuild_indexes(force=force, workers=workers)
+            self.last_error = None
+            logger.info("Index rebuild finished in %.1fs: %s", time.perf_counter() - start, self.last_result)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.exception("Index rebuild failed: %s", e)
+        finally:
+            self.last_finished = time.time()
+
+    def status(self) -> dict:
+        return {
+            "building": self.building,
+            "dataset_version": self.orch.similarity.version,
+            "knowledge_version": self.orch.rag.version,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+            "last_finished": self.last_finished,
+        }
+
+    def start_watcher(self) -> bool:
+        """Start polling if reload.watch_interval_s > 0 (call once per serving process, after any fork)."""
+        if self.watch_interval_s <= 0 or self._watcher is not None:
+            return False
+        self._watcher = threading.Thread(target=self._watch, name="index-watcher", daemon=True)
+        self._watcher.start()
+        return True
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.watch_interval_s):
+            try:
+                self.orch.reload_indexes()
+                if self.watch_sources and not self.building and (self.orch.similarity.needs_build() or self.orch.rag.needs_build()):
+                    logger.info("Index sources changed; starting background rebuild")
+                    self.start_build()
+            except Exception as e:
+                logger.warning("Index watcher poll failed: %s", e)
+
+    def stop(self) -> None:
+        self._stop.set()
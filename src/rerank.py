@@ -0,0 +1,91 @@
+"""
+Tier 1 gray-zone re-ranking. When the best cosine score is just under the threshold, a second opinion
+(cross-encoder, or margin + lexical-overlap rules) decides whether a stored answer is still right.
+"""
+import re
+import threading
+
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did", "can", "could", "should", "would",
+    "i", "me", "my", "we", "our", "you", "your", "it", "its", "to", "of", "in", "on", "for", "at", "by", "with",
+    "from", "and", "or", "if", "how", "what", "when", "where", "which", "who", "why", "there", "this", "that",
+    "any", "get", "much", "please", "about", "will", "am", "have", "has",
+}
+
+_cross_encoders: dict = {}
+_cross_encoder_lock = threading.Lock()
+
+
+def content_tokens(text: str) -> set[str]:
+    """Lower-cased word tokens minus stopwords; numbers are kept."""
+    return {t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in _STOPWORDS}
+
+
+def _get_cross_encoder(model_name: str):
+    with _cross_encoder_lock:
+        model = _cross_encoders.get(model_name)
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(model_name)
+            _cross_encoders[model_name] = model
+            logger.info("Loaded gray-zone cross-encoder: %s", model_name)
+        return model
+
+
+class GrayZoneReranker:
+    """
+    Picks one of the top-k Tier 1 candidates whose best score fell in [lower, threshold), or None.
+    Candidates are (sample text, cosine similarity, output), best first.
+    """
+
+    def __init__(self, cfg: dict):
+        self.enabled = bool(cfg.get("enabled", False))
+        self.lower = float(cfg.get("lower", 0.80))
+        self.method = cfg.get("method", "rules")
+        self.cross_encoder_model = cfg.get("cross_encoder_model", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+        self.min_cross_score = float(cfg.get("min_cross_score", 0.5))
+        self.min_margin = float(cfg.get("min_margin", 0.03))
+        self.min_overlap = float(cfg.get("min_overlap", 0.6))
+
+    def in_zone(self, score: float, threshold: float) -> bool:
+        return self.enabled and self.lower <= score < threshold
+
+    def pick(self, query: str, candidates: list[tuple[str, float, str]]) -> int | None:
+        """Index into candidates of an accepted match, or None to fall through to Tier 2/3."""
+        pool = [c for c in candidates if c[1] >= self.lower]
+        if not pool:
+            return None
+        if self.method == "cross_encoder":
+            try:
+                return self._pick_cross_encoder(query, pool)
+            except Exception as e:
+                logger.warning("Cross-encoder unavailable (%s); using margin/overlap rules", e)
+                self.method = "rules"
+        return self._pick_rules(query, pool)
+
+    def _pick_cross_encoder(self, query: str, pool: list[tuple[str, float, str]]) -> int | None:
+        model = _get_cross_encoder(self.cross_encoder_model)
+        # Single-logit cross-encoders return sigmoid relevance in [0, 1]
+        scores = [float(s) for s in model.predict([(query, text) for text, _, _ in pool])]
+        best = max(range(len(pool)), key=scores.__getitem__)
+        logger.info("Gray zone cross-encoder: best=%.3f (min %.2f)", scores[best], self.min_cross_score)
+        return best if scores[best] >= self.min_cross_score else None
+
+    def _pick_rules(self, query: str, pool: list[tuple[str, float, str]]) -> int | None:
+        """Accept the top candidate if it clearly beats the runner-up and shares most of the query's words."""
+        text, score, output = pool[0]
+        # A runner-up with the same stored answer is agreement, not competition
+        rivals = [s for _, s, o in pool[1:] if o != output]
+        margin = score - rivals[0] if rivals else 1.0
+        q_tokens, c_tokens = content_tokens(query), content_tokens(text)
+        overlap = len(q_tokens & c_tokens) / len(q_tokens) if q_tokens else 0.0
+        # Figures in the query that the stored question lacks usually mean a different question
+        numbers_ok = {t for t in q_tokens if t.isdigit()} <= c_tokens
+        logger.info("Gray zone rules: margin=%.3f overlap=%.2f numbers_ok=%s", margin, overlap, numbers_ok)
+        if margin >= self.min_margin and overlap >= self.min_overlap and numbers_ok:
+            return 0
+        return None
@@ -0,0 +1,173 @@
+"""Pre-fork serving: load model weights once in a parent process and fork workers that share them."""
+import gc
+import importlib
+import os
+import signal
+import socket
+import time
+from pathlib import Path
+
+from src.config import load_config
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def process_memory(pid: int | None = None) -> dict[str, int]:
+    """
+    Memory of a process in bytes (Linux /proc). "pss" charges shared pages proportionally,
+    "private" is what the process alone holds, so a forked worker's own cost is its private size.
+    """
+    pid = pid or os.getpid()
+    out = {"rss": 0, "pss": 0, "shared": 0, "private": 0}
+    rollup = Path(f"/proc/{pid}/smaps_rollup")
+    try:
+        if rollup.exists():
+            fields = {}
+            for line in rollup.read_text().splitlines()[1:]:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+            out["rss"] = fields.get("Rss", 0)
+            out["pss"] = fields.get("Pss", 0)
+            out["shared"] = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+            out["private"] = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+            return out
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                out["rss"] = out["pss"] = out["private"] = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return out
+
+
+def _mb(n: int) -> str:
+    return f"{n / (1024 * 1024):.0f}MB"
+
+
+def _log_memory(pids: dict[int, int]) -> None:
+    parent = process_memory()
+    logger.info("Parent pid=%s rss=%s pss=%s", os.getpid(), _mb(parent["rss"]), _mb(parent["pss"]))
+    total_pss = parent["pss"]
+    for slot, pid in sorted(pids.items(), key=lambda kv: kv[1]):
+        mem = process_memory(pid)
+        total_pss += mem["pss"]
+        logger.info(
+            "Worker %s pid=%s rss=%s shared=%s private=%s pss=%s",
+            slot, pid, _mb(mem["rss"]), _mb(mem["shared"]), _mb(mem["private"]), _mb(mem["pss"]),
+        )
+    logger.info("Total pss across %s workers: %s", len(pids), _mb(total_pss))
+
+
+def _load_app(app_path: str):
+    module_name, _, attr = app_path.partition(":")
+    module = importlib.import_module(module_name)
+    return module, getattr(module, attr or "app")
+
+
+def _run_worker(app, sock: socket.socket, threads: int) -> None:
+    """Child process body: restore signals, size torch's pool, serve on the inherited socket."""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, log_config=None))
+    server.run(sockets=[sock])
+
+
+def serve_prefork(
+    app_path: str = "demo.api:app",
+    host: str | None = None,
+    port: int | None = None,
+    workers: int | None = None,
+    threads_per_worker: int | None = None,
+    load_slm: bool = True,
+) -> int:
+    """
+    Import the app in this process, warm up its orchestrator (module attribute "orch"), then fork
+    workers that serve on one shared listening socket. Model tensors are never written after load,
+    so their pages stay shared copy-on-write; gc.freeze() keeps the collector from dirtying the
+    pre-fork Python heap. Dead workers are respawned; SIGINT/SIGTERM stop all workers.
+    """
+    serving = load_config().get("serving", {})
+    host = host or serving.get("host", "0.0.0.0")
+    port = port or int(serving.get("port", 8000))
+    workers = workers or int(serving.get("workers", 2))
+    threads = threads_per_worker or int(serving.get("threads_per_worker", 0)) or max(1, (os.cpu_count() or 1) // workers)
+    report_interval = float(serving.get("memory_report_interval_s", 60))
+
+    try:
+        import torch
+        # Keep the parent's intra-op pool unused: OpenMP pools do not survive fork()
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    module, app = _load_app(app_path)
+    orch = getattr(module, "orch", None)
+    if orch is not None and hasattr(orch, "warm_up"):
+        logger.info("Warming up orchestrator in parent pid=%s", os.getpid())
+        orch.warm_up(load_slm=load_slm)
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    logger.info("Listening on %s:%s with %s workers x %s threads", host, port, workers, threads)
+
+    pids: dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(app, sock, threads)
+            except Exception:
+                logger.exception("Worker %s crashed", slot)
+                code = 1
+            finally:
+                os._exit(code)
+        pids[slot] = pid
+
+    def stop(signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in pids.values():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for slot in range(workers):
+        spawn(slot)
+
+    next_report = time.monotonic() + min(5.0, report_interval)
+    while pids:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            slot = next((s for s, p in pids.items() if p == pid), None)
+            if slot is not None:
+                del pids[slot]
+                if not stopping:
+                    logger.warning("Worker %s (pid=%s) exited with status %s; respawning", slot, pid, status)
+                    spawn(slot)
+            continue
+        if report_interval > 0 and time.monotonic() >= next_report:
+            _log_memory(pids)
+            next_report = time.monotonic() + report_interval
+        time.sleep(0.5)
+    sock.close()
+    return 0
@@ -0,0 +1,188 @@
+"""
+Conversation sessions: the last few turns of each call, kept compactly in memory so follow-ups can
+be answered in context. The store is bounded (least recently used sessions go first) and idle
+sessions expire. Follow-ups ("and what about prepayment on that?") are rewritten into standalone
+queries from the session's topic, so Tier 1, structured facts and RAG see a complete question.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Callable
+
+from src import metrics
+from src.config import load_config
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# What a follow-up can refer back to: canonical topic -> pattern (first match in a query wins)
+_TOPICS = {
+    "personal loan": r"personal loans?",
+    "home loan": r"(home|housing) loans?|mortgage",
+    "education loan": r"(education|student) loans?",
+    "car loan": r"(car|auto|vehicle) loans?",
+    "business loan": r"business loans?",
+    "gold loan": r"gold loans?",
+    "credit card": r"credit cards?",
+    "debit card": r"debit cards?|atm cards?",
+    "fixed deposit": r"fixed deposits?|\bfds?\b",
+    "savings account": r"savings? accounts?",
+    "current account": r"current accounts?",
+    "net banking": r"net ?banking|internet banking",
+}
+_CONNECTIVE = re.compile(r"^\s*(and|also|so|then|ok(ay)?)\b[\s,]*", re.I)  # dropped when rewriting
+_FOLLOWUP = re.compile(r"^\s*(what about|how about|same for|what if)\b", re.I)
+# Only positions where the word is a pronoun standing for the topic, not a conjunction or determiner
+# ("true that my EMI...", "for that loan"): "that one", the object of a preposition, the last word
+_REFERENT = re.compile(
+    r"\b(?P<one>(?:that|this) one)\b"
+    r"|\b(?:on|for|of|about|with|in|to|from|against|under)\s+"
+    r"(?:(?P<obj>it|them)\b|(?P<demo>that|this|those|these)\b(?=\s*(?:[?.!,]|$)))"
+    r"|\b(?P<last>it|them|that|this|those|these)(?=\s*[?.!]*\s*$)",
+    re.I,
+)
+_MAX_FOLLOWUP_WORDS = 10  # longer queries with "it"/"this" are usually self-contained
+
+
+def find_topic(text: str) -> str | None:
+    t = (text or "").lower()
+    return next((name for name, pat in _TOPICS.items() if re.search(pat, t)), None)
+
+
+def _referents(text: str) -> list[tuple[int, int]]:
+    """Spans of pronouns in referent position, in order."""
+    spans = []
+    for m in _REFERENT.finditer(text):
+        group = next(g for g in ("one", "obj", "demo", "last") if m.group(g))
+        spans.append(m.span(group))
+    return spans
+
+
+@dataclass
+class Turn:
+    query: str  # standalone, sanitized query
+    response: str
+    tier: str
+
+
+class Session:
+    """Recent turns of one conversation. Thread-safe: turns are recorded from lane callbacks."""
+
+    def __init__(self, session_id: str, max_turns: int, max_chars: int):
+        self.id = session_id
+        self.turns: deque[Turn] = deque(maxlen=max_turns)
+        self.topic: str | None = None
+        self.max_chars = max_chars
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.turns)
+
+    def add(self, query: str, response: str, tier: str) -> None:
+        # Replies are clipped: the SLM prompt only needs the gist of earlier answers
+        turn = Turn(query, response[: self.max_chars], tier)
+        topic = find_topic(query)
+        with self._lock:
+            self.turns.append(turn)
+            self.topic = topic or self.topic
+
+    def history(self) -> list[tuple[str, str]]:
+        """(query, response) pairs, oldest first."""
+        with self._lock:
+            return [(t.query, t.response) for t in self.turns]
+
+    def standalone(self, query: str) -> str:
+        """
+        query rewritten to stand on its own, or unchanged. A query is a follow-up if it opens like one
+        ("and ...", "what about ...") or is short and has a pronoun in referent position ("that one",
+        "on it", a trailing "it"); the referent is the session topic (last product mentioned). Queries
+        that name a topic themselves are left alone.
+        """
+        with self._lock:
+            topic = self.topic
+        if not topic or find_topic(query):
+            return query
+        connective = _CONNECTIVE.match(query)
+        rest = query[connective.end():] if connective else query
+        referents = _referents(rest)
+        followup = (connective and len(rest.split()) > 1) or _FOLLOWUP.match(rest)
+        if not followup and not (referents and len(query.split()) <= _MAX_FOLLOWUP_WORDS):
+            return query
+        if referents:
+            # The last one is the referent ("is it possible to top up on it?")
+            start, end = referents[-1]
+            rewritten = rest[:start] + topic + rest[end:]
+        else:
+            body = rest.rstrip(" ?.!")
+            rewritten = f"{body} for {topic}" + rest[len(body):]
+        metrics.incr("sessions.rewritten")
+        return rewritten.strip()
+
+
+class SessionStore:
+    """
+    Sessions by id, least recently used first. get() creates on first use; sessions idle for longer
+    than ttl_s, or beyond max_sessions, are dropped and on_evict(session_id) is called (the SLM uses
+    it to free the session's KV cache).
+    """
+
+    def __init__(self, cfg: dict | None = None, on_evict: Callable[[str], None] | None = None):
+        cfg = (cfg if cfg is not None else load_config()).get("sessions", {})
+        self.max_sessions = int(cfg.get("max_sessions", 10000))
+        self.ttl_s = float(cfg.get("ttl_s", 1800))
+        self.max_turns = int(cfg.get("max_turns", 6))
+        self.max_chars = int(cfg.get("max_chars_per_turn", 600))
+        self.rewrite = bool(cfg.get("rewrite_followups", True))
+        self.on_evict = on_evict
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def get(self, session_id: str) -> Session:
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                session = Session(session_id, self.max_turns, self.max_chars)
+            session.last_used = now
+            self._sessions[session_id] = session
+            # Oldest first: stop at the first session that is neither expired nor over the bound
+            while self._sessions:
+                oldest_id, oldest = next(iter(self._sessions.items()))
+                if len(self._sessions) <= self.max_sessions and now - oldest.last_used <= self.ttl_s:
+                    break
+                del self._sessions[oldest_id]
+                evicted.append(oldest_id)
+        self._evicted(evicted)
+        return session
+
+    def end(self, session_id: str) -> bool:
+        """Forget a session (call finished). Returns True if it existed."""
+        with self._lock:
+            found = self._sessions.pop(session_id, None) is not None
+        if found:
+            self._evicted([session_id])
+        return found
+
+    def standalone(self, session: Session, query: str) -> str:
+        return session.standalone(query) if self.rewrite else query
+
+    def _evicted(self, session_ids: list[str]) -> None:
+        if not session_ids:
+            return
+        metrics.incr("sessions.evicted", len(session_ids))
+        if self.on_evict is not None:
+            for session_id in session_ids:
+                self.on_evict(session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions, "ttl_s": self.ttl_s}
@@ -1,12 +1,31 @@
 """Tier 1: Dataset similarity layer. Return stored response if query matches Alpaca samples."""
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
+import numpy as np
+
+from src import metrics
+from src.answer_store import AnswerStore, build_answer_store
+from src.artifacts import read_manifest, write_manifest
 from src.config import PROJECT_ROOT, load_config
+from src.dataset_io import dataset_files, dataset_stamp, iter_batches, iter_samples
+from src.embeddings import ParallelEncoder, get_embedder, parallel_encoder
+from src.index_versions import LiveSnapshot, build_lock, current_path, new_version, prune, publish
 from src.logging_config import get_logger
+from src.rerank import GrayZoneReranker
+from src.vector_index import VectorIndex, check_threshold_backend, create_index, open_index
 
 logger = get_logger(__name__)
 
+_QUERY_CACHE_SIZE = 256
+_CHECKPOINT_NAME = "checkpoint.json"
+_ANSWERS_DIR = "answers"
+
 
 def _text_for_embedding(instruction: str, input_text: str) -> str:
     if (input_text or "").strip():
@@ -14,6 +33,19 @@ def _text_for_embedding(instruction: str, input_text: str) -> str:
     return instruction.strip()
 
 
+@dataclass
+class _Snapshot:
+    """One index version; its vector ids index its own answer store, so the two are always used together."""
+
+    version: str | None
+    path: Path
+    index: VectorIndex
+    store: AnswerStore
+
+    def close(self) -> None:
+        self.store.close()
+
+
 class DatasetSimilarity:
     """Match user query to Alpaca dataset via embeddings; return stored output if above threshold."""
 
@@ -23,7 +55,7 @@ class DatasetSimilarity:
         index_path: Path | None = None,
         embedding_model: str | None = None,
         threshold: float | None = None,
-        top_k: int = 1,
+        top_k: int | None = None,
     ):
         cfg = load_config()
         sim = cfg.get("similarity", {})
@@ -34,105 +66,268 @@ class DatasetSimilarity:
         if not self.index_path.is_absolute():
             self.index_path = PROJECT_ROOT / self.index_path
         self.embedding_model_name = embedding_model or sim.get("embedding_model", "all-MiniLM-L6-v2")
+        self.index_backend = sim.get("index_backend", "chroma")
+        self.index_params = dict(sim.get("index_params", {}).get(self.index_backend, {}))
+        check_threshold_backend(self.index_backend, self.index_params)
         self.threshold = threshold if threshold is not None else float(sim.get("threshold", 0.88))
-        self.top_k = top_k or sim.get("top_k", 1)
+        self.top_k = top_k or int(sim.get("top_k", 5))
+        self.build_batch_size = int(sim.get("build_batch_size", 1024))
+        self.answer_cache_size = int(sim.get("answer_cache_size", 1024))
+        self.gray_zone = GrayZoneReranker(sim.get("gray_zone", {}))
+        self.keep_versions = int(cfg.get("reload", {}).get("keep_versions", 3))
         self._model = None
-        self._index = None
-        self._samples = None
-
-    def _load_dataset(self) -> list[dict] | None:
-        if self._samples is not None:
-            return self._samples
-        if not self.dataset_path.exists():
-            logger.error("Dataset not found: %s. Run scripts/build_dataset.py and scripts/build_index.py", self.dataset_path)
+        self._live: LiveSnapshot[_Snapshot] = LiveSnapshot(_Snapshot.close)
+        self._load_lock = threading.Lock()
+        self._query_cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _open_snapshot(self, version: str | None, path: Path) -> _Snapshot | None:
+        """Answer store and index of one version directory, or None if either is missing or they disagree."""
+        store = AnswerStore(path / _ANSWERS_DIR, self.answer_cache_size)
+        if not store.count:
             return None
-        try:
-            import json
-            with open(self.dataset_path, "r", encoding="utf-8") as f:
-                self._samples = json.load(f)
-            if not self._samples:
-                logger.warning("Dataset is empty")
+        index = open_index(self.index_backend, self._backend_path(path), self.index_params)
+        if index is None or len(index) != store.count:
+            store.close()
+            return None
+        return _Snapshot(version, path, index, store)
+
+    def _is_fresh(self, snap: _Snapshot | None) -> bool:
+        return snap is not None and snap.store.manifest.get("dataset") == dataset_stamp(self.dataset_path)
+
+    def _current(self) -> _Snapshot | None:
+        """
+        The snapshot requests read. Opened on first use from the published version, building one if
+        there is none or the dataset files changed since it was written.
+        """
+        snap = self._live.get()
+        if snap is not None:
+            return snap
+        with self._load_lock:
+            if self._live.get() is not None:
+                return self._live.get()
+            if not dataset_files(self.dataset_path):
+                logger.error("Dataset not found: %s. Run scripts/build_dataset.py and scripts/build_index.py", self.dataset_path)
                 return None
-            logger.info("Loaded %s dataset samples", len(self._samples))
-            return self._samples
-        except Exception as e:
-            logger.exception("Failed to load dataset: %s", e)
+            try:
+                snap = self._open_snapshot(*current_path(self.index_path))
+                if not self._is_fresh(snap) and self.build() is not None:
+                    built = self._open_snapshot(*current_path(self.index_path))
+                    if built is not None:
+                        if snap is not None:
+                            snap.close()
+                        snap = built
+            except Exception as e:
+                logger.exception("Failed to load dataset index: %s", e)
+                return None
+            if snap is None:
+                return None
+            self._live.swap(snap)
+            logger.info("Loaded %s dataset samples (index version %s)", snap.store.count, snap.version or "unversioned")
+            return snap
+
+    def _reading(self):
+        """Hold the served snapshot (opened on first use) for one request: a reload does not close it underneath."""
+        self._current()
+        return self._live.reading()
+
+    @property
+    def version(self) -> str | None:
+        """Index version being served (None before first use or for an unversioned index)."""
+        snap = self._live.get()
+        return snap.version if snap is not None else None
+
+    def needs_build(self) -> bool:
+        """True if the published version is missing or older than the dataset files (reads manifests only)."""
+        _, path = current_path(self.index_path)
+        manifest = read_manifest(path / _ANSWERS_DIR) or {}
+        return manifest.get("dataset") != dataset_stamp(self.dataset_path)
+
+    def build(self, force: bool = False, workers: int | None = None) -> str | None:
+        """
+        Build the answer store and index for the current dataset into a new version directory and
+        publish it. Serving processes keep their snapshot until reload(). Returns the published
+        version, or None if the dataset is missing or another build holds the lock.
+        """
+        if not dataset_files(self.dataset_path):
+            logger.error("Dataset not found: %s", self.dataset_path)
             return None
+        with build_lock(self.index_path) as locked:
+            if not locked:
+                logger.info("Dataset index build already running for %s", self.index_path)
+                return None
+            version, path = current_path(self.index_path)
+            # An unversioned (legacy) index is always rebuilt into a version
+            published = self._open_snapshot(version, path) if not force and version is not None else None
+            if published is not None:
+                published.close()  # only its manifest is needed
+            if self._is_fresh(published):
+                logger.info("Dataset index %s is up to date", version)
+                return version
+            version, path = new_version(self.index_path)
+            try:
+                self._build_into(path, workers)
+            except BaseException:
+                shutil.rmtree(path, ignore_errors=True)
+                raise
+            publish(self.index_path, version)
+            prune(self.index_path, self.keep_versions, in_use=[self.version])
+            logger.info("Published dataset index version %s", version)
+            return version
+
+    def _build_into(self, path: Path, workers: int | None) -> None:
+        stamp = dataset_stamp(self.dataset_path)
+        count = build_answer_store(
+            iter_samples(self.dataset_path),
+            path / _ANSWERS_DIR,
+            {"output": lambda s: s["output"], "text": lambda s: _text_for_embedding(s["instruction"], s.get("input", ""))},
+            stamp=stamp,
+        )
+        if not count:
+            raise ValueError(f"Dataset is empty: {self.dataset_path}")
+        build_dir = self.index_path.with_name(f"{self.index_path.name}.build") / self.index_backend
+        start = time.perf_counter()
+        index = create_index(self.index_backend, self._backend_path(path), self.index_params)
+        with parallel_encoder(self.embedding_model_name, workers=workers) as encoder:
+            for emb in self._embed_batches(build_dir, encoder):
+                index.add(emb)
+                logger.info("Indexed %d vectors (%.0f/s)", len(index), len(index) / max(time.perf_counter() - start, 1e-9))
+        index.save()
+        shutil.rmtree(build_dir, ignore_errors=True)
+        logger.info("Built %s similarity index with %s vectors", self.index_backend, len(index))
+
+    def reload(self) -> bool:
+        """
+        Switch to the published version if it differs from the one being served. The new snapshot is
+        opened and warmed (index and answer pages touched) before the swap; requests already holding
+        the old one finish on it, and the last of them closes it. Returns True if it switched.
+        """
+        version, path = current_path(self.index_path)
+        old = self._live.get()
+        if old is not None and old.version == version:
+            return False
+        snap = self._open_snapshot(version, path)
+        if snap is None:
+            logger.warning("Dataset index version %s is incomplete; keeping %s", version, old.version if old else None)
+            return False
+        self._warm(snap)
+        self._live.swap(snap)
+        logger.info("Switched dataset index to version %s (%s samples)", version, snap.store.count)
+        return True
+
+    def _warm(self, snap: _Snapshot) -> None:
+        q_emb = self._encode("what is the interest rate")
+        ids, _ = snap.index.search(q_emb, min(self.top_k, snap.store.count))
+        for i in ids[0]:
+            if i >= 0:
+                snap.store.output(int(i))
 
     def _get_embedder(self):
         if self._model is not None:
             return self._model
-        from sentence_transformers import SentenceTransformer
-        self._model = SentenceTransformer(self.embedding_model_name)
+        self._model = get_embedder(self.embedding_model_name)
         return self._model
 
-    def _build_index(self) -> bool:
-        """Build or load Chroma index for (instruction, input) texts. Returns True on success."""
-        try:
-            import chromadb
-            from chromadb.config import Settings
-        except ImportError:
-            raise ImportError("Install chromadb: pip install chromadb")
-        if self._load_dataset() is None:
-            return False
-        self.index_path.parent.mkdir(parents=True, exist_ok=True)
-        persist_dir = str(self.index_path)
-        client = chromadb.PersistentClient(path=persist_dir, settings=Settings(anonymized_telemetry=False))
-        collection_name = "bfsi_alpaca"
-        try:
-            coll = client.get_collection(collection_name)
-            if coll.count() == len(self._samples):
-                self._index = coll
-                self._client = client
-                logger.info("Loaded existing similarity index at %s", persist_dir)
-                return True
-        except Exception:
-            pass
-        embedder = self._get_embedder()
-        texts = [_text_for_embedding(s["instruction"], s.get("input", "")) for s in self._samples]
-        embeddings = embedder.encode(texts, show_progress_bar=len(texts) > 50)
-        ids = [str(i) for i in range(len(self._samples))]
-        try:
-            client.delete_collection(collection_name)
-        except Exception:
-            pass
-        coll = client.create_collection(collection_name, metadata={"hnsw:space": "cosine"})
-        coll.add(ids=ids, embeddings=embeddings.tolist(), documents=texts)
-        self._index = coll
-        self._client = client
-        logger.info("Built similarity index with %s vectors", len(ids))
-        return True
+    def _backend_path(self, root: Path) -> Path:
+        # Chroma sits at the root of a version (the historical layout); file-based backends get a subdirectory each
+        return root if self.index_backend == "chroma" else root / self.index_backend
+
+    def _embed_batches(self, build_dir: Path, encoder: ParallelEncoder) -> Iterator[np.ndarray]:
+        """
+        Stream the dataset and embed it in build_batch_size batches, checkpointing each batch to
+        build_dir. A rerun after an interruption reuses the saved batches (same dataset files, model
+        and batch size), so only the missing ones are encoded.
+        """
+        state = {"dataset": dataset_stamp(self.dataset_path), "embedding_model": self.embedding_model_name, "batch_size": self.build_batch_size}
+        if read_manifest(build_dir, _CHECKPOINT_NAME) != state:
+            shutil.rmtree(build_dir, ignore_errors=True)
+        build_dir.mkdir(parents=True, exist_ok=True)
+        write_manifest(build_dir, state, _CHECKPOINT_NAME)
+        texts = (_text_for_embedding(s["instruction"], s.get("input", "")) for s in iter_samples(self.dataset_path))
+        for i, batch in enumerate(iter_batches(texts, self.build_batch_size)):
+            part = build_dir / f"emb-{i:06d}.npy"
+            if part.exists():
+                yield np.load(part)
+                continue
+            emb = np.asarray(encoder.encode(batch), dtype=np.float32)
+            tmp = part.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, emb)
+            tmp.replace(part)
+            yield emb
+
+    def _encode(self, text: str):
+        """Embed one query, memoising recent ones (the same query is often searched twice per request)."""
+        with self._cache_lock:
+            vec = self._query_cache.get(text)
+            if vec is not None:
+                self._query_cache.move_to_end(text)
+                return vec
+        vec = self._get_embedder().encode([text])
+        with self._cache_lock:
+            self._query_cache[text] = vec
+            if len(self._query_cache) > _QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return vec
+
+    def search(self, user_query: str, n_results: int | None = None, snap: _Snapshot | None = None) -> list[tuple[int, float]]:
+        """Return up to n_results (sample index, cosine similarity) pairs, best first. Raises on index errors."""
+        if snap is None:
+            with self._reading() as snap:
+                return self.search(user_query, n_results, snap) if snap is not None else []
+        q_emb = self._encode(user_query.strip())
+        ids, sims = snap.index.search(q_emb, min(n_results or self.top_k, snap.store.count))
+        return [(int(i), max(0.0, float(d))) for i, d in zip(ids[0], sims[0]) if i >= 0]
 
     def query(self, user_query: str) -> tuple[str | None, float | None]:
         """
-        Return (stored_output, score) if best match >= threshold; else (None, best_score).
+        Return (stored_output, score) if best match >= threshold, or if it is in the gray zone just
+        below it and the re-ranker accepts one of the top-k candidates; else (None, best_score).
         On any failure returns (None, None).
         """
         if not user_query or not user_query.strip():
             return None, None
         try:
-            if self._load_dataset() is None:
-                return None, None
-            if not self._build_index():
-                return None, None
-            embedder = self._get_embedder()
-            q_emb = embedder.encode([user_query.strip()])
-            results = self._index.query(
-                query_embeddings=q_emb.tolist(),
-                n_results=min(self.top_k, len(self._samples)),
-                include=["documents", "distances"],
-            )
-            if not results["ids"] or not results["ids"][0]:
-                return None, None
-            dist = results["distances"][0][0]
-            similarity = max(0.0, 1.0 - float(dist))
-            idx = int(results["ids"][0][0])
-            if similarity >= self.threshold:
-                output = self._samples[idx]["output"]
-                logger.info("Tier 1 match: similarity=%.3f", similarity)
-                return output, similarity
+            # One snapshot per query: ids from its index are only valid against its answer store
+            with self._reading() as snap:
+                hits = self.search(user_query, snap=snap) if snap is not None else []
+                if not hits:
+                    return None, None
+                idx, similarity = hits[0]
+                if similarity >= self.threshold:
+                    output = snap.store.output(idx)
+                    logger.info("Tier 1 match: similarity=%.3f", similarity)
+                    return output, similarity
+                if self.gray_zone.in_zone(similarity, self.threshold):
+                    metrics.incr("tier1.gray_zone")
+                    candidates = [(snap.store.text(i), sim, snap.store.output(i)) for i, sim in hits]
+                    chosen = self.gray_zone.pick(user_query, candidates)
+                    if chosen is not None:
+                        # Each accepted gray-zone match is one SLM (or RAG + SLM) call not made
+                        metrics.incr("tier1.gray_zone_accepted")
+                        _, score, output = candidates[chosen]
+                        logger.info("Tier 1 gray-zone match: similarity=%.3f (rank %d)", score, chosen + 1)
+                        return output, score
             logger.info("Tier 1 no match: best similarity=%.3f (threshold=%.2f)", similarity, self.threshold)
             return None, similarity
         except Exception as e:
             logger.exception("Similarity query failed: %s", e)
             return None, None
+
+    def candidates(self, user_query: str, n_results: int) -> list[tuple[str, float]]:
+        """Top stored outputs with their scores regardless of threshold. Empty on failure."""
+        if not user_query or not user_query.strip():
+            return []
+        try:
+            with self._reading() as snap:
+                if snap is None:
+                    return []
+                return [(snap.store.output(idx), sim) for idx, sim in self.search(user_query, n_results, snap=snap)]
+        except Exception as e:
+            logger.exception("Similarity candidates failed: %s", e)
+            return []
+
+    def nearest(self, user_query: str) -> tuple[str | None, float | None]:
+        """Best stored output and its score regardless of threshold (used for degraded fallbacks)."""
+        hits = self.candidates(user_query, 1)
+        return hits[0] if hits else (None, None)
@@ -1,9 +1,19 @@
-"""Tier 2: Small language model inference. Optional LoRA adapters."""
+"""Tier 2: Small language model inference. Optional LoRA adapters (one merged, or several named) or a pre-merged checkpoint."""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 
+from src.artifacts import read_manifest, sha256_file
 from src.config import PROJECT_ROOT, load_config
+from src.cpu_profile import apply_threads, apply_to_model
+from src.deadline import Deadline
 from src.logging_config import get_logger
+from src import metrics
 
 logger = get_logger(__name__)
 
@@ -27,6 +37,81 @@ def _alpaca_prompt(instruction: str, input_text: str = "", context: str = "") ->
     )
 
 
+def _turn_prompt(instruction: str, input_text: str = "", context: str = "") -> str:
+    """A later turn of a session prompt, appended after the previous reply."""
+    ctx = f"### Context:\n{context}\n\n" if context else ""
+    return f"\n\n{ctx}### Instruction:\n{instruction}\n\n### Input:\n{input_text or 'N/A'}\n\n### Response:\n"
+
+
+def _session_prompt(history: list[tuple[str, str]], instruction: str, input_text: str = "", context: str = "") -> str:
+    """Earlier (query, reply) turns, then this one; the first turn carries the instruction preamble."""
+    if not history:
+        return _alpaca_prompt(instruction, input_text, context)
+    (first_q, first_a), rest = history[0], history[1:]
+    text = _alpaca_prompt(first_q) + first_a
+    for q, a in rest:
+        text += _turn_prompt(q) + a
+    return text + _turn_prompt(instruction, input_text, context)
+
+
+@dataclass
+class _SessionKV:
+    """KV cache of one session's conversation: ids are its tokens, the cache covers all or all but the last."""
+
+    ids: list[int]
+    cache: object
+    adapter: str | None
+    last_query: str  # the turn it ends with; later turns answered elsewhere (Tier 1) are added as text
+    last_used: float
+
+
+class _DeadlineCriteria:
+    """Stopping criterion: end decoding once the request deadline has passed (marks deadline.hit)."""
+
+    def __init__(self, deadline: Deadline):
+        self.deadline = deadline
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        if self.deadline.expired():
+            self.deadline.hit = True
+            return True
+        return False
+
+
+class _StopSequenceCriteria:
+    """Stopping criterion: end decoding as soon as the generated text contains any stop string."""
+
+    def __init__(self, tokenizer, prompt_len: int, stops: list[str]):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.stops = stops
+        # Only the last few tokens can complete a stop string; decode just that window each step
+        self.window = max(len(tokenizer.encode(s, add_special_tokens=False)) for s in stops) + 2
+        self.hit = False
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        generated = input_ids[0, self.prompt_len:]
+        tail = self.tokenizer.decode(generated[-self.window:], skip_special_tokens=True)
+        if any(s in tail for s in self.stops):
+            self.hit = True
+            return True
+        return False
+
+
+def _cut_at_stop(text: str, stops: list[str]) -> str:
+    """Drop everything from the first stop string on."""
+    cuts = [i for i in (text.find(s) for s in stops) if i >= 0]
+    return text[: min(cuts)] if cuts else text
+
+
+def _trim_partial(text: str) -> str:
+    """Cut a decode that was stopped mid-way back to its last complete sentence."""
+    cut = max(text.rfind(". "), text.rfind("? "), text.rfind("! "), text.rfind("\n"))
+    if text.endswith((".", "?", "!")):
+        return text
+    return text[: cut + 1].rstrip() if cut > 0 else ""
+
+
 class SLMInference:
     """Load base model (and optional PEFT adapters) and generate responses."""
 
@@ -35,8 +120,10 @@ class SLMInference:
         base_model_name: str | None = None,
         adapter_path: Path | str | None = None,
         use_4bit: bool | None = None,
-        max_new_tokens: int = 256,
-        temperature: float = 0.3,
+        max_new_tokens: int | None = None,
+        temperature: float | None = None,
+        stop_sequences: list[str] | None = None,
+        cpu_profile: dict | None = None,
     ):
         cfg = load_config()
         slm_cfg = cfg.get("slm", {})
@@ -45,66 +132,509 @@ class SLMInference:
         self.adapter_path = Path(adapter) if adapter else None
         if self.adapter_path and not self.adapter_path.is_absolute():
             self.adapter_path = PROJECT_ROOT / self.adapter_path
+        # Named LoRA adapters kept unmerged on one resident base model, chosen per request (slm.adapters)
+        self.adapters = slm_cfg.get("adapters", {})
+        self.adapter_paths: dict[str, Path] = {}
+        if self.adapters.get("enabled", False):
+            for name, path in (self.adapters.get("paths") or {}).items():
+                path = Path(path)
+                self.adapter_paths[name] = path if path.is_absolute() else PROJECT_ROOT / path
+        self.default_adapter = self.adapters.get("default")
+        self._adapter_names: set[str] = set()  # adapters actually loaded
+        # set_adapter is model-wide: calls on the active adapter run together, a switch waits for them to finish
+        self._adapter_cond = threading.Condition()
+        self._active_adapter: str | None = None
+        self._adapter_users = 0
+        self._adapter_waiting = 0
+        # KV cache per session kept between turns, so a follow-up prefills only its own text (sessions.kv_cache)
+        kv_cfg = cfg.get("sessions", {}).get("kv_cache", {})
+        self.session_kv_enabled = bool(kv_cfg.get("enabled", True))
+        self.session_kv_max_sessions = int(kv_cfg.get("max_sessions", 8))
+        self.session_kv_idle_s = float(kv_cfg.get("idle_s", 300))
+        self.session_max_tokens = int(kv_cfg.get("max_tokens", 1536))
+        self._session_kv: OrderedDict[str, _SessionKV] = OrderedDict()
+        self._session_kv_lock = threading.Lock()
+        # Pre-merged checkpoint (scripts/export_merged.py); used instead of base + adapter when its manifest exists
+        merged = slm_cfg.get("merged_path")
+        self.merged_path = Path(merged) if merged else None
+        if self.merged_path and not self.merged_path.is_absolute():
+            self.merged_path = PROJECT_ROOT / self.merged_path
         self.use_4bit = use_4bit if use_4bit is not None else slm_cfg.get("use_4bit", False)
         self.max_new_tokens = max_new_tokens or slm_cfg.get("max_new_tokens", 256)
         self.temperature = temperature if temperature is not None else slm_cfg.get("temperature", 0.3)
+        # Per-tier decode budgets: plain answers are short, RAG answers restate context and need more room
+        self.max_new_tokens_by_tier = slm_cfg.get("max_new_tokens_by_tier", {})
+        self.stop_sequences = stop_sequences if stop_sequences is not None else slm_cfg.get("stop_sequences", ["###"])
+        # Assisted decoding: "off", "lookup" (n-gram drafts from prompt + Tier 1 answers) or "draft" (small draft model)
+        self.assisted = slm_cfg.get("assisted", {})
+        self.assisted_mode = self.assisted.get("mode", "off")
+        self._draft_model = None
+        # Continuous batching: concurrent generate() calls share one decode loop (src/batching.py)
+        self.batching = slm_cfg.get("batching", {})
+        self._engine = None
+        self._engine_lock = threading.Lock()
+        # Threads / dtype / static cache / torch.compile (src/cpu_profile.py)
+        self.cpu_profile = cpu_profile if cpu_profile is not None else slm_cfg.get("cpu_profile", {})
         self._model = None
         self._tokenizer = None
+        # Set only after _finish_load, so a concurrent caller never sees a half-initialised model
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def _quantization_kwargs(self) -> dict:
+        if not self.use_4bit:
+            return {}
+        try:
+            import bitsandbytes  # noqa: F401
+            import torch
+            from transformers import BitsAndBytesConfig
+            return {
+                "quantization_config": BitsAndBytesConfig(
+                    load_in_4bit=True,
+                    bnb_4bit_compute_dtype=torch.float16,
+                    bnb_4bit_use_double_quant=True,
+                    bnb_4bit_quant_type="nf4",
+                )
+            }
+        except ImportError:
+            logger.warning("bitsandbytes not available; loading in full precision")
+            return {}
+
+    def _load_merged(self, manifest: dict) -> None:
+        """Load a pre-merged checkpoint from scripts/export_merged.py; PEFT is never imported."""
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        logger.info(
+            "Loading merged SLM %s (base=%s, adapter=%s, dataset=%s, dtype=%s)",
+            self.merged_path,
+            manifest.get("base_model"),
+            manifest.get("adapter_version"),
+            str(manifest.get("dataset_sha256", ""))[:12],
+            manifest.get("dtype"),
+        )
+        self._tokenizer = AutoTokenizer.from_pretrained(str(self.merged_path), trust_remote_code=True)
+        model_kwargs = {"trust_remote_code": True, "low_cpu_mem_usage": True}
+        model_kwargs.update(self._quantization_kwargs())
+        if "quantization_config" not in model_kwargs and manifest.get("dtype"):
+            model_kwargs["torch_dtype"] = getattr(torch, manifest["dtype"])
+        self._model = AutoModelForCausalLM.from_pretrained(str(self.merged_path), **model_kwargs)
+
+    def _merged_is_current(self, manifest: dict) -> bool:
+        """
+        True if the merged checkpoint was exported from the configured base model and adapter. A stale
+        one (adapter retrained or repointed, base model changed) is skipped with a warning.
+        """
+        stale = []
+        if manifest.get("base_model") != self.base_model_name:
+            stale.append(f"base_model {manifest.get('base_model')!r} != {self.base_model_name!r}")
+        if self.adapter_path is not None:
+            exported = Path(manifest.get("adapter_path") or "")
+            if not exported.is_absolute():
+                exported = PROJECT_ROOT / exported
+            if exported.resolve() != self.adapter_path.resolve():
+                stale.append(f"adapter_path {manifest.get('adapter_path')!r} != {str(self.adapter_path)!r}")
+            else:
+                files = sorted(self.adapter_path.glob("adapter_model.*"))
+                if files and manifest.get("adapter_sha256") and sha256_file(files[0]) != manifest["adapter_sha256"]:
+                    stale.append(f"adapter {files[0].name} changed since export")
+        if stale:
+            logger.warning(
+                "Ignoring merged checkpoint %s (%s); loading base + adapter. Re-run scripts/export_merged.py",
+                self.merged_path,
+                "; ".join(stale),
+            )
+            metrics.incr("slm.merged_stale")
+        return not stale
+
+    def _finish_load(self) -> None:
+        self._model.eval()
+        if self.cpu_profile:
+            quantized = bool(getattr(self._model, "is_quantized", False))
+            self._model = apply_to_model(self._model, self._tokenizer, self.cpu_profile, quantized=quantized)
 
     def _load_model(self) -> bool:
-        """Load model and tokenizer. Returns True on success, False on failure."""
-        if self._model is not None:
+        """Load model and tokenizer once, even when many threads ask at the same time. Returns True on success."""
+        if self._loaded:
             return True
+        with self._load_lock:
+            if self._loaded:
+                return True
+            try:
+                apply_threads(self.cpu_profile)
+                # A merged checkpoint has one adapter baked in; named adapters need the unmerged base
+                manifest = read_manifest(self.merged_path) if self.merged_path and not self.adapter_paths else None
+                if manifest is not None and self._merged_is_current(manifest):
+                    self._load_merged(manifest)
+                    self._finish_load()
+                    self._loaded = True
+                    return True
+
+                from transformers import AutoModelForCausalLM, AutoTokenizer
+
+                logger.info("Loading tokenizer: %s", self.base_model_name)
+                self._tokenizer = AutoTokenizer.from_pretrained(
+                    self.base_model_name, trust_remote_code=True
+                )
+                model_kwargs = {"trust_remote_code": True}
+                model_kwargs.update(self._quantization_kwargs())
+                use_4bit = "quantization_config" in model_kwargs
+                logger.info("Loading model: %s (4bit=%s)", self.base_model_name, use_4bit)
+                self._model = AutoModelForCausalLM.from_pretrained(
+                    self.base_model_name, **model_kwargs
+                )
+                if self.adapter_paths:
+                    self._load_adapters()
+                elif self.adapter_path and self.adapter_path.exists():
+                    try:
+                        from peft import PeftModel
+                        self._model = PeftModel.from_pretrained(
+                            self._model, str(self.adapter_path)
+                        )
+                        self._model = self._model.merge_and_unload()
+                        logger.info("Loaded PEFT adapters from %s", self.adapter_path)
+                    except Exception as e:
+                        logger.warning("Could not load adapters from %s: %s", self.adapter_path, e)
+                self._finish_load()
+                self._loaded = True
+                return True
+            except Exception as e:
+                logger.exception("Failed to load SLM: %s", e)
+                return False
+
+    def _load_adapters(self) -> None:
+        """
+        Attach every slm.adapters.paths entry to the base model under its name, unmerged. Each adapter
+        adds only its LoRA matrices; the base weights stay shared. Adapters that fail to load are
+        skipped (requests routed to them use the default adapter).
+        """
+        from peft import PeftModel
+
+        model = None
+        for name, path in self.adapter_paths.items():
+            if not path.exists():
+                logger.warning("Adapter %s not found at %s; skipping", name, path)
+                continue
+            try:
+                if model is None:
+                    model = PeftModel.from_pretrained(self._model, str(path), adapter_name=name)
+                else:
+                    model.load_adapter(str(path), adapter_name=name)
+                self._adapter_names.add(name)
+                logger.info("Loaded PEFT adapter %s from %s", name, path)
+            except Exception as e:
+                logger.warning("Could not load adapter %s from %s: %s", name, path, e)
+        if model is not None:
+            self._model = model
+
+    def route_adapter(self, query: str, requested: str | None = None) -> str | None:
+        """
+        Adapter for a request: the requested one if configured, else the first slm.adapters.routes entry
+        whose keywords occur in the query, else the default. An slm.adapters.ab split then picks a variant
+        of that adapter, stably per query, so repeats of a question get the same variant. None when
+        named adapters are off.
+        """
+        if not self.adapter_paths:
+            return None
+        if requested in self.adapter_paths:
+            name = requested
+        else:
+            if requested:
+                logger.warning("Unknown adapter %s requested; routing instead", requested)
+            q = (query or "").lower()
+            name = next(
+                (route for route, keywords in (self.adapters.get("routes") or {}).items() if any(k in q for k in keywords)),
+                self.default_adapter,
+            )
+            split = (self.adapters.get("ab") or {}).get(name)
+            if split:
+                point = int.from_bytes(hashlib.sha1(q.encode("utf-8")).digest()[:8], "big") / 2**64 * sum(split.values())
+                for variant, weight in split.items():
+                    point -= weight
+                    if point < 0:
+                        name = variant
+                        break
+        return name if name in self.adapter_paths else self.default_adapter
+
+    def _resolve_adapter(self, adapter: str | None) -> str | None:
+        """A loaded adapter name for this call ("__base__" = base weights), or None without named adapters."""
+        if not self._adapter_names:
+            return None
+        if adapter in self._adapter_names:
+            return adapter
+        return self.default_adapter if self.default_adapter in self._adapter_names else "__base__"
+
+    @contextmanager
+    def _use_adapter(self, name: str | None):
+        """
+        Hold the model on adapter name for one decode. Switching is a flag flip on the LoRA layers (no
+        weights move), but it is model-wide, so it waits until calls on the current adapter finish; new
+        calls on the current adapter queue behind a waiting switch so it is not starved.
+        """
+        if name is None:
+            yield
+            return
+        with self._adapter_cond:
+            waiting = False
+            while True:
+                if self._active_adapter == name and (waiting or not self._adapter_waiting):
+                    break
+                if self._adapter_users == 0:
+                    if self._active_adapter != name:
+                        if name == "__base__":
+                            self._model.base_model.disable_adapter_layers()
+                        else:
+                            if self._active_adapter == "__base__":
+                                self._model.base_model.enable_adapter_layers()
+                            self._model.set_adapter(name)
+                        self._active_adapter = name
+                        metrics.incr("slm.adapter.switches")
+                    break
+                if not waiting:
+                    waiting = True
+                    self._adapter_waiting += 1
+                self._adapter_cond.wait()
+            if waiting:
+                self._adapter_waiting -= 1
+            self._adapter_users += 1
         try:
-            import torch
-            from transformers import AutoModelForCausalLM, AutoTokenizer
+            yield
+        finally:
+            with self._adapter_cond:
+                self._adapter_users -= 1
+                self._adapter_cond.notify_all()
+
+    def drop_session(self, session_id: str) -> None:
+        """Free a session's KV cache (session ended or evicted)."""
+        with self._session_kv_lock:
+            self._session_kv.pop(session_id, None)
+
+    def _take_session_kv(self, session_id: str) -> _SessionKV | None:
+        """Remove and return the session's cache: one turn at a time owns it, a concurrent turn prefills in full."""
+        now = time.monotonic()
+        with self._session_kv_lock:
+            for sid in [sid for sid, e in self._session_kv.items() if now - e.last_used > self.session_kv_idle_s]:
+                del self._session_kv[sid]
+                metrics.incr("sessions.kv_expired")
+            return self._session_kv.pop(session_id, None)
+
+    def _keep_session_kv(self, session_id: str, entry: _SessionKV) -> None:
+        with self._session_kv_lock:
+            self._session_kv.pop(session_id, None)
+            self._session_kv[session_id] = entry
+            while len(self._session_kv) > self.session_kv_max_sessions:
+                self._session_kv.popitem(last=False)
+                metrics.incr("sessions.kv_evicted")
 
-            logger.info("Loading tokenizer: %s", self.base_model_name)
-            self._tokenizer = AutoTokenizer.from_pretrained(
-                self.base_model_name, trust_remote_code=True
+    def _uses_session_kv(self) -> bool:
+        # Batched and assisted decoding manage their own caches; a static cache cannot be carried over
+        return (
+            self.session_kv_enabled
+            and not self.batching.get("enabled", False)
+            and self.assisted_mode == "off"
+            and not self.cpu_profile.get("static_cache", False)
+        )
+
+    def _session_inputs(
+        self,
+        session_id: str | None,
+        history: list[tuple[str, str]],
+        instruction: str,
+        input_text: str,
+        context: str,
+        adapter: str | None,
+        max_new_tokens: int,
+    ) -> tuple[list[int], _SessionKV | None]:
+        """
+        Token ids of a session turn and the cache they extend. With the session's cache only this
+        turn's text (plus turns answered without the SLM since) is new; otherwise the prompt is built
+        from as many recent turns as fit in sessions.kv_cache.max_tokens.
+        """
+        budget = self.session_max_tokens - max_new_tokens
+        entry = self._take_session_kv(session_id) if session_id and self._uses_session_kv() else None
+        if entry is not None:
+            queries = [q for q, _ in history]
+            since = len(queries) - 1 - queries[::-1].index(entry.last_query) if entry.last_query in queries else None
+            if since is not None and entry.adapter == self._resolve_adapter(adapter):
+                text = "".join(_turn_prompt(q) + a for q, a in history[since + 1:])
+                new = self._tokenizer.encode(text + _turn_prompt(instruction, input_text, context), add_special_tokens=False)
+                if len(entry.ids) + len(new) <= budget:
+                    metrics.incr("sessions.kv_hits")
+                    metrics.incr("sessions.kv_reused_tokens", len(entry.ids))
+                    metrics.incr("sessions.prefill_tokens", len(new))
+                    return entry.ids + new, entry
+        if session_id and self._uses_session_kv():
+            metrics.incr("sessions.kv_misses")
+        for start in range(len(history) + 1):
+            ids = self._tokenizer.encode(_session_prompt(history[start:], instruction, input_text, context))
+            if len(ids) <= budget:
+                break
+        # Even alone this turn is too long: keep its end (the question), not the preamble
+        ids = ids[-max(budget, 1):]
+        metrics.incr("sessions.prefill_tokens", len(ids))
+        return ids, None
+
+    def _reply_length(self, new_ids: list[int], stops: list[str]) -> int:
+        """Generated tokens that belong to the reply: up to EOS or the first stop string (binary search on prefixes)."""
+        eos = self._tokenizer.eos_token_id
+        n = new_ids.index(eos) if eos in new_ids else len(new_ids)
+        if not stops:
+            return n
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if any(s in self._tokenizer.decode(new_ids[:mid], skip_special_tokens=True) for s in stops):
+                hi = mid - 1
+            else:
+                lo = mid
+        return lo
+
+    def _decode_session(self, inputs: dict, max_new_tokens: int, criteria, stops: list[str], adapter: str | None, session: tuple):
+        """Plain decoding that starts from the session's cache and keeps the extended cache for the next turn."""
+        import torch
+        session_id, entry, instruction = session
+        prompt_ids = inputs["input_ids"][0].tolist()
+        with self._use_adapter(adapter), torch.no_grad():
+            out = self._model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                temperature=self.temperature,
+                do_sample=self.temperature > 0,
+                pad_token_id=self._tokenizer.eos_token_id,
+                stopping_criteria=criteria,
+                return_dict_in_generate=True,
+                **({"past_key_values": entry.cache} if entry is not None else {}),
             )
-            model_kwargs = {"trust_remote_code": True}
-            use_4bit = self.use_4bit
-            if use_4bit:
-                try:
-                    import bitsandbytes  # noqa: F401
-                    from transformers import BitsAndBytesConfig
-                    model_kwargs["quantization_config"] = BitsAndBytesConfig(
-                        load_in_4bit=True,
-                        bnb_4bit_compute_dtype=torch.float16,
-                        bnb_4bit_use_double_quant=True,
-                        bnb_4bit_quant_type="nf4",
-                    )
-                except ImportError:
-                    logger.warning("bitsandbytes not available; loading in full precision")
-                    use_4bit = False
-            logger.info("Loading model: %s (4bit=%s)", self.base_model_name, use_4bit)
-            self._model = AutoModelForCausalLM.from_pretrained(
-                self.base_model_name, **model_kwargs
+        new_tokens = out.sequences[0][len(prompt_ids):]
+        kept = prompt_ids + new_tokens[: self._reply_length(new_tokens.tolist(), stops)].tolist()
+        cache = out.past_key_values
+        if cache is not None:
+            if cache.get_seq_length() > len(kept):
+                cache.crop(len(kept) - cache.get_seq_length())  # drop the stop string / EOS from the transcript
+            self._keep_session_kv(session_id, _SessionKV(kept, cache, adapter, instruction, time.monotonic()))
+        return new_tokens
+
+    def _load_draft_model(self):
+        """Draft model for assisted mode "draft" (must share the base tokenizer). None if unavailable."""
+        if self._draft_model is not None:
+            return self._draft_model
+        name = self.assisted.get("draft_model")
+        if not name:
+            return None
+        with self._load_lock:
+            if self._draft_model is not None or self.assisted_mode != "draft":
+                return self._draft_model
+            try:
+                from transformers import AutoModelForCausalLM
+                logger.info("Loading draft model: %s", name)
+                draft = AutoModelForCausalLM.from_pretrained(name, trust_remote_code=True)
+                draft.eval()
+                self._draft_model = draft
+            except Exception as e:
+                logger.warning("Could not load draft model %s: %s; decoding without it", name, e)
+                self.assisted_mode = "off"
+            return self._draft_model
+
+    def _get_engine(self):
+        """Continuous-batching engine over the loaded model (slm.batching.enabled)."""
+        with self._engine_lock:
+            if self._engine is None:
+                from src.batching import GenerationEngine
+                self._engine = GenerationEngine(
+                    self._model,
+                    self._tokenizer,
+                    max_batch_size=int(self.batching.get("max_batch_size", 8)),
+                    temperature=self.temperature,
+                    multi_adapter=bool(self._adapter_names),
+                )
+            return self._engine
+
+    def _decode(
+        self,
+        inputs: dict,
+        max_new_tokens: int,
+        criteria,
+        references: list[str] | None,
+        stops: list[str],
+        deadline: Deadline | None,
+        adapter: str | None = None,
+        session: tuple | None = None,
+    ):
+        """Run decoding for one prompt and return the new token ids (1-D tensor). session: (id, cache entry, query) to extend."""
+        import torch
+        prompt_len = inputs["input_ids"].shape[1]
+        adapter = self._resolve_adapter(adapter)
+        if adapter is not None:
+            metrics.incr(f"slm.adapter.{adapter}.generations")
+        if self.batching.get("enabled", False) and self.assisted_mode == "off":
+            # Join the shared batch; the engine applies stops and the deadline itself (and the adapter per row)
+            future = self._get_engine().submit(
+                inputs["input_ids"][0].tolist(), max_new_tokens, stops=stops, deadline=deadline, adapter=adapter
             )
-            if self.adapter_path and self.adapter_path.exists():
-                try:
-                    from peft import PeftModel
-                    self._model = PeftModel.from_pretrained(
-                        self._model, str(self.adapter_path)
-                    )
-                    self._model = self._model.merge_and_unload()
-                    logger.info("Loaded PEFT adapters from %s", self.adapter_path)
-                except Exception as e:
-                    logger.warning("Could not load adapters from %s: %s", self.adapter_path, e)
-            self._model.eval()
-            return True
-        except Exception as e:
-            logger.exception("Failed to load SLM: %s", e)
-            return False
+            return torch.tensor(future.result(), dtype=torch.long)
+        if session is not None:
+            return self._decode_session(inputs, max_new_tokens, criteria, stops, adapter, session)
+        with self._use_adapter(adapter):
+            return self._decode_unbatched(inputs, max_new_tokens, criteria, references, prompt_len)
+
+    def _decode_unbatched(self, inputs: dict, max_new_tokens: int, criteria, references: list[str] | None, prompt_len: int):
+        import torch
+        if self.assisted_mode == "lookup":
+            from src.assisted import lookup_generate
+            ref_ids = [self._tokenizer.encode(r, add_special_tokens=False) for r in references or []]
+            new_ids = lookup_generate(
+                self._model,
+                inputs["input_ids"],
+                max_new_tokens=max_new_tokens,
+                eos_token_id=self._tokenizer.eos_token_id,
+                references=ref_ids,
+                stopping_criteria=criteria,
+                num_draft_tokens=int(self.assisted.get("num_draft_tokens", 10)),
+                ngram_min=int(self.assisted.get("ngram_min", 2)),
+                ngram_max=int(self.assisted.get("ngram_max", 4)),
+            )
+            return torch.tensor(new_ids, dtype=torch.long)
+        gen_kwargs = {}
+        if self.assisted_mode == "draft":
+            draft = self._load_draft_model()
+            if draft is not None:
+                gen_kwargs["assistant_model"] = draft
+        with torch.no_grad():
+            out = self._model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                temperature=self.temperature,
+                do_sample=self.temperature > 0,
+                pad_token_id=self._tokenizer.eos_token_id,
+                stopping_criteria=criteria,
+                **gen_kwargs,
+            )
+        return out[0][prompt_len:]
 
     def generate(
         self,
         instruction: str,
         input_text: str = "",
         context: str = "",
+        deadline: Deadline | None = None,
+        max_new_tokens: int | None = None,
+        stop: list[str] | None = None,
+        references: list[str] | None = None,
+        adapter: str | None = None,
+        history: list[tuple[str, str]] | None = None,
+        session_id: str | None = None,
     ) -> str:
-        """Generate response for the given instruction (and optional input/context). Returns fallback message on failure."""
+        """
+        Generate response for the given instruction (and optional input/context). Returns fallback message on failure.
+        With a deadline, decoding stops when it expires and the partial reply is trimmed to its last full sentence
+        (empty if none); deadline.hit tells the caller this happened.
+        Decoding also stops at EOS or at the first stop sequence (config slm.stop_sequences unless `stop` is given),
+        and the reply is cut there. max_new_tokens defaults to slm.max_new_tokens_by_tier for "rag" or "slm".
+        references (e.g. nearest Tier 1 answers) seed the n-gram drafts when slm.assisted.mode is "lookup".
+        adapter names one of slm.adapters.paths (see route_adapter); ignored unless named adapters are on.
+        history holds a session's earlier (query, reply) turns; with session_id the session's KV cache is
+        reused and extended, so only text new since the last generation is prefilled.
+        """
         fallback = (
             "I could not generate a specific response for that. "
             "Please rephrase your question, or contact our customer care for detailed assistance."
@@ -112,29 +642,43 @@ class SLMInference:
         if not self._load_model():
             return fallback
         try:
-            prompt = _alpaca_prompt(instruction, input_text, context)
-            inputs = self._tokenizer(
-                prompt, return_tensors="pt", truncation=True, max_length=1024
-            )
+            import torch
+            from transformers import StoppingCriteriaList
+            if max_new_tokens is None:
+                tier = "rag" if context else "slm"
+                max_new_tokens = int(self.max_new_tokens_by_tier.get(tier, self.max_new_tokens))
+            session = None
+            if history or session_id:
+                ids, entry = self._session_inputs(session_id, history or [], instruction, input_text, context, adapter, max_new_tokens)
+                inputs = {"input_ids": torch.tensor([ids]), "attention_mask": torch.ones((1, len(ids)), dtype=torch.long)}
+                if session_id and self._uses_session_kv():
+                    session = (session_id, entry, instruction)
+            else:
+                prompt = _alpaca_prompt(instruction, input_text, context)
+                inputs = self._tokenizer(
+                    prompt, return_tensors="pt", truncation=True, max_length=1024
+                )
             device = (
                 self._model.device
                 if hasattr(self._model, "device")
                 else next(self._model.parameters()).device
             )
             inputs = {k: v.to(device) for k, v in inputs.items()}
-            import torch
-            with torch.no_grad():
-                out = self._model.generate(
-                    **inputs,
-                    max_new_tokens=self.max_new_tokens,
-                    temperature=self.temperature,
-                    do_sample=self.temperature > 0,
-                    pad_token_id=self._tokenizer.eos_token_id,
-                )
-            reply = self._tokenizer.decode(
-                out[0][inputs["input_ids"].shape[1]:], skip_special_tokens=True
-            )
-            text = reply.strip()
+            stops = [x for x in (stop if stop is not None else self.stop_sequences) if x]
+            prompt_len = inputs["input_ids"].shape[1]
+            criteria = StoppingCriteriaList()
+            if stops:
+                criteria.append(_StopSequenceCriteria(self._tokenizer, prompt_len, stops))
+            if deadline is not None and deadline.expires_at is not None:
+                criteria.append(_DeadlineCriteria(deadline))
+            new_tokens = self._decode(inputs, max_new_tokens, criteria, references, stops, deadline, adapter, session)
+            metrics.incr("slm.generations")
+            metrics.incr("slm.tokens_decoded", int(new_tokens.shape[0]))
+            reply = self._tokenizer.decode(new_tokens, skip_special_tokens=True)
+            text = _cut_at_stop(reply, stops).strip()
+            if deadline is not None and deadline.hit:
+                logger.info("SLM decode cut by deadline after %.2fs", deadline.elapsed())
+                return _trim_partial(text)
             return text if text else fallback
         except Exception as e:
             logger.exception("SLM generate failed: %s", e)
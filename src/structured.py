@@ -0,0 +1,268 @@
+"""
+Structured fast path: rate, tenure and charge tables parsed from knowledge/ into a (product, intent)
+lookup, and an intent/slot matcher that answers simple table questions with a citation and no model call.
+"""
+import json
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from src import metrics
+from src.config import load_config, PROJECT_ROOT
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+GENERAL = "general"
+
+# Product slot: canonical name -> patterns (section titles and queries)
+_PRODUCTS = {
+    "personal loan": r"personal loans?",
+    "home loan": r"(home|housing) loans?|mortgage",
+    "education loan": r"(education|student) loans?",
+    "savings account": r"savings? accounts?",
+}
+# Products the tables do not cover. A query naming one must not fall back to the general loan rows
+_OTHER_PRODUCTS = (
+    r"\b(cards?|credit|debit|atm|deposits?|fds?|rds?|overdraft|insurance|nre|nro)\b"
+    r"|\b(current|salary|demat|nri) accounts?"
+    r"|\b(car|auto|vehicle|two[- ]wheeler|bike|gold|business|property|msme) loans?"
+)
+
+# Intent of a table row, from its label (first match wins, so specific labels come before "rate")
+_LABEL_INTENTS = [
+    ("tenure", r"tenure"),
+    ("processing_fee", r"processing fee"),
+    ("late_payment", r"late payment"),
+    ("bounce", r"bounce"),
+    ("stop_payment", r"stop payment"),
+    ("min_balance", r"non-maintenance|minimum balance|zero-balance"),
+    ("rate", r"rate|floating|fixed"),
+]
+# Sections whose rows are keyed by product instead (label = product, intent from the title)
+_SECTION_INTENTS = [
+    ("prepayment_charges", r"(prepayment|foreclosure).*charges"),
+]
+# Intent of a query; a query matching more than one is compound and left to RAG
+_QUERY_INTENTS = [
+    ("processing_fee", r"processing (fee|charge)s?"),
+    ("prepayment_charges", r"(pre-?payment|fore-?clos\w*|pre-?closure).*(charge|fee|penalt)|(charge|fee|penalt)\w*.*(pre-?pay|fore-?clos)"),
+    ("late_payment", r"late (payment|emi|fee)|overdue"),
+    ("bounce", r"bounce|dishono"),
+    ("stop_payment", r"stop payment"),
+    ("min_balance", r"minimum balance|min balance|non-maintenance"),
+    ("tenure", r"tenure|repayment period"),
+    ("rate", r"interest rate|rate of interest|\broi\b|\brates?\b"),
+]
+# Questions these tables cannot answer: about the customer's own loan, or asking for a computation
+_OUT_OF_SCOPE = r"\b(my|mine|calculate|calculator|emi for|schedule|why|convert|compare|difference|vs|versus)\b"
+_TENURE = r"(\d+(?:\.\d+)?)\s*(years?|yrs?|months?|mos?)\b"
+
+
+@dataclass(frozen=True)
+class Fact:
+    product: str  # canonical product, or "general" for rows that apply to all loans
+    intent: str
+    label: str
+    value: str  # row text as written in the source table
+    source: str  # "file.md › Section title"
+    note: str = ""  # italic caveat under the section, if any
+    rate_range: tuple[float, float] | None = None  # % p.a., for rate rows with figures
+    tenure_months: tuple[int, int] | None = None  # for tenure rows
+
+
+def _match_products(text: str) -> list[str]:
+    t = text.lower()
+    return [name for name, pat in _PRODUCTS.items() if re.search(pat, t)]
+
+
+def _first_intent(text: str, table: list[tuple[str, str]]) -> str | None:
+    t = text.lower()
+    return next((intent for intent, pat in table if re.search(pat, t)), None)
+
+
+def _parse_rate(value: str) -> tuple[float, float] | None:
+    nums = [float(x) for x in re.findall(r"(\d+(?:\.\d+)?)\s*%", value)]
+    return (min(nums), max(nums)) if nums else None
+
+
+def _parse_tenure(value: str) -> tuple[int, int] | None:
+    """"12 to 60 months" -> (12, 60); "Up to 30 years" -> (1, 360)."""
+    v = value.lower()
+    scale = 12 if re.search(r"\byears?\b", v) else 1
+    nums = [float(x) for x in re.findall(r"\d+(?:\.\d+)?", v)]
+    if not nums:
+        return None
+    if len(nums) == 1:
+        return (1, int(nums[0] * scale)) if "up to" in v else (int(nums[0] * scale),) * 2
+    return int(nums[0] * scale), int(nums[1] * scale)
+
+
+def parse_markdown(path: Path) -> list[Fact]:
+    """Facts from one knowledge file: each "## Section" with "- **Label**: value" rows."""
+    facts: list[Fact] = []
+    sections = re.split(r"^## ", Path(path).read_text(encoding="utf-8"), flags=re.M)[1:]
+    for section in sections:
+        title, _, body = section.partition("\n")
+        title = title.strip()
+        notes = re.findall(r"^\*([^*].*?)\*\s*$", body, flags=re.M)
+        note = notes[0].strip() if notes else ""
+        source = f"{Path(path).name} › {title}"
+        products = _match_products(title)
+        section_intent = _first_intent(title, _SECTION_INTENTS)
+        rows = re.findall(r"^- \*\*(.+?)\*\*:?\s*(.+)$", body, flags=re.M)
+        for label, value in rows:
+            value = value.strip()
+            if section_intent:
+                product, intent = (_match_products(label) or [None])[0], section_intent
+            else:
+                product = products[0] if len(products) == 1 else GENERAL
+                intent = _first_intent(label, _LABEL_INTENTS)
+            if product is None or intent is None:
+                continue
+            facts.append(Fact(
+                product=product,
+                intent=intent,
+                label=title if section_intent else label.strip(),
+                value=value,
+                source=source,
+                note=note,
+                rate_range=_parse_rate(value) if intent == "rate" else None,
+                tenure_months=_parse_tenure(value) if intent == "tenure" else None,
+            ))
+    return facts
+
+
+def build_facts(knowledge_path: Path, sources: list[str]) -> list[Fact]:
+    facts = []
+    for name in sources:
+        path = Path(knowledge_path) / name
+        if path.exists():
+            facts.extend(parse_markdown(path))
+        else:
+            logger.warning("Structured source not found: %s", path)
+    return facts
+
+
+def save_facts(facts: list[Fact], path: Path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump([asdict(fact) for fact in facts], f, indent=2, ensure_ascii=False)
+    tmp.replace(path)
+    return path
+
+
+def load_facts(path: Path) -> list[Fact]:
+    with open(path, "r", encoding="utf-8") as f:
+        rows = json.load(f)
+    out = []
+    for row in rows:
+        for key in ("rate_range", "tenure_months"):
+            if row.get(key) is not None:
+                row[key] = tuple(row[key])
+        out.append(Fact(**row))
+    return out
+
+
+@dataclass
+class StructuredAnswer:
+    response: str
+    sources: str
+
+
+class KnowledgeFacts:
+    """In-memory (product, intent) -> facts lookup with a rule-based slot matcher over queries."""
+
+    def __init__(self, facts: list[Fact] | None = None):
+        cfg = load_config()
+        self.cfg = cfg.get("structured", {})
+        self.enabled = bool(self.cfg.get("enabled", True))
+        if facts is None:
+            facts = self._load(cfg)
+        self._by_key: dict[tuple[str, str], list[Fact]] = {}
+        for fact in facts:
+            self._by_key.setdefault((fact.product, fact.intent), []).append(fact)
+        logger.info("Structured facts: %d rows, %d (product, intent) keys", len(facts), len(self._by_key))
+
+    def _load(self, cfg: dict) -> list[Fact]:
+        """Facts file written by ingest_rag.py; re-parse the markdown if it is missing or older than its sources."""
+        knowledge_path = PROJECT_ROOT / cfg.get("rag", {}).get("knowledge_path", "knowledge")
+        sources = self.cfg.get("sources", ["interest_rates.md", "penalties_policy.md"])
+        facts_path = PROJECT_ROOT / self.cfg.get("facts_path", "data/knowledge_facts.json")
+        if facts_path.exists():
+            newest = max(((knowledge_path / s).stat().st_mtime for s in sources if (knowledge_path / s).exists()), default=0)
+            if facts_path.stat().st_mtime >= newest:
+                try:
+                    return load_facts(facts_path)
+                except (OSError, ValueError, TypeError) as e:
+                    logger.warning("Could not read %s (%s); parsing knowledge/ instead", facts_path, e)
+            else:
+                logger.warning("%s is older than knowledge/; re-run scripts/ingest_rag.py", facts_path.name)
+        return build_facts(knowledge_path, sources)
+
+    def products_for(self, intent: str) -> list[str]:
+        return sorted({p for p, i in self._by_key if i == intent})
+
+    def answer(self, query: str) -> StructuredAnswer | None:
+        """Answer from the tables if intent and product are unambiguous, else None (caller falls through)."""
+        if not self.enabled or not self._by_key:
+            return None
+        q = query.lower()
+        if re.search(_OUT_OF_SCOPE, q):
+            return None
+        intents = {intent for intent, pat in _QUERY_INTENTS if re.search(pat, q)}
+        if "rate" in intents and len(intents) > 1:
+            intents.discard("rate")  # "processing fee rate", "late payment charge rate"
+        if len(intents) != 1:
+            return None
+        intent = intents.pop()
+
+        products = _match_products(q)
+        if len(products) > 1:
+            return None
+        if not products and re.search(_OTHER_PRODUCTS, q):
+            metrics.incr("structured.unknown_product")
+            return None
+        if not products:
+            # No product named: fine only when a single row set covers the intent (e.g. bounce charges)
+            candidates = self.products_for(intent)
+            if len(candidates) != 1:
+                metrics.incr("structured.ambiguous")
+                return None
+            products = candidates
+        product = products[0]
+        facts = self._by_key.get((product, intent)) or self._by_key.get((GENERAL, intent))
+        if not facts:
+            return None
+
+        tenure = self._tenure_slot(q)
+        band = next((f for f in self._by_key.get((product, "tenure"), []) if f.tenure_months), None)
+        if tenure is not None and band is not None and not band.tenure_months[0] <= tenure <= band.tenure_months[1]:
+            # Outside the tabulated band: the table cannot say, let RAG/SLM explain
+            metrics.incr("structured.ambiguous")
+            return None
+
+        metrics.incr("structured.answered")
+        return self._render(product, intent, facts, band if intent == "rate" else None)
+
+    @staticmethod
+    def _tenure_slot(q: str) -> int | None:
+        m = re.search(_TENURE, q)
+        if not m:
+            return None
+        n = float(m.group(1))
+        return int(n * 12) if m.group(2).startswith("y") else int(n)
+
+    @staticmethod
+    def _render(product: str, intent: str, facts: list[Fact], band: Fact | None) -> StructuredAnswer:
+        subject = product.capitalize() if product != GENERAL else "Loans"
+        lines = [f"{subject} – {f.label.lower()}: {f.value.rstrip('.')}." for f in facts]
+        if band is not None:
+            lines.append(f"Applicable tenure: {band.value.rstrip('.')}.")
+            facts = facts + [band]
+        notes = list(dict.fromkeys(f.note for f in facts if f.note))
+        sources = "; ".join(dict.fromkeys(f.source for f in facts))
+        text = "\n".join(lines + notes) + f"\nSource: {sources}"
+        return StructuredAnswer(response=text, sources=sources)
@@ -0,0 +1,643 @@
+"""
+Tier 1 vector index backends behind one interface: add() vectors in sample order, search() by cosine.
+  chroma  HNSW via Chroma (default; M / construction_ef / search_ef tunable)
+  exact   float32 matrix, brute-force dot product (loaded with mmap)
+  int8    per-dimension scalar quantization, 4x smaller than exact
+  binary  one sign bit per dimension, Hamming scan, 32x smaller than exact
+  pca     PCA projection to fewer dimensions, stored as float32, int8 or binary, with the top
+          candidates rescored against the full-precision vectors
+  ivfpq   FAISS IVF + product quantization, ~50 bytes/vector; nprobe trades recall for latency
+File-based backends write their arrays and a manifest.json into the index directory.
+"""
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.artifacts import read_manifest, write_manifest
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+BACKENDS = ("chroma", "exact", "int8", "binary", "pca", "ivfpq")
+# Search-time knobs: taken from config when an index is opened, not from the build
+SEARCH_PARAMS = ("nprobe", "search_chunk", "rescore")
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(x: np.ndarray) -> np.ndarray:
+        return _POPCOUNT[x]
+
+
+def _normalize(x) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    if x.ndim == 1:
+        x = x[None, :]
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Best k columns per row of a [Q, N] score matrix, sorted descending."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+class VectorIndex:
+    """Vectors get ids 0..n-1 in the order they are added; search returns ([Q, k] ids, [Q, k] cosine)."""
+
+    backend = ""
+
+    def __init__(self, path: Path, params: dict | None = None):
+        self.path = Path(path)
+        self.params = dict(params or {})
+        self.dim: int | None = None
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def add(self, vectors) -> None:
+        raise NotImplementedError
+
+    def search(self, queries, k: int) -> tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def nbytes(self) -> int:
+        """Resident size of the searchable structure (what a serving worker holds per index)."""
+        raise NotImplementedError
+
+    def save(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._save_arrays()
+        write_manifest(self.path, {
+            "backend": self.backend,
+            "dim": self.dim,
+            "count": len(self),
+            "params": self.params,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            **self._manifest_extra(),
+        })
+
+    def _save_arrays(self) -> None:
+        raise NotImplementedError
+
+    def _manifest_extra(self) -> dict:
+        return {}
+
+    @classmethod
+    def load(cls, path: Path, manifest: dict) -> "VectorIndex":
+        raise NotImplementedError
+
+
+class _TrainedIndex(VectorIndex):
+    """
+    Backend with a learned encoder (int8 scales, sign center, PCA projection, IVF-PQ quantizers).
+    Added vectors are buffered until train_size() of them have arrived, or until the index is saved
+    or searched, so the encoder is fitted on a representative sample rather than on whatever the first
+    add() call held (the similarity build adds build_batch_size at a time). The buffer is then encoded
+    and later batches are encoded as they come. params train_size overrides the backend's default.
+
+    Compact scores are approximate, so the full-precision unit vectors are also kept on disk
+    (vectors.npy, mmap). With `rescore` > 0 the best `rescore` candidates are re-scored against them:
+    returned similarities are then exact cosines and similarity.threshold keeps its meaning (Tier 1
+    requires it, see check_threshold_backend). rescore can be changed without a rebuild.
+    """
+
+    _default_train_size = 4096
+    _default_rescore = 0
+
+    def __init__(self, path: Path, params: dict | None = None):
+        super().__init__(path, params)
+        self._pending: list[np.ndarray] = []
+        self._pending_count = 0
+        self._trained = False
+        self._keep_full = True  # False for an index that is itself the candidate stage of another
+        self._full: list[np.ndarray] = []
+        self._full_matrix: np.ndarray | None = None
+
+    def rescore(self) -> int:
+        return int(self.params.get("rescore", self._default_rescore))
+
+    def _vectors(self) -> np.ndarray | None:
+        """Full-precision vectors (None if this index does not keep them)."""
+        if self._full:
+            parts = ([self._full_matrix] if self._full_matrix is not None else []) + self._full
+            self._full_matrix, self._full = np.concatenate(parts), []
+        return self._full_matrix
+
+    def _keep(self, v: np.ndarray) -> None:
+        self._encode_add(v)
+        if self._keep_full:
+            self._full.append(v)
+
+    def train_size(self) -> int:
+        return int(self.params.get("train_size", 0)) or self._default_train_size
+
+    def __len__(self) -> int:
+        return self._encoded_count() + self._pending_count
+
+    def add(self, vectors) -> None:
+        v = _normalize(vectors)
+        self.dim = v.shape[1]
+        if self._trained:
+            self._keep(v)
+            return
+        self._pending.append(v)
+        self._pending_count += len(v)
+        if self._pending_count >= self.train_size():
+            self._flush()
+
+    def _flush(self) -> None:
+        """Train on everything buffered so far and encode it (no-op once trained)."""
+        if self._trained or not self._pending:
+            return
+        v = np.concatenate(self._pending)
+        self._pending, self._pending_count = [], 0
+        start = time.perf_counter()
+        self._train(v)
+        logger.info("Trained %s encoder on %d vectors in %.1fs", self.backend, len(v), time.perf_counter() - start)
+        self._trained = True
+        self._keep(v)
+
+    def search(self, queries, k: int):
+        self._flush()
+        rescore, full = self.rescore(), self._vectors()
+        if not rescore or full is None:
+            return self._search(queries, k)
+        q = _normalize(queries)
+        ids, _ = self._search(q, max(k, rescore))
+        # Only the candidates' rows of the full-precision matrix are read; -1 = no candidate (faiss)
+        exact = np.einsum("qcd,qd->qc", np.asarray(full[np.maximum(ids, 0)]), q)
+        exact = np.where(ids >= 0, exact, -np.inf)
+        cols, sims = _top_k(exact, k)
+        return np.take_along_axis(ids, cols, axis=1), sims
+
+    def nbytes(self) -> int:
+        # What a query scans; the full-precision vectors stay on disk and only candidate rows are read
+        self._flush()
+        return self._nbytes()
+
+    def save(self) -> None:
+        self._flush()
+        full = self._vectors()
+        if self._keep_full and full is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            np.save(self.path / "vectors.npy", full)
+        super().save()
+
+    def _train(self, v: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def _encode_add(self, v: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def _encoded_count(self) -> int:
+        raise NotImplementedError
+
+    def _search(self, queries, k: int) -> tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def _nbytes(self) -> int:
+        raise NotImplementedError
+
+    @classmethod
+    def _loaded(cls, path: Path, manifest: dict) -> "_TrainedIndex":
+        index = cls(path, manifest.get("params"))
+        index._trained = True
+        full = Path(path) / "vectors.npy"
+        if full.exists():
+            index._full_matrix = np.load(full, mmap_mode="r")
+        else:
+            index._keep_full = False  # built before vectors were kept: compact scores only
+        return index
+
+
+class ExactIndex(VectorIndex):
+    backend = "exact"
+
+    def __init__(self, path: Path, params: dict | None = None):
+        super().__init__(path, params)
+        self._chunks: list[np.ndarray] = []
+        self._matrix: np.ndarray | None = None
+
+    def _vectors(self) -> np.ndarray:
+        if self._chunks:
+            parts = ([self._matrix] if self._matrix is not None else []) + self._chunks
+            self._matrix, self._chunks = np.concatenate(parts), []
+        return self._matrix if self._matrix is not None else np.zeros((0, self.dim or 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._vectors())
+
+    def add(self, vectors) -> None:
+        v = _normalize(vectors)
+        self.dim = v.shape[1]
+        self._chunks.append(v)
+
+    def search(self, queries, k: int):
+        return _top_k(_normalize(queries) @ self._vectors().T, k)
+
+    def nbytes(self) -> int:
+        return int(self._vectors().nbytes)
+
+    def _save_arrays(self) -> None:
+        np.save(self.path / "vectors.npy", self._vectors())
+
+    @classmethod
+    def load(cls, path: Path, manifest: dict):
+        index = cls(path, manifest.get("params"))
+        index._matrix = np.load(Path(path) / "vectors.npy", mmap_mode="r")
+        index.dim = index._matrix.shape[1]
+        return index
+
+
+class Int8Index(_TrainedIndex):
+    """
+    Symmetric per-dimension int8 codes: x_d ≈ code_d · scale_d. Scales are fitted on the training
+    sample (unit vectors keep every component in [-1, 1], so later batches clip rarely).
+    """
+
+    backend = "int8"
+
+    def __init__(self, path: Path, params: dict | None = None):
+        super().__init__(path, params)
+        self.scale: np.ndarray | None = None
+        self._codes: list[np.ndarray] = []
+        self._matrix: np.ndarray | None = None
+
+    def _all_codes(self) -> np.ndarray:
+        if self._codes:
+            parts = ([self._matrix] if self._matrix is not None else []) + self._codes
+            self._matrix, self._codes = np.concatenate(parts), []
+        return self._matrix if self._matrix is not None else np.zeros((0, self.dim or 0), dtype=np.int8)
+
+    def _encoded_count(self) -> int:
+        return len(self._all_codes())
+
+    def _train(self, v: np.ndarray) -> None:
+        self.scale = np.maximum(np.abs(v).max(axis=0), 1e-6).astype(np.float32) / 127.0
+
+    def _encode_add(self, v: np.ndarray) -> None:
+        self._codes.append(np.clip(np.rint(v / self.scale), -127, 127).astype(np.int8))
+
+    def _search(self, queries, k: int):
+        q = _normalize(queries) * self.scale  # fold the scales into the query once
+        codes = self._all_codes()
+        scores = np.empty((q.shape[0], len(codes)), dtype=np.float32)
+        # Dequantize in cache-sized blocks; a full float copy would undo the memory saving
+        chunk = int(self.params.get("search_chunk", 8192))
+        for start in range(0, len(codes), chunk):
+            block = codes[start:start + chunk]
+            scores[:, start:start + len(block)] = (block.astype(np.float32) @ q.T).T
+        return _top_k(scores, k)
+
+    def _nbytes(self) -> int:
+        return int(self._all_codes().nbytes + (self.scale.nbytes if self.scale is not None else 0))
+
+    def _save_arrays(self) -> None:
+        np.save(self.path / "codes.npy", self._all_codes())
+        np.save(self.path / "scale.npy", self.scale)
+
+    @classmethod
+    def load(cls, path: Path, manifest: dict):
+        index = cls._loaded(path, manifest)
+        index._matrix = np.load(Path(path) / "codes.npy", mmap_mode="r")
+        index.scale = np.load(Path(path) / "scale.npy")
+        index.dim = index._matrix.shape[1]
+        return index
+
+
+class BinaryIndex(_TrainedIndex):
+    """
+    Sign of each (centered) dimension, packed 8 per byte; search is a Hamming scan. The center is the
+    mean of the training sample. Scores are cos(pi * hamming / bits), the angle estimate of sign
+    hashing: good for ranking candidates, too coarse for a similarity threshold (rescore them, see pca).
+    """
+
+    backend = "binary"
+
+    def __init__(self, path: Path, params: dict | None = None):
+        super().__init__(path, params)
+        self.center: np.ndarray | None = None
+        self._codes: list[np.ndarray] = []
+        self._matrix: np.ndarray | None = None
+
+    def _all_codes(self) -> np.ndarray:
+        if self._codes:
+            parts = ([self._matrix] if self._matrix is not None else []) + self._codes
+            self._matrix, self._codes = np.concatenate(parts), []
+        return self._matrix if self._matrix is not None else np.zeros((0, ((self.dim or 0) + 7) // 8), dtype=np.uint8)
+
+    def _encode(self, v: np.ndarray) -> np.ndarray:
+        return np.packbits(v > self.center, axis=1)
+
+    def _encoded_count(self) -> int:
+        return len(self._all_codes())
+
+    def _train(self, v: np.ndarray) -> None:
+        self.center = v.mean(axis=0).astype(np.float32)
+
+    def _encode_add(self, v: np.ndarray) -> None:
+        self._codes.append(self._encode(v))
+
+    def _search(self, queries, k: int):
+        q = self._encode(_normalize(queries))
+        codes = self._all_codes()
+        hamming = np.empty((q.shape[0], len(codes)), dtype=np.float32)
+        chunk = int(self.params.get("search_chunk", 65536))
+        for start in range(0, len(codes), chunk):
+            block = codes[start:start + chunk]
+            for i, row in enumerate(q):
+                hamming[i, start:start + len(block)] = _popcount(block ^ row).sum(axis=1)
+        return _top_k(np.cos(np.pi * hamming / self.dim), k)
+
+    def _nbytes(self) -> int:
+        return int(self._all_codes().nbytes + (self.center.nbytes if self.center is not None else 0))
+
+    def _save_arrays(self) -> None:
+        np.save(self.path / "codes.npy", self._all_codes())
+        np.save(self.path / "center.npy", self.center)
+
+    @classmethod
+    def load(cls, path: Path, manifest: dict):
+        index = cls._loaded(path, manifest)
+        index._matrix = np.load(Path(path) / "codes.npy", mmap_mode="r")
+        index.center = np.load(Path(path) / "center.npy")
+        index.dim = int(manifest["dim"])
+        return index
+
+
+class PCAIndex(_TrainedIndex):
+    """
+    Vectors projected onto the top `dim` principal components, then stored by a compact index
+    (`quantization`: none = exact float32, int8 or binary) that is scanned for candidates. The
+    projection is fitted on the training sample (at least 32·dim vectors by default) and saved with the index (pca.npz, summarized under "projection" in manifest.json), so build and
+    query use the same one. Rescoring (on by default) works as for every trained backend.
+    """
+
+    backend = "pca"
+    _default_rescore = 50
+    _QUANTIZATION = {"none": "exact", "int8": "int8", "binary": "binary"}
+
+    def __init__(self, path: Path, params: dict | None = None):
+        super().__init__(path, params)
+        quantization = self.params.get("quantization", "none")
+        if quantization not in self._QUANTIZATION:
+            raise ValueError(f"Unknown pca quantization {quantization!r}; expected one of {tuple(self._QUANTIZATION)}")
+        self.mean: np.ndarray | None = None
+        self.components: np.ndarray | None = None  # [input dim, reduced dim]
+        self.explained_variance: float | None = None
+        coarse_params = {k: v for k, v in self.params.items() if k != "rescore"}
+        self._coarse: VectorIndex = _CLASSES[self._QUANTIZATION[quantization]](self.path / "coarse", coarse_params)
+        self._coarse._keep_full = False  # rescoring uses this index's full vectors, not projected ones
+
+    def _fit(self, v: np.ndarray) -> None:
+        target = int(self.params.get("dim", 128))
+        self.mean = v.mean(axis=0).astype(np.float32)
+        _, sv, vt = np.linalg.svd(v - self.mean, full_matrices=False)
+        dim = max(1, min(target, len(vt)))
+        if dim < target:
+            logger.warning("PCA fitted on %d vectors: %d components instead of %d", len(v), dim, target)
+        self.components = np.ascontiguousarray(vt[:dim].T, dtype=np.float32)
+        energy = sv.astype(np.float64) ** 2
+        self.explained_variance = float(energy[:dim].sum() / max(energy.sum(), 1e-12))
+        logger.info("PCA %d -> %d dims keeps %.1f%% of the variance", v.shape[1], dim, 100 * self.explained_variance)
+
+    def _project(self, v: np.ndarray) -> np.ndarray:
+        return (v - self.mean) @ self.components
+
+    def train_size(self) -> int:
+        return int(self.params.get("train_size", 0)) or max(self._default_train_size, 32 * int(self.params.get("dim", 128)))
+
+    def _encoded_count(self) -> int:
+        return len(self._coarse)
+
+    def _train(self, v: np.ndarray) -> None:
+        self._fit(v)
+
+    def _encode_add(self, v: np.ndarray) -> None:
+        self._coarse.add(self._project(v))
+
+    def _search(self, queries, k: int):
+        if "search_chunk" in self.params:
+            self._coarse.params["search_chunk"] = self.params["search_chunk"]
+        return self._coarse.search(self._project(_normalize(queries)), k)
+
+    def _nbytes(self) -> int:
+        return int(self._coarse.nbytes() + (self.components.nbytes + self.mean.nbytes if self.components is not None else 0))
+
+    def _save_arrays(self) -> None:
+        np.savez(self.path / "pca.npz", mean=self.mean, components=self.components)
+        self._coarse.save()
+
+    def _manifest_extra(self) -> dict:
+        return {
+            "projection": {
+                "method": "pca",
+                "input_dim": self.dim,
+                "dim": int(self.components.shape[1]) if self.components is not None else None,
+                "explained_variance": self.explained_variance,
+                "file": "pca.npz",
+                "coarse": self._coarse.backend,
+            }
+        }
+
+    @classmethod
+    def load(cls, path: Path, manifest: dict):
+        path = Path(path)
+        index = cls._loaded(path, manifest)
+        projection = manifest.get("projection", {})
+        with np.load(path / projection.get("file", "pca.npz")) as pca:
+            index.mean, index.components = pca["mean"], pca["components"]
+        index.explained_variance = projection.get("explained_variance")
+        index.dim = int(manifest["dim"])
+        coarse_manifest = read_manifest(path / "coarse") or {}
+        index._coarse = _CLASSES[coarse_manifest.get("backend", "exact")].load(path / "coarse", coarse_manifest)
+        index._coarse._keep_full = False
+        return index
+
+
+class IVFPQIndex(_TrainedIndex):
+    """
+    FAISS inverted file + product quantization over inner product of unit vectors (= cosine).
+    params: nlist (0 = 4·sqrt(n) of the training sample), pq_m sub-quantizers (must divide dim),
+    pq_nbits, nprobe. The quantizers are trained once max(39·nlist, 256) vectors have been added
+    (train_size, 50000 when nlist is 0), or at save() on whatever there is; with fewer than 2^pq_nbits
+    training vectors the codebooks are shrunk to fit.
+    """
+
+    backend = "ivfpq"
+
+    def __init__(self, path: Path, params: dict | None = None):
+        super().__init__(path, params)
+        self._index = None
+
+    @staticmethod
+    def _faiss():
+        try:
+            import faiss
+        except ImportError:
+            raise ImportError("Install faiss: pip install faiss-cpu")
+        return faiss
+
+    def train_size(self) -> int:
+        if int(self.params.get("train_size", 0)):
+            return int(self.params["train_size"])
+        nlist = int(self.params.get("nlist", 0))
+        return max(39 * nlist, 256) if nlist else 50000
+
+    def _encoded_count(self) -> int:
+        return int(self._index.ntotal) if self._index is not None else 0
+
+    def _train(self, v: np.ndarray) -> None:
+        faiss = self._faiss()
+        nlist = int(self.params.get("nlist", 0)) or max(1, int(4 * np.sqrt(len(v))))
+        nlist = min(nlist, max(1, len(v) // 39))
+        pq_m = int(self.params.get("pq_m", 48))
+        while self.dim % pq_m:
+            pq_m -= 1
+        nbits = int(self.params.get("pq_nbits", 8))
+        if len(v) < 2 ** nbits:
+            # Each codebook needs at least as many training points as centroids
+            fitted = max(1, int(np.log2(len(v))))
+            logger.warning("IVF-PQ trained on %d vectors: pq_nbits %d instead of %d", len(v), fitted, nbits)
+            nbits = fitted
+        quantizer = faiss.IndexFlatIP(self.dim)
+        self._index = faiss.IndexIVFPQ(quantizer, self.dim, nlist, pq_m, nbits, faiss.METRIC_INNER_PRODUCT)
+        self._index.train(v)
+        self.params.update({"nlist": nlist, "pq_m": pq_m, "pq_nbits": nbits})
+        logger.info("IVF-PQ nlist=%d, m=%d, nbits=%d", nlist, pq_m, nbits)
+
+    def _encode_add(self, v: np.ndarray) -> None:
+        self._index.add(v)
+
+    def _search(self, queries, k: int):
+        self._index.nprobe = int(self.params.get("nprobe", 16))
+        sims, ids = self._index.search(_normalize(queries), k)
+        return ids, sims
+
+    def _nbytes(self) -> int:
+        faiss = self._faiss()
+        return int(faiss.serialize_index(self._index).nbytes)
+
+    def _save_arrays(self) -> None:
+        self._faiss().write_index(self._index, str(self.path / "ivfpq.faiss"))
+
+    @classmethod
+    def load(cls, path: Path, manifest: dict):
+        index = cls._loaded(path, manifest)
+        index._index = cls._faiss().read_index(str(Path(path) / "ivfpq.faiss"))
+        index.dim = index._index.d
+        return index
+
+
+class ChromaIndex(VectorIndex):
+    """Chroma collection with cosine HNSW; params hnsw_m, hnsw_construction_ef, hnsw_search_ef, collection."""
+
+    backend = "chroma"
+    _batch = 5000  # below Chroma's max insert batch
+
+    def __init__(self, path: Path, params: dict | None = None, create: bool = False):
+        super().__init__(path, params)
+        try:
+            import chromadb
+            from chromadb.config import Settings
+        except ImportError:
+            raise ImportError("Install chromadb: pip install chromadb")
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._client = chromadb.PersistentClient(path=str(self.path), settings=Settings(anonymized_telemetry=False))
+        self.collection_name = self.params.get("collection", "bfsi_alpaca")
+        if create:
+            try:
+                self._client.delete_collection(self.collection_name)
+            except Exception:
+                pass
+            metadata = {"hnsw:space": "cosine"}
+            for key, chroma_key in (("hnsw_m", "hnsw:M"), ("hnsw_construction_ef", "hnsw:construction_ef"), ("hnsw_search_ef", "hnsw:search_ef")):
+                if self.params.get(key):
+                    metadata[chroma_key] = int(self.params[key])
+            self._coll = self._client.create_collection(self.collection_name, metadata=metadata)
+        else:
+            self._coll = self._client.get_collection(self.collection_name)
+
+    def __len__(self) -> int:
+        return self._coll.count()
+
+    def add(self, vectors) -> None:
+        v = _normalize(vectors)
+        self.dim = v.shape[1]
+        offset = len(self)
+        for start in range(0, len(v), self._batch):
+            block = v[start:start + self._batch]
+            self._coll.add(ids=[str(offset + start + i) for i in range(len(block))], embeddings=block.tolist())
+
+    def search(self, queries, k: int):
+        results = self._coll.query(query_embeddings=_normalize(queries).tolist(), n_results=min(k, len(self)), include=["distances"])
+        ids = np.array([[int(i) for i in row] for row in results["ids"]])
+        sims = np.maximum(0.0, 1.0 - np.array(results["distances"], dtype=np.float32))
+        return ids, sims
+
+    def nbytes(self) -> int:
+        return sum(p.stat().st_size for p in self.path.rglob("*") if p.is_file())
+
+    def save(self) -> None:
+        pass  # Chroma persists on add
+
+    @classmethod
+    def load(cls, path: Path, manifest: dict):
+        return cls(path, manifest.get("params"))
+
+
+_CLASSES = {c.backend: c for c in (ChromaIndex, ExactIndex, Int8Index, BinaryIndex, PCAIndex, IVFPQIndex)}
+
+
+def check_threshold_backend(backend: str, params: dict | None = None) -> None:
+    """
+    Raise unless the backend returns cosines a similarity threshold can be compared with. Approximate
+    backends (int8, binary, pca, ivfpq) qualify only with rescore > 0, i.e. when their candidates are
+    re-scored against the full-precision vectors. Benchmarks may still use compact scores; Tier 1 may not.
+    """
+    cls = _CLASSES.get(backend)
+    if cls is None or not issubclass(cls, _TrainedIndex):
+        return
+    if int((params or {}).get("rescore", cls._default_rescore)) <= 0:
+        raise ValueError(
+            f"index_backend {backend!r} needs rescore > 0 for Tier 1: its compact scores are approximate and "
+            "not comparable to similarity.threshold"
+        )
+
+
+def create_index(backend: str, path: Path, params: dict | None = None) -> VectorIndex:
+    """New empty index (an existing Chroma collection at path is replaced)."""
+    if backend not in _CLASSES:
+        raise ValueError(f"Unknown index backend {backend!r}; expected one of {BACKENDS}")
+    if backend == "chroma":
+        return ChromaIndex(path, params, create=True)
+    return _CLASSES[backend](path, params)
+
+
+def open_index(backend: str, path: Path, params: dict | None = None) -> VectorIndex | None:
+    """Existing index at path, or None if there is none for this backend."""
+    if backend == "chroma":
+        try:
+            return ChromaIndex(path, params)
+        except ImportError:
+            raise
+        except Exception:
+            return None
+    manifest = read_manifest(path)
+    if manifest is None or manifest.get("backend") != backend:
+        return None
+    index = _CLASSES[backend].load(path, manifest)
+    # Search-time knobs (nprobe, search_chunk, rescore) come from config, not from build time
+    index.params.update({k: v for k, v in (params or {}).items() if k in SEARCH_PARAMS})
+    if isinstance(index, _TrainedIndex) and index.rescore() > 0 and index._vectors() is None:
+        logger.warning("%s index at %s has no full-precision vectors to rescore with; rebuild it", backend, path)
+        return None
+    return index